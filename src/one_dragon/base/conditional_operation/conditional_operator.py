@@ -1,11 +1,12 @@
 import time
 from concurrent.futures import ThreadPoolExecutor, Future
 
-from threading import Lock
+from threading import Lock, Event
 from typing import Optional, Callable, List
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_def import OperationDef
+from one_dragon.base.conditional_operation.operation_runner import OperationRunner
 from one_dragon.base.conditional_operation.operation_task import OperationTask
 from one_dragon.base.conditional_operation.operation_template import OperationTemplate
 from one_dragon.base.conditional_operation.scene_handler import SceneHandler
@@ -19,6 +20,8 @@ from one_dragon.utils.log_utils import log
 
 _od_conditional_op_executor = ThreadPoolExecutor(thread_name_prefix='od_conditional_op', max_workers=32)
 
+_NORMAL_SCENE_MAX_WAIT_SECONDS: float = 1  # 主循环单次最长等待时间 兜底避免漏掉唤醒
+
 
 class ConditionalOperator(YamlConfig):
 
@@ -39,9 +42,16 @@ class ConditionalOperator(YamlConfig):
         self.normal_scene_handler: Optional[SceneHandler] = None  # 不需要状态触发的场景处理
         self.is_running: bool = False  # 整体是否正在运行
 
+        self.state_scene_handler: dict[str, List[SceneHandler]] = {}  # 状态 -> 表达式中使用了这个状态的场景
+        self._interrupt_states: set[str] = set()  # 所有处理器中 可以打断指令的状态
+        self._normal_scene_affected: dict[str, bool] = {}  # 状态更新是否影响主循环的判断 按需计算
+
         self._task_lock: Lock = Lock()
+        # 主循环不持有任务锁等待 状态更新、任务结束、停止运行时唤醒 唤醒方不需要获取任务锁
+        self._normal_scene_wake: Event = Event()
         self.running_task: Optional[OperationTask] = None  # 正在运行的任务
         self.running_task_cnt: AtomicInt = AtomicInt()
+        self.op_runner: OperationRunner = OperationRunner(thread_name_prefix='od_op_runner')  # 所有任务的指令都在这里执行
 
     def init(
             self,
@@ -77,8 +87,30 @@ class ConditionalOperator(YamlConfig):
             else:
                 self.normal_scene_handler = handler
 
+        self._init_state_index()
         self._inited = True
 
+    def _init_state_index(self) -> None:
+        """
+        构建 状态 -> 场景 的索引
+        状态更新时 只处理真正受影响的场景 没有场景关心的状态不需要提交到线程池
+        :return:
+        """
+        scene_handler_list: List[SceneHandler] = []
+        if self.normal_scene_handler is not None:
+            scene_handler_list.append(self.normal_scene_handler)
+        for handler in self.trigger_scene_handler.values():
+            if handler not in scene_handler_list:  # 一个场景可以有多个触发状态
+                scene_handler_list.append(handler)
+
+        self.state_scene_handler = {}
+        self._interrupt_states = set()
+        self._normal_scene_affected = {}
+        for handler in scene_handler_list:
+            for state in handler.get_usage_states():
+                self.state_scene_handler.setdefault(state, []).append(handler)
+            self._interrupt_states.update(handler.get_interrupt_states())
+
     def dispose(self) -> None:
         """
         销毁 要对子模块进行完全销毁
@@ -104,6 +136,7 @@ class ConditionalOperator(YamlConfig):
 
         self.is_running = True
         self.running_task_cnt.set(0)  # 每次重置计数器 防止有bug导致无法正常运行
+        self.op_runner.clear_stats()
 
         if self.normal_scene_handler is not None:
             future: Future = _od_conditional_op_executor.submit(self._normal_scene_loop)
@@ -114,43 +147,81 @@ class ConditionalOperator(YamlConfig):
     def _normal_scene_loop(self) -> None:
         """
         主循环
+        不再固定间隔轮询 而是在以下情况被唤醒
+        - 有状态更新
+        - 其它场景的任务结束或被打断
+        - 场景的触发间隔已过
+        - 状态判断的时间窗口最早可能变化的时间
         :return:
         """
-        normal_handler_id = id(self.normal_scene_handler)
-        while self.is_running:
-            if self.running_task_cnt.get() > 0:
-                # 有其它场景在运行 等待
-                time.sleep(0.02)
-            else:
-                # log.debug('开始等待新的主循环')
-                to_sleep: Optional[float] = None
-
-                # 上锁后确保运行状态不会被篡改
-                with self._task_lock:
-                    if not self.is_running:
-                        # 已经被stop_running中断了 不继续
-                        break
-
+        handler = self.normal_scene_handler
+        normal_handler_id = id(handler)
+        while True:
+            future: Optional[Future] = None
+            # 上锁后确保运行状态不会被篡改 等待时不持有锁
+            with self._task_lock:
+                if not self.is_running:
+                    break
+                # 先清除唤醒标记再判断 判断之后的状态更新都会唤醒下一次等待 不会漏掉
+                self._normal_scene_wake.clear()
+
+                if self.running_task_cnt.get() > 0:
+                    # 有其它场景在运行 等待任务结束
+                    to_wait = _NORMAL_SCENE_MAX_WAIT_SECONDS
+                else:
                     trigger_time = time.time()
                     last_trigger_time = self.last_trigger_time.get(normal_handler_id, 0)
                     past_time = trigger_time - last_trigger_time
-                    if past_time < self.normal_scene_handler.interval_seconds:
-                        to_sleep = self.normal_scene_handler.interval_seconds - past_time
+                    if past_time < handler.interval_seconds:
+                        to_wait = handler.interval_seconds - past_time
                     else:
-                        new_task = self.normal_scene_handler.get_operations(trigger_time)
+                        new_task = handler.get_operations(trigger_time)
                         if new_task is not None:
                             log.debug(f'当前场景 主循环 当前条件 {new_task.expr_display}')
                             self.running_task = new_task
                             self.last_trigger_time[normal_handler_id] = trigger_time
                             self.running_task_cnt.inc()
-                            future = self.running_task.run_async()
-                            future.add_done_callback(self._on_task_done)
+                            future = self.running_task.run_async(self.op_runner)
+                        else:
+                            # 没有命中的状态 等待状态更新 或者时间窗口变化
+                            next_change_time = handler.get_next_change_time(trigger_time)
+                            to_wait = min(max(next_change_time - time.time(), 0), _NORMAL_SCENE_MAX_WAIT_SECONDS)
+
+            if future is not None:
+                # 回调需要获取任务锁 任务很短时可能已经完成 回调会在这里直接执行 因此在锁外添加
+                future.add_done_callback(self._on_task_done)
+                continue
 
-                if to_sleep is not None:
-                    # 等待时间不能写在锁里 要尽快释放锁
-                    time.sleep(to_sleep)
-                else:  # 没有命中的状态 或者 提交执行了 那就自旋等待
-                    time.sleep(0.02)
+            self._normal_scene_wake.wait(to_wait)
+
+    def _is_normal_scene_affected(self, state_recorder: StateRecorder) -> bool:
+        """
+        状态更新后 主循环的判断结果是否可能变化
+        状态本身 或者会被清除的互斥状态 出现在主循环的表达式中
+        :param state_recorder: 更新的状态记录器
+        :return:
+        """
+        state_name = state_recorder.state_name
+        affected = self._normal_scene_affected.get(state_name)
+        if affected is None:
+            related_states = [state_name]
+            if state_recorder.mutex_list is not None:
+                related_states.extend(state_recorder.mutex_list)
+            affected = any(
+                self.normal_scene_handler in self.state_scene_handler.get(state, [])
+                for state in related_states
+            )
+            self._normal_scene_affected[state_name] = affected
+        return affected
+
+    def _notify_normal_scene(self) -> None:
+        """
+        唤醒主循环重新判断 不获取任务锁 识别线程更新状态时不会被指令的分发阻塞
+        :return:
+        """
+        if self.normal_scene_handler is None:
+            return
+        self._normal_scene_wake.set()
 
     def _trigger_scene(self, state_name: str) -> None:
         """
@@ -161,23 +232,35 @@ class ConditionalOperator(YamlConfig):
         if state_name not in self.trigger_scene_handler:
             return
         handler = self.trigger_scene_handler[state_name]
+        future = self._trigger_scene_task(state_name, handler)
+        if future is not None:
+            # 回调需要获取任务锁 任务很短时可能已经完成 回调会在这里直接执行 因此在锁外添加
+            future.add_done_callback(self._on_task_done)
+
+    def _trigger_scene_task(self, state_name: str, handler: SceneHandler) -> Optional[Future]:
+        """
+        判断场景 符合条件时打断当前任务并开始新任务
+        :param state_name: 触发的状态
+        :param handler: 触发的场景
+        :return: 新任务 没有触发时返回None
+        """
         trigger_handler_id = id(handler)
 
         # 上锁后确保运行状态不会被篡改
         with self._task_lock:
             if not self.is_running:
                 # 已经被stop_running中断了 不继续
-                return
+                return None
 
             trigger_time: float = time.time()  # 这里不应该使用事件发生时间 而是应该使用当前的实际操作时间
             last_trigger_time = self.last_trigger_time.get(trigger_handler_id, 0)
             if trigger_time - last_trigger_time < handler.interval_seconds:  # 冷却时间没过 不触发
-                return
+                return None
 
             new_task = handler.get_operations(trigger_time)
             # 若new_task为空，即无匹配state，则不打断当前task
             if new_task is None:
-                return
+                return None
 
             can_interrupt: bool = False
             if self.running_task is not None:
@@ -191,7 +274,7 @@ class ConditionalOperator(YamlConfig):
                 can_interrupt = True
 
             if not can_interrupt:  # 当前运行场景无法被打断
-                return
+                return None
 
             # 必须要先增加计算器 避免无触发场景的循环进行
             self.running_task_cnt.inc()
@@ -203,8 +286,7 @@ class ConditionalOperator(YamlConfig):
             new_task.set_trigger(state_name)
             self.running_task = new_task
             self.last_trigger_time[trigger_handler_id] = trigger_time
-            future = self.running_task.run_async()
-            future.add_done_callback(self._on_task_done)
+            return self.running_task.run_async(self.op_runner)
 
     def stop_running(self) -> None:
         """
@@ -215,6 +297,7 @@ class ConditionalOperator(YamlConfig):
         with self._task_lock:
             self.is_running = False
             self._stop_running_task()
+            self._normal_scene_wake.set()
 
     def _stop_running_task(self) -> None:
         """
@@ -228,6 +311,7 @@ class ConditionalOperator(YamlConfig):
                 # 如果 finish=True 则计数器已经在 _on_task_done 减少了 这里就不减了
                 # 如果 finish=False 则代表还有操作在继续。在这里要减少计数器而不是等_on_task_done 让无触发器场景尽早运行
                 self.running_task_cnt.dec()
+                self._normal_scene_wake.set()
 
     def _on_task_done(self, future: Future) -> None:
         """
@@ -239,6 +323,7 @@ class ConditionalOperator(YamlConfig):
                 if result:  # 顺利执行完毕
                     self.running_task_cnt.dec()
                     self.running_task.priority = None
+                    self._normal_scene_wake.set()
             except Exception:  # run_async里有callback打印日志
                 pass
 
@@ -273,9 +358,11 @@ class ConditionalOperator(YamlConfig):
         state_recorder = self._update_state_recorder(state_record)
         if state_recorder is None:
             return
+        if self._is_normal_scene_affected(state_recorder):
+            self._notify_normal_scene()
 
-        # 再去触发具体的场景 由自己的线程处理
-        if not state_record.is_clear:
+        # 再去触发具体的场景 由自己的线程处理 没有场景监听的状态不需要提交
+        if not state_record.is_clear and state_recorder.state_name in self.trigger_scene_handler:
             future: Future = _od_conditional_op_executor.submit(self._trigger_scene, state_recorder.state_name)
             future.add_done_callback(thread_utils.handle_future_result)
 
@@ -291,15 +378,22 @@ class ConditionalOperator(YamlConfig):
         """
         top_priority_handler: Optional[SceneHandler] = None
         top_priority_state: Optional[str] = None
+        normal_scene_affected: bool = False
+        has_interrupt_state: bool = False
 
         for state_record in state_records:
             state_name = state_record.state_name
             state_recorder = self._update_state_recorder(state_record)
             if state_recorder is None:
                 continue
+            if not normal_scene_affected and self._is_normal_scene_affected(state_recorder):
+                normal_scene_affected = True
             if state_record.is_clear:
                 continue
 
+            if state_name in self._interrupt_states:
+                has_interrupt_state = True
+
             # 找优先级最高的场景
             handler = self.trigger_scene_handler.get(state_name)
             if handler is None:
@@ -319,11 +413,14 @@ class ConditionalOperator(YamlConfig):
                 top_priority_handler = handler
                 top_priority_state = state_name
 
+        if normal_scene_affected:
+            self._notify_normal_scene()
+
         # 触发具体的场景 由自己的线程处理
         if top_priority_state is not None:
             future: Future = _od_conditional_op_executor.submit(self._trigger_scene, top_priority_state)
             future.add_done_callback(thread_utils.handle_future_result)
-        else:
+        elif has_interrupt_state:
             # 没有场景需要触发 看是否需要打断当前操作
             with self._task_lock:
                 interrupt: bool = False
@@ -362,3 +459,65 @@ class ConditionalOperator(YamlConfig):
                     mutex_recorder.clear_state_record()
 
         return recorder
+
+
+def __debug_latency():
+    """
+    测试主循环的响应延迟
+    - 状态更新后 多久执行对应指令
+    - 状态的时间窗口打开后 多久执行对应指令
+    """
+    import random
+    import threading
+    from one_dragon.base.conditional_operation.state_cal_tree import construct_state_cal_tree
+    from one_dragon.base.conditional_operation.state_handler import StateHandler
+
+    class _DebugOperator(ConditionalOperator):
+
+        def __init__(self):
+            ConditionalOperator.__init__(self, sub_dir='debug', template_name='debug', is_mock=True)
+            self.state_recorders: dict[str, StateRecorder] = {}
+
+        def get_state_recorder(self, state_name: str) -> Optional[StateRecorder]:
+            if state_name not in self.state_recorders:
+                self.state_recorders[state_name] = StateRecorder(state_name)
+            return self.state_recorders[state_name]
+
+    class _RecordOp(AtomicOp):
+
+        def __init__(self):
+            AtomicOp.__init__(self, 'record')
+            self.event = threading.Event()
+            self.execute_time: float = 0
+
+        def execute(self):
+            if not self.event.is_set():
+                self.execute_time = time.time()
+                self.event.set()
+
+    for expr, window_start in [('[按键-普通攻击, 0, 0.005]', 0), ('[按键-普通攻击, 0.05, 0.055]', 0.05)]:
+        op = _DebugOperator()
+        record_op = _RecordOp()
+        tree = construct_state_cal_tree(expr, op.get_state_recorder)
+        op.normal_scene_handler = SceneHandler(0, [StateHandler(expr, tree, operations=[record_op])])
+        op._init_state_index()
+        op._inited = True
+        op.start_running_async()
+
+        delay_list: List[float] = []
+        for _ in range(50):
+            time.sleep(0.1 + random.random() * 0.02)
+            record_op.event.clear()
+            update_time = time.time()
+            op.update_state(StateRecord('按键-普通攻击', update_time))
+            record_op.event.wait(1)
+            delay_list.append(record_op.execute_time - update_time - window_start)
+
+        op.stop_running()
+        delay_list.sort()
+        print('%s 延迟 中位数 %.2fms 最大 %.2fms' % (
+            expr, delay_list[len(delay_list) // 2] * 1000, delay_list[-1] * 1000))
+
+
+if __name__ == '__main__':
+    __debug_latency()
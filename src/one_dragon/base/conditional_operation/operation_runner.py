@@ -0,0 +1,301 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, List, Callable, Deque, Tuple
+
+from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+from one_dragon.utils.latency_histogram import LatencyHistogram
+from one_dragon.utils.log_utils import log
+
+_SPIN_SECONDS: float = 0.002  # 等待的最后一小段 不依赖系统定时器精度 主动让出直到截止时间
+
+_runner_local = threading.local()  # 执行器线程上 当前任务的停止信号 以及当前指令的等待误差
+
+
+class _WorkerState:
+
+    def __init__(self, gen: int):
+        """
+        一个执行线程自己的状态 线程被替换后 旧线程只会改到自己的状态
+        :param gen: 线程代数
+        """
+        self.gen: int = gen
+        self.in_wait: bool = False  # 是否正在可中断的等待中 只由自己的线程写入 不需要加锁
+
+
+class OperationRunner:
+
+    def __init__(self, thread_name_prefix: str):
+        """
+        指令执行器 每个自动指令一个 使用单独的一个线程按顺序执行任务
+        - 任务里的指令直接在这个线程上执行 不再每个指令都提交到线程池
+        - 指令里的等待 按截止时间等待 任务被停止时立刻返回
+        - 记录每个指令 实际开始时间 与 计划开始时间 的差 以及等待结束时间的误差
+          计划开始时间 = 上一个指令的计划开始时间 + 上一个指令实际执行耗时 - 上一个指令里等待超出的时间
+          即第一个指令从提交任务开始算 之后累计 线程切换和等待不准 造成的偏差
+        被打断的任务还卡在不能中断的指令上(例如带按压时间的按键)时 新任务换一个新线程执行 旧线程执行完这个指令后退出
+        :param thread_name_prefix: 线程名称前缀
+        """
+        self.thread_name_prefix: str = thread_name_prefix
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._queue: Deque[Tuple[Callable[['OperationRunner'], bool], Future, threading.Event]] = deque()
+        self._worker_gen: int = 0  # 当前有效的线程代数 旧线程发现代数变化后退出
+        self._worker_cnt: int = 0  # 创建过的线程数量 用于命名
+        self._has_worker: bool = False
+        self._current_stop_event: Optional[threading.Event] = None  # 当前线程正在执行的任务的停止信号
+        self._current_worker: Optional[_WorkerState] = None  # 当前有效的线程的状态
+
+        self._histogram_lock = threading.Lock()
+        self.op_delay_histogram: dict[str, LatencyHistogram] = {}  # 指令名称 -> 实际开始与计划开始的差
+        self.wait_error_histogram: LatencyHistogram = LatencyHistogram()  # 等待实际结束与截止时间的差
+        self.worker_replace_cnt: int = 0  # 因为旧任务卡住 换新线程的次数
+
+    def submit(self, run: Callable[['OperationRunner'], bool], stop_event: threading.Event) -> Future:
+        """
+        提交一个任务
+        :param run: 执行方法 入参为本执行器
+        :param stop_event: 任务的停止信号
+        :return:
+        """
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        with self._condition:
+            current_stop_event = self._current_stop_event
+            if not self._has_worker:
+                self._start_worker()
+            elif (current_stop_event is not None and current_stop_event.is_set()
+                  and not self._current_worker.in_wait):
+                # 旧任务已经被停止 但还在执行不能中断的指令 不等它
+                self.worker_replace_cnt += 1
+                self._start_worker()
+            self._queue.append((run, future, stop_event))
+            self._condition.notify()
+        return future
+
+    def _start_worker(self) -> None:
+        """
+        启动新的线程 调用时需要持有锁
+        :return:
+        """
+        self._worker_gen += 1
+        self._worker_cnt += 1
+        self._has_worker = True
+        self._current_stop_event = None
+        self._current_worker = _WorkerState(self._worker_gen)
+        t = threading.Thread(target=self._worker, args=(self._current_worker,), daemon=True,
+                             name='%s_%d' % (self.thread_name_prefix, self._worker_cnt))
+        t.start()
+
+    def _worker(self, state: _WorkerState) -> None:
+        gen = state.gen
+        _runner_local.runner = self
+        _runner_local.worker_state = state
+        while True:
+            with self._condition:
+                while gen == self._worker_gen and len(self._queue) == 0:
+                    self._condition.wait()
+                if gen != self._worker_gen:
+                    return
+                run, future, stop_event = self._queue.popleft()
+                self._current_stop_event = stop_event
+            _runner_local.stop_event = stop_event
+
+            result = None
+            try:
+                result = run(self)
+            except Exception:
+                log.error('指令任务执行出错', exc_info=True)
+
+            _runner_local.stop_event = None
+            with self._condition:
+                if gen == self._worker_gen:
+                    self._current_stop_event = None
+            future.set_result(result)
+
+    def wait_until(self, deadline: float, stop_event: Optional[threading.Event]) -> bool:
+        """
+        等待到截止时间 任务被停止时立刻返回
+        :param deadline: 截止时间 time.perf_counter
+        :param stop_event: 任务的停止信号
+        :return: 是否等到了截止时间 被停止时返回False
+        """
+        # 只写自己线程的状态 不加锁 submit 读到的值本来就可能在读完后马上变化
+        state: Optional[_WorkerState] = getattr(_runner_local, 'worker_state', None)
+        if state is not None:
+            state.in_wait = True
+        try:
+            while True:
+                remain = deadline - time.perf_counter()
+                if remain <= _SPIN_SECONDS:
+                    break
+                if stop_event is not None:
+                    if stop_event.wait(remain - _SPIN_SECONDS):
+                        return False
+                else:
+                    time.sleep(remain - _SPIN_SECONDS)
+
+            while time.perf_counter() < deadline:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                time.sleep(0)
+        finally:
+            if state is not None:
+                state.in_wait = False
+
+        error = time.perf_counter() - deadline
+        _runner_local.wait_error = getattr(_runner_local, 'wait_error', 0) + error
+        self.wait_error_histogram.record(error)
+        return True
+
+    def execute_op(self, op: AtomicOp, planned_start: float) -> float:
+        """
+        在当前线程执行一个指令 并记录开始延迟
+        :param op: 指令
+        :param planned_start: 计划开始时间 time.perf_counter
+        :return: 下一个指令的计划开始时间
+        """
+        start_time = time.perf_counter()
+        self.record_op_delay(op.op_name, start_time - planned_start)
+        _runner_local.wait_error = 0
+        try:
+            op.execute()
+        except Exception:
+            log.error('指令执行出错', exc_info=True)
+        return planned_start + (time.perf_counter() - start_time) - _runner_local.wait_error
+
+    def record_op_delay(self, op_name: str, seconds: float) -> None:
+        """
+        记录指令实际开始时间与计划开始时间的差
+        :param op_name: 指令名称
+        :param seconds: 差值
+        :return:
+        """
+        histogram = self.op_delay_histogram.get(op_name)
+        if histogram is None:
+            with self._histogram_lock:
+                histogram = self.op_delay_histogram.setdefault(op_name, LatencyHistogram())
+        histogram.record(max(seconds, 0))
+
+    def get_stats_text(self) -> List[str]:
+        """
+        各指令的统计
+        :return:
+        """
+        result = []
+        for op_name, histogram in sorted(self.op_delay_histogram.items(), key=lambda i: -i[1].cnt):
+            result.append('指令 %s 开始延迟 [%s]' % (op_name, histogram))
+        result.append('等待误差 [%s] 更换线程 %d' % (self.wait_error_histogram, self.worker_replace_cnt))
+        return result
+
+    def log_stats(self) -> None:
+        for line in self.get_stats_text():
+            log.info(line)
+
+    def clear_stats(self) -> None:
+        with self._histogram_lock:
+            self.op_delay_histogram = {}
+        self.wait_error_histogram.clear()
+        self.worker_replace_cnt = 0
+
+
+def sleep(seconds: float) -> bool:
+    """
+    指令里使用的等待
+    在执行器的线程上时 按截止时间等待 任务被停止时立刻返回
+    其它线程上 与 time.sleep 一致
+    :param seconds: 秒数
+    :return: 是否等待完 被停止时返回False
+    """
+    if seconds <= 0:
+        return True
+    runner: Optional[OperationRunner] = getattr(_runner_local, 'runner', None)
+    if runner is None:
+        time.sleep(seconds)
+        return True
+    return runner.wait_until(time.perf_counter() + seconds, getattr(_runner_local, 'stop_event', None))
+
+
+
+def __debug():
+    """
+    模拟10个指令的连招 按键和等待交替
+    对比原来每个指令提交到线程池(等待使用 time.sleep) 和执行器直接执行的 开始延迟
+    以及在等待中停止任务后 多久可以开始下一个任务
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from one_dragon.base.conditional_operation.operation_task import OperationTask
+
+    old_executor = ThreadPoolExecutor(thread_name_prefix='debug_old_op', max_workers=32)
+    wait_seconds = 0.02
+    run_times = 50
+
+    class _TapOp(AtomicOp):
+
+        def __init__(self):
+            AtomicOp.__init__(self, '按键')
+
+    class _WaitOp(AtomicOp):
+
+        def __init__(self, use_runner: bool):
+            AtomicOp.__init__(self, '等待')
+            self.use_runner: bool = use_runner
+
+        def execute(self):
+            if self.use_runner:
+                sleep(wait_seconds)
+            else:
+                time.sleep(wait_seconds)
+
+    def old_run(op_list: List[AtomicOp]) -> List[float]:
+        # 原来的方式 任务在线程池执行 每个指令再提交到线程池并等待
+        start_list = []
+        planned_start = time.perf_counter()
+        for op in op_list:
+            f = old_executor.submit(lambda o=op: (start_list.append(time.perf_counter() - planned_start), o.execute()))
+            f.result()
+            if isinstance(op, _WaitOp):
+                planned_start += wait_seconds
+        return start_list
+
+    old_delay = LatencyHistogram()
+    old_total = 0
+    for _ in range(run_times):
+        op_list = [_TapOp() if i % 2 == 0 else _WaitOp(False) for i in range(10)]
+        submit_time = time.perf_counter()
+        for delay in old_executor.submit(old_run, op_list).result():
+            old_delay.record(max(delay, 0))
+        old_total += time.perf_counter() - submit_time - wait_seconds * 5
+
+    runner = OperationRunner('debug_op_runner')
+    new_total = 0
+    for _ in range(run_times):
+        task = OperationTask([_TapOp() if i % 2 == 0 else _WaitOp(True) for i in range(10)])
+        submit_time = time.perf_counter()
+        task.run_async(runner).result()
+        new_total += time.perf_counter() - submit_time - wait_seconds * 5
+
+    print('原来 每次连招额外耗时 %.3fms' % (old_total / run_times * 1000))
+    print('原来 指令开始延迟 [%s]' % old_delay)
+    print('执行器 每次连招额外耗时 %.3fms' % (new_total / run_times * 1000))
+    for line in runner.get_stats_text():
+        print(line)
+
+    # 在1秒的等待中停止 统计多久能执行下一个任务
+    stop_cost = LatencyHistogram()
+    for _ in range(20):
+        long_wait = _WaitOp(True)
+        long_wait.execute = lambda: sleep(1)
+        task = OperationTask([long_wait])
+        task.run_async(runner)
+        time.sleep(0.05)
+        stop_time = time.perf_counter()
+        task.stop()
+        OperationTask([_TapOp()]).run_async(runner).result()
+        stop_cost.record(time.perf_counter() - stop_time)
+    print('等待中停止后 执行下一个任务 [%s] 更换线程 %d' % (stop_cost, runner.worker_replace_cnt))
+
+
+if __name__ == '__main__':
+    __debug()
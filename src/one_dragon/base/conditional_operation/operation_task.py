@@ -1,13 +1,14 @@
-from concurrent.futures import ThreadPoolExecutor, Future
+import time
+from concurrent.futures import Future
 
-from threading import Lock
+from threading import Lock, Event
 from typing import Optional, List, Set
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+from one_dragon.base.conditional_operation.operation_runner import OperationRunner
 from one_dragon.utils import thread_utils
-from one_dragon.utils.log_utils import log
 
-_od_op_task_executor = ThreadPoolExecutor(thread_name_prefix='_od_op_task_executor', max_workers=32)
+_od_op_task_runner = OperationRunner(thread_name_prefix='_od_op_task_runner')  # 没有指定执行器时使用
 
 
 class OperationTask:
@@ -27,39 +28,45 @@ class OperationTask:
         self._current_op: Optional[AtomicOp] = None  # 当前执行的指令
         self._async_ops: List[AtomicOp] = []  # 执行过异步操作
         self._op_lock: Lock = Lock()  # 操作锁 用于保证stop里的一定是最后执行的op
+        self._stop_event: Event = Event()  # 停止信号 用于立刻结束指令里的等待
 
         self.expr_list: List[str] = []  # 用于界面显示
 
-    def run_async(self) -> Future:
+    def run_async(self, runner: Optional[OperationRunner] = None) -> Future:
         """
         异步执行
+        :param runner: 指令执行器 所有指令都在执行器的线程上依次执行
         :return:
         """
         self.running = True
-        future: Future = _od_op_task_executor.submit(self._run)
+        self._stop_event.clear()
+        submit_time = time.perf_counter()
+        if runner is None:
+            runner = _od_op_task_runner
+        future: Future = runner.submit(lambda r: self._run(r, submit_time), self._stop_event)
         future.add_done_callback(thread_utils.handle_future_result)
         return future
 
-    def _run(self) -> bool:
+    def _run(self, runner: OperationRunner, submit_time: float) -> bool:
         """
         执行
+        :param runner: 指令执行器 当前就在它的线程上
+        :param submit_time: 提交时间 作为第一个指令的计划开始时间
         :return: 是否完成所有指令了
         """
+        planned_start = submit_time
         for idx in range(len(self.op_list)):
             with self._op_lock:
                 if not self.running:
                     # 被stop中断了 不继续后续的操作
                     break
-                self._current_op = self.op_list[idx]
-                if self._current_op.async_op:
-                    self._async_ops.append(self._current_op)
-                future: Future = _od_op_task_executor.submit(self._current_op.execute)
-                future.add_done_callback(thread_utils.handle_future_result)
+                op = self.op_list[idx]
+                self._current_op = op
+                if op.async_op:
+                    self._async_ops.append(op)
 
-            try:
-                future.result()
-            except Exception:
-                log.error('指令执行出错', exc_info=True)
+            # 直接在当前线程执行 stop 可以在执行期间调用 需要中断的等待由停止信号结束
+            planned_start = runner.execute_op(op, planned_start)
 
             with self._op_lock:
                 if not self.running:
@@ -85,6 +92,7 @@ class OperationTask:
                 return True
 
             self.running = False
+            self._stop_event.set()
             if self._current_op is not None:
                 self._current_op.stop()
                 self._current_op = None
@@ -1,7 +1,11 @@
+import math
 from typing import List, Optional
 
+import numpy as np
+
 from one_dragon.base.conditional_operation.operation_task import OperationTask
 from one_dragon.base.conditional_operation.state_handler import StateHandler
+from one_dragon.base.conditional_operation.state_recorder import StateRecorder
 
 
 class SceneHandler:
@@ -11,6 +15,12 @@ class SceneHandler:
         self.state_handlers: List[StateHandler] = state_handlers
         self.priority: Optional[int] = priority  # 优先级 只能被高等级的打断；为None时可以被随意打断
 
+        # 所有状态判断叶子节点的状态记录器和时间区间 用于计算判断结果可能变化的时间
+        leaves = [] if state_handlers is None else [leaf for sh in state_handlers for leaf in sh.get_state_leaves()]
+        self._leaf_recorder_list: List[StateRecorder] = [leaf.state_recorder for leaf in leaves]
+        self._leaf_time_min: np.ndarray = np.array([leaf.state_time_range_min for leaf in leaves], dtype=np.float64)
+        self._leaf_time_max: np.ndarray = np.array([leaf.state_time_range_max for leaf in leaves], dtype=np.float64)
+
     def get_operations(self, trigger_time: float) -> Optional[OperationTask]:
         """
         根据触发时间 和优先级 获取符合条件的场景下的指令
@@ -24,6 +34,23 @@ class SceneHandler:
                 return task
         return None
 
+    def get_next_change_time(self, now: float) -> float:
+        """
+        状态没有更新的情况下 判断结果最早可能发生变化的时间
+        即所有叶子节点的时间区间 在当前时间之后最早的一个边界
+        区间右边界是闭区间 超过之后才会变化 因此加上一点偏移
+        :param now: 当前时间
+        :return: 不会再变化时返回 inf
+        """
+        leaf_cnt = len(self._leaf_recorder_list)
+        if leaf_cnt == 0:
+            return math.inf
+        record_time = np.fromiter((r.last_record_time for r in self._leaf_recorder_list),
+                                  dtype=np.float64, count=leaf_cnt)
+        boundary = np.concatenate((record_time + self._leaf_time_min, record_time + self._leaf_time_max + 1e-3))
+        boundary = boundary[boundary > now]
+        return float(boundary.min()) if len(boundary) > 0 else math.inf
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
@@ -34,11 +61,98 @@ class SceneHandler:
             states = states.union(sh.get_usage_states())
         return states
 
+    def get_interrupt_states(self) -> set[str]:
+        """
+        获取可以打断指令的状态
+        :return:
+        """
+        states: set[str] = set()
+        for sh in self.state_handlers:
+            states = states.union(sh.get_interrupt_states())
+        return states
+
     def dispose(self) -> None:
         """
         销毁
         :return:
         """
+        self._leaf_recorder_list = []
         if self.state_handlers is not None:
             for handler in self.state_handlers:
                 handler.dispose()
+
+
+def __debug():
+    """
+    使用自带的自动战斗配置 检查计算出的变化时间之前 判断结果都不会变化 并统计耗时
+    """
+    import os
+    import random
+    import time
+    import yaml
+    from one_dragon.base.conditional_operation.atomic_op import AtomicOp
+    from one_dragon.base.conditional_operation.utils import construct_scene_handler
+    from one_dragon.utils import os_utils
+
+    def load_yml(sub_dir: str, name: str) -> dict:
+        config_dir = os_utils.get_path_under_work_dir('config', sub_dir)
+        for file_name in [f'{name}.yml', f'{name}.sample.yml']:
+            file_path = os.path.join(config_dir, file_name)
+            if os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    return yaml.safe_load(file)
+
+    recorder_map: dict[str, StateRecorder] = {}
+
+    def state_getter(state_name: str) -> StateRecorder:
+        if state_name not in recorder_map:
+            recorder_map[state_name] = StateRecorder(state_name)
+        return recorder_map[state_name]
+
+    scene_list: List[SceneHandler] = []
+    config_dir = os_utils.get_path_under_work_dir('config', 'auto_battle')
+    for file_name in os.listdir(config_dir):
+        if not file_name.endswith('.yml'):
+            continue
+        with open(os.path.join(config_dir, file_name), 'r', encoding='utf-8') as file:
+            data = yaml.safe_load(file)
+        for scene_data in data.get('scenes', []):
+            scene_list.append(construct_scene_handler(
+                scene_data, state_getter,
+                lambda op_def: AtomicOp(op_def.op_name),
+                lambda name: load_yml('auto_battle_state_handler', name),
+                lambda name: load_yml('auto_battle_operation', name),
+            ))
+
+    def get_expr(scene: SceneHandler, t: float) -> Optional[str]:
+        task = scene.get_operations(t)
+        return None if task is None else task.expr_display
+
+    random.seed(0)
+    now = 100
+    round_cnt = 200
+    cost = 0
+    for _ in range(round_cnt):
+        for recorder in recorder_map.values():
+            recorder.last_record_time = random.choice([-1, 0, now - random.random() * 5, now - random.random() * 50])
+            recorder.last_value = random.choice([None, random.randint(0, 5)])
+        for scene in scene_list:
+            start_time = time.perf_counter()
+            next_change_time = scene.get_next_change_time(now)
+            cost += time.perf_counter() - start_time
+            assert next_change_time > now
+            expr = get_expr(scene, now)
+            # 右边界的变化时间加了一点偏移 只检查偏移之前
+            end_time = min(next_change_time - 1e-3, now + 60)
+            if end_time <= now:
+                continue
+            for t in [now + (end_time - now) * random.random() for _ in range(5)] + [end_time - 1e-6]:
+                assert get_expr(scene, t) == expr
+
+    print('场景 %d 个 叶子节点 %d 个 状态 %d 个 计算变化时间 %.2fus/场景' % (
+        len(scene_list), sum(len(s._leaf_recorder_list) for s in scene_list), len(recorder_map),
+        cost / (round_cnt * len(scene_list)) * 1e6))
+
+
+if __name__ == '__main__':
+    __debug()
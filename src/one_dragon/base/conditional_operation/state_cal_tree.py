@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Callable
+from typing import Optional, Callable, List
 
 from one_dragon.base.conditional_operation.state_recorder import StateRecorder
 from one_dragon.utils.log_utils import log
@@ -57,19 +57,38 @@ class StateCalNode:
         self.state_value_range_min: int = state_value_range_min
         self.state_value_range_max: int = state_value_range_max
 
+        self._evaluator: Optional[Callable[[float], bool]] = None  # 编译后的判断函数
+
+    def compile(self) -> None:
+        """
+        将整棵树编译成一个判断函数 之后 in_time_range 不再需要递归遍历
+        :return:
+        """
+        self._evaluator = compile_state_cal_tree(self)
+
     def in_time_range(self, now: float) -> bool:
         """
         根据当前时间 判断是否在状态的生效时间范围内
         :param now: 当前时间
         :return:
         """
+        if self._evaluator is not None:
+            return self._evaluator(now)
+        return self.in_time_range_by_tree(now)
+
+    def in_time_range_by_tree(self, now: float) -> bool:
+        """
+        递归遍历整棵树进行判断 未编译时使用
+        :param now: 当前时间
+        :return:
+        """
         if self.node_type == StateCalNodeType.OP:
             if self.op_type == StateCalOpType.AND:
-                return self.left_child.in_time_range(now) and self.right_child.in_time_range(now)
+                return self.left_child.in_time_range_by_tree(now) and self.right_child.in_time_range_by_tree(now)
             elif self.op_type == StateCalOpType.OR:
-                return self.left_child.in_time_range(now) or self.right_child.in_time_range(now)
+                return self.left_child.in_time_range_by_tree(now) or self.right_child.in_time_range_by_tree(now)
             elif self.op_type == StateCalOpType.NOT:
-                return not self.left_child.in_time_range(now)
+                return not self.left_child.in_time_range_by_tree(now)
         elif self.node_type == StateCalNodeType.STATE:
             diff = now - self.state_recorder.last_record_time
             # log.debug('状态 [ %s ] 距离上次 %.2f, 要求区间 [%.2f, %.2f]' % (
@@ -110,6 +129,23 @@ class StateCalNode:
             states = states.union(self.right_child.get_usage_states())
         return states
 
+    def get_state_leaves(self) -> List['StateCalNode']:
+        """
+        获取所有状态判断的叶子节点 不递归 表达式很长时也不会超过递归深度
+        :return:
+        """
+        leaves: List[StateCalNode] = []
+        stack: List[StateCalNode] = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.node_type == StateCalNodeType.STATE:
+                leaves.append(node)
+            elif node.node_type == StateCalNodeType.OP:
+                if node.right_child is not None:
+                    stack.append(node.right_child)
+                stack.append(node.left_child)
+        return leaves
+
     def dispose(self) -> None:
         """
         销毁时 将子节点都销毁了
@@ -123,6 +159,97 @@ class StateCalNode:
                 return self.left_child.dispose()
         elif self.node_type == StateCalNodeType.STATE:
             self.state_recorder.dispose()
+        self._evaluator = None
+
+
+def _get_op_chain(node: StateCalNode) -> List[StateCalNode]:
+    """
+    将连续的同一种 and / or 运算展开 按从左到右的顺序返回参与运算的子节点
+    例如 a | b | c 构造出来的是 (a | b) | c 展开后为 [a, b, c]
+    :param node: and / or 节点
+    :return:
+    """
+    chain: List[StateCalNode] = []
+    stack: List[StateCalNode] = [node]
+    while len(stack) > 0:
+        current = stack.pop()
+        if current.node_type == StateCalNodeType.OP and current.op_type == node.op_type:
+            stack.append(current.right_child)
+            stack.append(current.left_child)
+        else:
+            chain.append(current)
+    return chain
+
+
+def _gen_state_cal_expr(node: StateCalNode, gen_leaf: Callable[[StateCalNode], str]) -> str:
+    """
+    生成状态判断树对应的Python表达式 保留 and / or 的短路
+    连续的同一种运算合并成一层 例如 (a or b or c) 避免长表达式的括号嵌套超过Python的限制
+    :param node: 节点
+    :param gen_leaf: 生成叶子节点表达式的方法
+    :return:
+    """
+    if node.node_type == StateCalNodeType.TRUE:
+        return 'True'
+    elif node.node_type == StateCalNodeType.OP:
+        if node.op_type in [StateCalOpType.AND, StateCalOpType.OR]:
+            joiner = ' and ' if node.op_type == StateCalOpType.AND else ' or '
+            return '(%s)' % joiner.join(_gen_state_cal_expr(child, gen_leaf) for child in _get_op_chain(node))
+        else:
+            return '(not %s)' % _gen_state_cal_expr(node.left_child, gen_leaf)
+    else:
+        return gen_leaf(node)
+
+
+def _compile_evaluator(root: StateCalNode, gen_source: Callable[[], str],
+                       namespace: dict) -> Optional[Callable]:
+    """
+    生成源码并编译出判断函数
+    嵌套太深等原因无法编译时返回None 由调用方使用原来的判断方式
+    :param root: 根节点 用于日志
+    :param gen_source: 生成源码的方法 函数名为 _evaluate
+    :param namespace: 执行源码的命名空间
+    :return:
+    """
+    try:
+        exec(compile(gen_source(), '<state_cal_tree>', 'exec'), namespace)
+    except (SyntaxError, RecursionError, MemoryError):
+        log.warning('状态判断树无法编译 使用遍历判断 使用状态 %s', root.get_usage_states(), exc_info=True)
+        return None
+    return namespace['_evaluate']
+
+
+def compile_state_cal_tree(root: StateCalNode) -> Optional[Callable[[float], bool]]:
+    """
+    将状态判断树编译成一个Python函数
+    整棵树生成一个表达式 保留 and / or 的短路 避免每次判断时递归调用和枚举比较
+    状态记录器和区间常量都作为函数的默认参数绑定 读取时是局部变量
+    :param root: 根节点
+    :return: 判断函数 入参为当前时间; 无法编译时返回None
+    """
+    bind_map: dict[str, object] = {}
+
+    def bind(value) -> str:
+        name = '_v%d' % len(bind_map)
+        bind_map[name] = value
+        return name
+
+    def gen_leaf(node: StateCalNode) -> str:
+        recorder = bind(node.state_recorder)
+        expr = '(%s <= now - %s.last_record_time <= %s)' % (
+            bind(node.state_time_range_min), recorder, bind(node.state_time_range_max))
+        if node.state_value_range_min is not None and node.state_value_range_max is not None:
+            expr = '(%s and %s.last_value is not None and %s <= %s.last_value <= %s)' % (
+                expr, recorder, bind(node.state_value_range_min), recorder, bind(node.state_value_range_max))
+        return expr
+
+    def gen_source() -> str:
+        body = _gen_state_cal_expr(root, gen_leaf)
+        args = ''.join(', %s=%s' % (name, name) for name in bind_map)
+        return 'def _evaluate(now%s):\n    return %s\n' % (args, body)
+
+    # 绑定的值在生成源码时才确定 直接作为执行的命名空间
+    return _compile_evaluator(root, gen_source, bind_map)
 
 
 def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateRecorder]) -> StateCalNode:
@@ -133,7 +260,9 @@ def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateR
     :return: 构造成功时，返回状态判断树的根节点；构造失败时，返回原因
     """
     if len(expr_str) == 0:
-        return StateCalNode(StateCalNodeType.TRUE)
+        root = StateCalNode(StateCalNodeType.TRUE)
+        root.compile()
+        return root
     log.debug('构造状态判断树 ' + expr_str)
 
     op_stack = []  # 运算符的压栈
@@ -269,23 +398,118 @@ def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateR
     if len(node_stack) > 1:
         raise ValueError('有多段表达式 未使用运算符连接')
     else:
-        return node_stack[0]
+        root = node_stack[0]
+        root.compile()
+        return root
 
             
 def __debug():
     expr = "( [闪避识别-黄光, 0, 1] | [闪避识别-红光, 0, 1] ) & ![按键-闪避, 0, 1]{0, 1}"
-    ctx = None
     sr1 = StateRecorder('闪避识别-黄光')
     sr1.last_record_time = 1
     sr2 = StateRecorder('闪避识别-红光')
     sr2.last_record_time = 2
     sr3 = StateRecorder('按键-闪避')
     sr3.last_record_time = 1
-    node = construct_state_cal_tree(expr, [sr1, sr2, sr3])
+    recorder_map = {sr.state_name: sr for sr in [sr1, sr2, sr3]}
+    node = construct_state_cal_tree(expr, recorder_map.get)
     assert node.in_time_range(2)  # True
+    assert node.in_time_range_by_tree(2)
     sr3.last_value = 1
     assert not node.in_time_range(2)  # False
+    assert not node.in_time_range_by_tree(2)
+
+    # 几百个状态连接的长表达式 编译时不能超过括号嵌套的限制
+    long_recorder_map = {'状态%d' % i: StateRecorder('状态%d' % i) for i in range(400)}
+    for op in ['|', '&']:
+        long_expr = (' %s ' % op).join('[%s, 0, 1]' % name for name in long_recorder_map)
+        long_node = construct_state_cal_tree('!(%s) | (%s)' % (long_expr, long_expr), long_recorder_map.get)
+        assert long_node._evaluator is not None
+        for t in [-1, 1]:
+            for recorder in long_recorder_map.values():
+                recorder.last_record_time = t
+            assert long_node.in_time_range(1) == long_node.in_time_range_by_tree(1)
+
+
+def __debug_benchmark():
+    """
+    使用自带的自动战斗配置 对比递归遍历和编译后的判断速度
+    """
+    import os
+    import random
+    import time
+    import yaml
+    from one_dragon.utils import os_utils
+
+    expr_list: list[str] = []
+
+    def collect(data) -> None:
+        if isinstance(data, dict):
+            if isinstance(data.get('states'), str):
+                expr_list.append(data['states'])
+            for v in data.values():
+                collect(v)
+        elif isinstance(data, list):
+            for v in data:
+                collect(v)
+
+    for sub_dir in ['auto_battle', 'auto_battle_state_handler']:
+        config_dir = os_utils.get_path_under_work_dir('config', sub_dir)
+        for file_name in os.listdir(config_dir):
+            if not file_name.endswith('.yml'):
+                continue
+            with open(os.path.join(config_dir, file_name), 'r', encoding='utf-8') as file:
+                collect(yaml.safe_load(file))
+
+    recorder_map: dict[str, StateRecorder] = {}
+
+    def state_getter(state_name: str) -> StateRecorder:
+        if state_name not in recorder_map:
+            recorder_map[state_name] = StateRecorder(state_name)
+        return recorder_map[state_name]
+
+    root_list = [construct_state_cal_tree(expr, state_getter) for expr in expr_list]
+
+    random.seed(0)
+    now = 100
+    round_cnt = 200
+    state_list = []
+    for _ in range(round_cnt):
+        state_list.append([(random.choice([-1, 0, now - random.random() * 5, now - random.random() * 50]),
+                            random.choice([None, random.randint(0, 5)]))
+                           for _ in recorder_map])
+
+    def apply_state(idx: int) -> None:
+        for recorder, (t, v) in zip(recorder_map.values(), state_list[idx]):
+            recorder.last_record_time = t
+            recorder.last_value = v
+
+    # 结果一致性
+    for idx in range(round_cnt):
+        apply_state(idx)
+        for root in root_list:
+            assert root.in_time_range(now) == root.in_time_range_by_tree(now)
+
+    tree_cost = 0
+    compiled_cost = 0
+    for idx in range(round_cnt):
+        apply_state(idx)
+        start_time = time.perf_counter()
+        for root in root_list:
+            root.in_time_range_by_tree(now)
+        tree_cost += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for root in root_list:
+            root.in_time_range(now)
+        compiled_cost += time.perf_counter() - start_time
+
+    eval_cnt = round_cnt * len(root_list)
+    print('表达式 %d 个 状态 %d 个' % (len(root_list), len(recorder_map)))
+    print('递归遍历 %.3fus/次 编译后 %.3fus/次 提升 %.2f倍' % (
+        tree_cost / eval_cnt * 1e6, compiled_cost / eval_cnt * 1e6, tree_cost / compiled_cost))
 
 
 if __name__ == '__main__':
     __debug()
+    __debug_benchmark()
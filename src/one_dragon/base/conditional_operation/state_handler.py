@@ -62,6 +62,31 @@ class StateHandler:
                 states = states.union(sub.get_usage_states())
         return states
 
+    def get_state_leaves(self) -> List[StateCalNode]:
+        """
+        获取自身及子处理器的所有状态判断叶子节点
+        :return:
+        """
+        leaves: List[StateCalNode] = []
+        if self.state_cal_tree is not None:
+            leaves.extend(self.state_cal_tree.get_state_leaves())
+        if self.sub_handlers is not None:
+            for sub in self.sub_handlers:
+                leaves.extend(sub.get_state_leaves())
+        return leaves
+
+    def get_interrupt_states(self) -> set[str]:
+        """
+        获取可以打断指令的状态
+        :return:
+        """
+        states: set[str] = set()
+        if self.interrupt_states is not None:
+            states = states.union(self.interrupt_states)
+        if self.sub_handlers is not None:
+            for sub in self.sub_handlers:
+                states = states.union(sub.get_interrupt_states())
+        return states
 
     def dispose(self) -> None:
         """
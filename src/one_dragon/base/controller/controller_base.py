@@ -1,16 +1,24 @@
 import time
 
 from cv2.typing import MatLike
-from typing import List
+from typing import List, Optional, Tuple
 
+from one_dragon.base.controller.screenshot_buffer import ScreenshotLease
 from one_dragon.base.geometry.point import Point
 
 
 class ScreenshotWithTime:
 
-    def __init__(self, screenshot: MatLike, create_time: float):
+    def __init__(self, screenshot: MatLike, create_time: float, frame_id: int = 0):
+        """
+        一帧截图
+        :param screenshot: 截图
+        :param create_time: 截图时间
+        :param frame_id: 截图序号 每次截图递增
+        """
         self.image: MatLike = screenshot
         self.create_time: float = create_time
+        self.frame_id: int = frame_id
 
 
 class ControllerBase:
@@ -24,6 +32,7 @@ class ControllerBase:
         self.screenshot_history: List[ScreenshotWithTime] = []
         self.screenshot_alive_seconds: float = screenshot_alive_seconds  # 截图在内存的存活时间
         self.max_screenshot_cnt: int = max_screenshot_cnt  # 内存中最多保持的截图数量
+        self._screenshot_frame_id: int = 0  # 截图序号
 
     def init_before_context_run(self) -> bool:
         """
@@ -54,13 +63,43 @@ class ControllerBase:
         """
         截图并保存在内存中
         """
+        return self.screenshot_frame(independent).image
+
+    def screenshot_frame(self, independent: bool = False) -> ScreenshotWithTime:
+        """
+        截图并保存在内存中
+        :return: 带截图时间和序号的截图
+        """
         self.before_screenshot()
         now = time.time()
         screen = self.get_screenshot(independent)
+        return self._to_screenshot_frame(screen, now)
+
+    def screenshot_frame_leased(self) -> Tuple[ScreenshotWithTime, Optional[ScreenshotLease]]:
+        """
+        截图并写入截图缓冲区 用于高频截图的战斗流程
+        截图会占用缓冲区中的数组 使用完后需要调用 release 归还 归还前不会被之后的截图覆盖
+        没有启用缓冲区时与 screenshot_frame 一致
+        :return: 带截图时间和序号的截图, 缓冲区的占用 没有使用缓冲区时为None
+        """
+        self.before_screenshot()
+        now = time.time()
+        screen, lease = self.get_screenshot_leased()
+        return self._to_screenshot_frame(screen, now), lease
+
+    def _to_screenshot_frame(self, screen: MatLike, now: float) -> ScreenshotWithTime:
+        """
+        遮挡UID 并按需要保存在内存中
+        :param screen: 截图
+        :param now: 截图时间
+        :return: 带截图时间和序号的截图
+        """
         fix_screen = self.fill_uid_black(screen)
+        self._screenshot_frame_id += 1
+        frame = ScreenshotWithTime(fix_screen, now, self._screenshot_frame_id)
 
         if self.max_screenshot_cnt > 0:
-            self.screenshot_history.append(ScreenshotWithTime(fix_screen, now))
+            self.screenshot_history.append(frame)
             while len(self.screenshot_history) > self.max_screenshot_cnt:
                 self.screenshot_history.pop(0)
 
@@ -68,7 +107,15 @@ class ControllerBase:
                 and now - self.screenshot_history[0].create_time > self.screenshot_alive_seconds):
                 self.screenshot_history.pop(0)
 
-        return fix_screen
+        return frame
+
+    def set_screenshot_buffer_size(self, size: int) -> None:
+        """
+        设置截图缓冲区数量 只影响 screenshot_frame_leased 由子类实现
+        :param size: 缓冲区数量 0为不启用
+        :return:
+        """
+        pass
 
     def before_screenshot(self) -> None:
         """
@@ -84,6 +131,13 @@ class ControllerBase:
         """
         pass
 
+    def get_screenshot_leased(self) -> Tuple[MatLike, Optional[ScreenshotLease]]:
+        """
+        截图并写入截图缓冲区 由子类实现
+        :return: 截图, 缓冲区的占用 没有使用缓冲区时为None
+        """
+        return self.get_screenshot(), None
+
     def fill_uid_black(self, screen: MatLike) -> MatLike:
         """
         遮挡UID 由子类实现
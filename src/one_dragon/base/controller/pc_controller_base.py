@@ -8,7 +8,7 @@ from PIL.Image import Image
 from cv2.typing import MatLike
 from functools import lru_cache
 from pynput import keyboard
-from typing import Optional
+from typing import Optional, Tuple
 
 from one_dragon.base.controller.controller_base import ControllerBase
 from one_dragon.base.controller.pc_button import pc_button_utils
@@ -17,6 +17,8 @@ from one_dragon.base.controller.pc_button.keyboard_mouse_controller import Keybo
 from one_dragon.base.controller.pc_button.pc_button_controller import PcButtonController
 from one_dragon.base.controller.pc_button.xbox_button_controller import XboxButtonController
 from one_dragon.base.controller.pc_game_window import PcGameWindow
+from one_dragon.base.controller.screenshot_buffer import ScreenshotBufferRing, ScreenshotLease, bgra_to_rgb, \
+    get_rgb_shape, wrap_bgra
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.utils.log_utils import log
@@ -31,6 +33,11 @@ class PcControllerBase(ControllerBase):
     def __init__(self, win_title: str,
                  standard_width: int = 1920,
                  standard_height: int = 1080):
+        """
+        :param win_title: 游戏窗口标题
+        :param standard_width: 默认分辨率的宽
+        :param standard_height: 默认分辨率的高
+        """
         ControllerBase.__init__(self)
         self.standard_width: int = standard_width
         self.standard_height: int = standard_height
@@ -43,6 +50,7 @@ class PcControllerBase(ControllerBase):
 
         self.btn_controller: PcButtonController = self.keyboard_controller
         self.sct = None
+        self.screenshot_buffer: ScreenshotBufferRing = ScreenshotBufferRing()  # 只给 screenshot_frame_leased 使用
 
     def init_before_context_run(self) -> bool:
         pyautogui.FAILSAFE = False  # 禁用 Fail-Safe,防止鼠标接近屏幕的边缘或角落时报错
@@ -129,28 +137,63 @@ class PcControllerBase(ControllerBase):
         width = rect.width
         height = rect.height
 
+        target_size = (self.standard_width, self.standard_height) if self.game_win.is_win_scale else None
+
         if self.sct is not None:
             monitor = {"top": top, "left": left, "width": width, "height": height}
             if independent:
                 try:
                     import mss
                     with mss.mss() as sct:
-                        screenshot = cv2.cvtColor(np.array(sct.grab(monitor)), cv2.COLOR_BGRA2RGB)
+                        sct_img = sct.grab(monitor)
+                        return bgra_to_rgb(wrap_bgra(sct_img.raw, sct_img.width, sct_img.height),
+                                           target_size=target_size)
                 except Exception:
                     pass
             else:
-                screenshot = cv2.cvtColor(np.array(self.sct.grab(monitor)), cv2.COLOR_BGRA2RGB)
-        else:
-            img: Image = pyautogui.screenshot(region=(left, top, width, height))
-            screenshot = np.array(img)
+                # 直接包装mss的内存 不经过中间的复制
+                sct_img = self.sct.grab(monitor)
+                return bgra_to_rgb(wrap_bgra(sct_img.raw, sct_img.width, sct_img.height),
+                                   target_size=target_size)
 
-        if self.game_win.is_win_scale:
-            result = cv2.resize(screenshot, (self.standard_width, self.standard_height))
+        img: Image = pyautogui.screenshot(region=(left, top, width, height))
+        screenshot = np.array(img)
+
+        if target_size is not None:
+            result = cv2.resize(screenshot, target_size)
         else:
             result = screenshot
 
         return result
 
+    def get_screenshot_leased(self) -> Tuple[MatLike, Optional[ScreenshotLease]]:
+        """
+        截图并写入截图缓冲区
+        缓冲区未启用、全部被占用、或者需要保留截图历史时 与 get_screenshot 一致
+        :return: 截图, 缓冲区的占用 没有使用缓冲区时为None
+        """
+        if self.sct is None or not self.screenshot_buffer.enabled or self.max_screenshot_cnt > 0:
+            return self.get_screenshot(), None
+
+        rect: Rect = self.game_win.win_rect
+        monitor = {"top": rect.y1, "left": rect.x1, "width": rect.width, "height": rect.height}
+        target_size = (self.standard_width, self.standard_height) if self.game_win.is_win_scale else None
+
+        sct_img = self.sct.grab(monitor)
+        bgra = wrap_bgra(sct_img.raw, sct_img.width, sct_img.height)
+        lease = self.screenshot_buffer.acquire(get_rgb_shape(bgra, target_size))
+        screen = bgra_to_rgb(bgra, ring=self.screenshot_buffer, target_size=target_size,
+                             dst=lease.image if lease is not None else None)
+        return screen, lease
+
+    def set_screenshot_buffer_size(self, size: int) -> None:
+        """
+        设置截图缓冲区数量 仍在使用中的截图不受影响
+        :param size: 缓冲区数量 0为不启用
+        :return:
+        """
+        self.screenshot_buffer.resize(size)
+
     def scroll(self, down: int, pos: Point = None):
         """
         向下滚动
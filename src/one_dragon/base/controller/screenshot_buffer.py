@@ -0,0 +1,282 @@
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import Optional, List, Tuple
+
+
+class ScreenshotLease:
+
+    def __init__(self, ring: 'ScreenshotBufferRing', idx: int, gen: int, image: np.ndarray):
+        """
+        缓冲区中一个数组的占用 占用计数归零前 这个数组不会被写入新的截图
+        :param ring: 所属的缓冲区
+        :param idx: 数组下标
+        :param gen: 缓冲区的代数 缓冲区重新分配后 旧的占用不再生效
+        :param image: 写入截图的数组
+        """
+        self.ring: ScreenshotBufferRing = ring
+        self.idx: int = idx
+        self.gen: int = gen
+        self.image: np.ndarray = image
+
+    def retain(self) -> None:
+        """
+        增加一次占用 每次调用都需要对应一次 release
+        :return:
+        """
+        self.ring._retain(self)
+
+    def release(self) -> None:
+        """
+        归还一次占用
+        :return:
+        """
+        self.ring._release(self)
+
+
+class ScreenshotBufferRing:
+
+    def __init__(self, size: int = 0):
+        """
+        截图输出的环形缓冲区 截图转换时直接写入预先分配好的数组 稳定运行后不再分配内存
+        每次截图会占用一个数组 使用方全部归还后才会被下一次截图复用 不会覆盖仍在使用的截图
+        全部数组都被占用时 由调用方分配新的数组 size 只影响是否需要额外分配内存
+        :param size: 缓冲区数量 0为不启用
+        """
+        self.size: int = size
+        self._buffer_list: List[np.ndarray] = []
+        self._lease_cnt: List[int] = []
+        self._next_idx: int = 0
+        self._gen: int = 0  # 重新分配的次数
+        self._lock = threading.Lock()
+        self._scale_local = threading.local()  # 缩放前的中间结果 每次转换后就不再使用 每个线程一个 避免并发截图时互相覆盖
+        self.exhausted_cnt: int = 0  # 全部数组都被占用 需要额外分配的次数
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def acquire(self, shape: Tuple[int, ...]) -> Optional[ScreenshotLease]:
+        """
+        从下一个位置开始 找一个没有被占用的数组 尺寸变化时重新分配
+        :param shape: 需要的尺寸
+        :return: 返回时已经占用一次 未启用或者全部被占用时返回None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            for offset in range(self.size):
+                idx = (self._next_idx + offset) % self.size
+                if idx >= len(self._buffer_list):
+                    self._buffer_list.append(np.empty(shape, dtype=np.uint8))
+                    self._lease_cnt.append(0)
+                elif self._lease_cnt[idx] > 0:
+                    continue
+                elif self._buffer_list[idx].shape != shape:
+                    self._buffer_list[idx] = np.empty(shape, dtype=np.uint8)
+                self._lease_cnt[idx] = 1
+                self._next_idx = (idx + 1) % self.size
+                return ScreenshotLease(self, idx, self._gen, self._buffer_list[idx])
+            self.exhausted_cnt += 1
+            return None
+
+    def _retain(self, lease: ScreenshotLease) -> None:
+        with self._lock:
+            if lease.gen == self._gen:
+                self._lease_cnt[lease.idx] += 1
+
+    def _release(self, lease: ScreenshotLease) -> None:
+        with self._lock:
+            if lease.gen == self._gen and self._lease_cnt[lease.idx] > 0:
+                self._lease_cnt[lease.idx] -= 1
+
+    def scale_buffer(self, shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        """
+        获取缩放前使用的中间数组 每个线程各自持有一个
+        :param shape: 需要的尺寸
+        :return: 未启用时返回None
+        """
+        if not self.enabled:
+            return None
+        scale_local = self._scale_local
+        buffer: Optional[np.ndarray] = getattr(scale_local, 'buffer', None)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            scale_local.buffer = buffer
+        return buffer
+
+    def resize(self, size: int) -> None:
+        """
+        修改缓冲区数量 已分配的数组会被释放
+        仍在使用中的截图不受影响 只是不再回到缓冲区中复用
+        :param size: 缓冲区数量
+        :return:
+        """
+        with self._lock:
+            self.size = size
+            self._buffer_list = []
+            self._lease_cnt = []
+            self._next_idx = 0
+            self._gen += 1
+            self._scale_local = threading.local()
+            self.exhausted_cnt = 0
+
+
+def get_ring_size(screenshot_interval: float, frame_budget: float) -> int:
+    """
+    按截图间隔和一帧画面的有效时间 估算缓冲区数量
+    有效时间内的截图都可能还在识别中 另外留出正在截图和最后一张截图各一个
+    :param screenshot_interval: 截图间隔 秒
+    :param frame_budget: 一帧画面的有效时间 秒
+    :return: 缓冲区数量
+    """
+    return math.ceil(frame_budget / max(screenshot_interval, 0.001)) + 2
+
+
+def wrap_bgra(raw, width: int, height: int) -> np.ndarray:
+    """
+    不复制内存 将截图库返回的BGRA数据包装成数组
+    :param raw: BGRA数据 需要支持 buffer protocol 例如 mss 的 ScreenShot.raw
+    :param width: 宽
+    :param height: 高
+    :return: (height, width, 4) 的数组
+    """
+    return np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 4)
+
+
+def get_rgb_shape(bgra: np.ndarray, target_size: Optional[Tuple[int, int]] = None) -> Tuple[int, int, int]:
+    """
+    转换后的RGB截图尺寸
+    :param bgra: BGRA截图
+    :param target_size: 缩放后的尺寸 (width, height) None时不缩放
+    :return: (height, width, 3)
+    """
+    if target_size is None:
+        return bgra.shape[0], bgra.shape[1], 3
+    return target_size[1], target_size[0], 3
+
+
+def bgra_to_rgb(bgra: np.ndarray,
+                ring: Optional[ScreenshotBufferRing] = None,
+                target_size: Optional[Tuple[int, int]] = None,
+                dst: Optional[np.ndarray] = None) -> MatLike:
+    """
+    将BGRA截图转换为RGB 并按需要缩放
+    有输出数组时结果直接写入 不分配新的内存
+    :param bgra: BGRA截图
+    :param ring: 缓冲区 提供缩放前使用的中间数组
+    :param target_size: 缩放后的尺寸 (width, height) None时不缩放
+    :param dst: 输出的数组 尺寸需要与 get_rgb_shape 一致
+    :return: RGB截图
+    """
+    height, width = bgra.shape[0], bgra.shape[1]
+    if target_size is None or (target_size[0] == width and target_size[1] == height):
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=dst)
+
+    scale_dst = ring.scale_buffer((height, width, 3)) if ring is not None else None
+    rgb = cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=scale_dst)
+    return cv2.resize(rgb, target_size, dst=dst)
+
+
+class FakeScreenShot:
+
+    def __init__(self, raw: bytearray, width: int, height: int):
+        """
+        与 mss 的 ScreenShot 相同的字段 用于测试
+        """
+        self.raw: bytearray = raw
+        self.width: int = width
+        self.height: int = height
+
+
+class FakeScreenGrabber:
+
+    def __init__(self, width: int = 1920, height: int = 1080, frame_cnt: int = 4):
+        """
+        模拟 mss.mss() 的截图器 循环返回预先生成的随机画面
+        可以在没有桌面环境的机器上测试截图后的处理速度
+        :param width: 宽
+        :param height: 高
+        :param frame_cnt: 预先生成的画面数量
+        """
+        self.width: int = width
+        self.height: int = height
+        rng = np.random.default_rng(0)
+        self._frame_list: List[bytearray] = [
+            bytearray(rng.integers(0, 256, size=width * height * 4, dtype=np.uint8).tobytes())
+            for _ in range(frame_cnt)
+        ]
+        self._idx: int = 0
+
+    def grab(self, monitor: dict) -> FakeScreenShot:
+        raw = self._frame_list[self._idx]
+        self._idx = (self._idx + 1) % len(self._frame_list)
+        return FakeScreenShot(raw, self.width, self.height)
+
+    def close(self) -> None:
+        pass
+
+
+def __debug_benchmark():
+    """
+    对比原来的截图处理和使用缓冲区后的速度
+    """
+    for width, height, target_size in [(1920, 1080, None), (2560, 1440, (1920, 1080))]:
+        grabber = FakeScreenGrabber(width, height)
+        monitor = {'top': 0, 'left': 0, 'width': width, 'height': height}
+        ring = ScreenshotBufferRing(size=8)
+        run_times = 300
+
+        start_time = time.time()
+        for _ in range(run_times):
+            screenshot = cv2.cvtColor(np.array(grabber.grab(monitor).raw, dtype=np.uint8).reshape(height, width, 4),
+                                      cv2.COLOR_BGRA2RGB)
+            if target_size is not None:
+                screenshot = cv2.resize(screenshot, target_size)
+        old_cost = (time.time() - start_time) / run_times
+
+        start_time = time.time()
+        for _ in range(run_times):
+            sct_img = grabber.grab(monitor)
+            bgra = wrap_bgra(sct_img.raw, sct_img.width, sct_img.height)
+            lease = ring.acquire(get_rgb_shape(bgra, target_size))
+            bgra_to_rgb(bgra, ring, target_size, dst=lease.image)
+            lease.release()
+        new_cost = (time.time() - start_time) / run_times
+
+        print('%dx%d -> %s 原来 %.2fms 缓冲区 %.2fms' % (width, height, target_size, old_cost * 1000, new_cost * 1000))
+
+
+def __debug_lease():
+    """
+    模拟识别比截图慢 检查仍被占用的截图没有被之后的截图覆盖
+    """
+    grabber = FakeScreenGrabber(64, 36, frame_cnt=1)
+    monitor = {'top': 0, 'left': 0, 'width': 64, 'height': 36}
+    ring = ScreenshotBufferRing(size=get_ring_size(0.02, 0.2))
+    hold_list: List[Tuple[ScreenshotLease, int]] = []
+    overwritten_cnt = 0
+    for frame_id in range(200):
+        sct_img = grabber.grab(monitor)
+        bgra = wrap_bgra(sct_img.raw, sct_img.width, sct_img.height)
+        lease = ring.acquire(get_rgb_shape(bgra))
+        screen = bgra_to_rgb(bgra, ring, dst=lease.image if lease is not None else None)
+        screen[0, 0, 0] = frame_id % 256
+        if lease is not None and frame_id % 3 == 0:
+            hold_list.append((lease, frame_id))  # 每3帧有1帧的识别很慢 占用30帧
+        elif lease is not None:
+            lease.release()
+        overwritten_cnt += sum(1 for held, held_id in hold_list if held.image[0, 0, 0] != held_id % 256)
+        while len(hold_list) > 0 and frame_id - hold_list[0][1] >= 30:
+            hold_list.pop(0)[0].release()
+    print('缓冲区 %d 最后占用中 %d 被覆盖 %d 额外分配 %d' % (ring.size, len(hold_list), overwritten_cnt,
+                                                      ring.exhausted_cnt))
+
+
+if __name__ == '__main__':
+    __debug_benchmark()
+    __debug_lease()
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Any
+
+from cv2.typing import MatLike
+
+from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
+
+
+class OcrCache:
+
+    def __init__(self, max_size: int = 128):
+        """
+        OCR结果的缓存 以图片内容的哈希作为key 超出数量时淘汰最久未使用的
+        同一个画面在多轮重试中会反复识别 命中时可以直接返回上一次的结果
+        :param max_size: 最多缓存的结果数量 0为不使用缓存
+        """
+        self.max_size: int = max_size
+        self._cache: OrderedDict[tuple, dict[str, MatchResultList]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hit_cnt: int = 0  # 命中次数
+        self.miss_cnt: int = 0  # 未命中次数
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hit_cnt + self.miss_cnt
+        return 0 if total == 0 else self.hit_cnt / total
+
+    def get(self, key: tuple) -> Optional[dict[str, MatchResultList]]:
+        """
+        获取缓存的结果
+        :param key: make_key 生成的key
+        :return: 结果的副本 调用方可以随意修改
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            result_map = self._cache.get(key)
+            if result_map is None:
+                self.miss_cnt += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hit_cnt += 1
+        return copy_ocr_result(result_map)
+
+    def put(self, key: tuple, result_map: dict[str, MatchResultList]) -> None:
+        """
+        保存结果
+        :param key: make_key 生成的key
+        :param result_map: OCR结果 会保存一份副本
+        :return:
+        """
+        if not self.enabled:
+            return
+        to_save = copy_ocr_result(result_map)
+        with self._lock:
+            self._cache[key] = to_save
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        清除缓存和计数
+        :return:
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hit_cnt = 0
+            self.miss_cnt = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def make_key(image: MatLike, *args: Any) -> tuple:
+        """
+        生成缓存的key 由图片内容的哈希和其它识别参数组成
+        :param image: 图片
+        :param args: 其它影响结果的参数 例如阈值
+        :return:
+        """
+        digest = hashlib.blake2b(image.data if image.flags['C_CONTIGUOUS'] else image.tobytes(),
+                                 digest_size=16).digest()
+        return (digest, image.shape, image.dtype.str) + args
+
+
+def copy_ocr_result(result_map: dict[str, MatchResultList]) -> dict[str, MatchResultList]:
+    """
+    复制OCR结果 避免调用方修改缓存中的内容
+    :param result_map: OCR结果
+    :return:
+    """
+    copy_map: dict[str, MatchResultList] = {}
+    for key, mrl in result_map.items():
+        new_mrl = MatchResultList(only_best=mrl.only_best)
+        for mr in mrl.arr:
+            new_mrl.append(MatchResult(mr.confidence, mr.x, mr.y, mr.w, mr.h,
+                                       template_scale=mr.template_scale, data=mr.data),
+                           auto_merge=False)
+        copy_map[key] = new_mrl
+    return copy_map
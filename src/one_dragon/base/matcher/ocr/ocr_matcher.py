@@ -1,12 +1,19 @@
 from cv2.typing import MatLike
+from typing import List, Optional
 
+from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.matcher.match_result import MatchResultList
+from one_dragon.base.matcher.ocr.ocr_cache import OcrCache
+from one_dragon.utils import cv2_utils
 
 
 class OcrMatcher:
 
-    def __init__(self):
-        pass
+    def __init__(self, cache_size: int = 0):
+        """
+        :param cache_size: OCR结果缓存的数量 0为不使用缓存
+        """
+        self.cache: OcrCache = OcrCache(max_size=cache_size)
 
     def init_model(self) -> bool:
         pass
@@ -23,12 +30,56 @@ class OcrMatcher:
         pass
 
     def run_ocr(self, image: MatLike, threshold: float = None,
-                merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+                merge_line_distance: float = -1,
+                max_candidates: Optional[int] = None,
+                det_size: Optional[int] = None,
+                text_height: Optional[float] = None) -> dict[str, MatchResultList]:
         """
         对图片进行OCR 返回所有匹配结果
         :param image: 图片
         :param threshold: 匹配阈值
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
+        :param max_candidates: 文本检测最多检查的候选区域数量 None时使用模型默认值(1000) 候选区域没有按得分排序 小于实际数量时会丢失文字 目前的画面远达不到默认值 一般不需要传入
+        :param det_size: 文本检测时图片长边的上限 超过时缩小 None时使用模型默认值
+        :param text_height: 图片上预期的文字高度 传入且没有 det_size 时 按文字高度自动选择检测尺寸 大字可以缩得更小 只适合大字的整屏 小区域的耗时主要在文字识别 缩小检测尺寸不会更快 反而容易漏检
         :return: {key_word: []}
         """
         pass
+
+    def run_ocr_without_det(self, image: MatLike, threshold: float = None) -> dict[str, MatchResultList]:
+        """
+        不进行文本检测 将整张图片作为单行文本识别 适用于固定位置的单行文本
+        子类不支持时 使用完整的OCR
+        :param image: 图片
+        :param threshold: 匹配阈值
+        :return: {key_word: []} 结果位置为整张图片
+        """
+        return self.run_ocr(image, threshold)
+
+    def run_ocr_batch(self, image_list: List[MatLike], threshold: float = None,
+                      merge_line_distance: float = -1) -> List[dict[str, MatchResultList]]:
+        """
+        对多张图片进行OCR 子类可以合并成一批识别
+        :param image_list: 图片列表
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: 每张图片的结果 {key_word: []}
+        """
+        return [self.run_ocr(image, threshold, merge_line_distance=merge_line_distance) for image in image_list]
+
+    def run_ocr_regions(self, screen: MatLike, rect_list: List[Rect], threshold: float = None,
+                        merge_line_distance: float = -1) -> List[dict[str, MatchResultList]]:
+        """
+        对同一张截图中的多个区域进行OCR 所有区域合并成一批识别
+        :param screen: 截图
+        :param rect_list: 区域列表
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: 每个区域的结果 {key_word: []} 坐标已经转换成截图上的坐标
+        """
+        part_list = [cv2_utils.crop_image_only(screen, rect) for rect in rect_list]
+        result_list = self.run_ocr_batch(part_list, threshold, merge_line_distance=merge_line_distance)
+        for rect, result_map in zip(rect_list, result_list):
+            for mrl in result_map.values():
+                mrl.add_offset(rect.left_top)
+        return result_list
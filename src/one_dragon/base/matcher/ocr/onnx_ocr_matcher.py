@@ -2,10 +2,11 @@ import time
 
 import os
 from cv2.typing import MatLike
-from typing import List
+from typing import List, Tuple, Optional
 
 from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 from one_dragon.base.matcher.ocr import ocr_utils
+from one_dragon.base.matcher.ocr.ocr_cache import OcrCache
 from one_dragon.base.matcher.ocr.ocr_matcher import OcrMatcher
 from one_dragon.utils import os_utils
 from one_dragon.utils import str_utils
@@ -19,8 +20,11 @@ class OnnxOcrMatcher(OcrMatcher):
     TODO 未测试使用 RGB图片是否有影响
     """
 
-    def __init__(self):
-        OcrMatcher.__init__(self)
+    def __init__(self, cache_size: int = 128):
+        """
+        :param cache_size: OCR结果缓存的数量 0为不使用缓存
+        """
+        OcrMatcher.__init__(self, cache_size=cache_size)
         self._model = None
         self._loading: bool = False
 
@@ -73,22 +77,84 @@ class OnnxOcrMatcher(OcrMatcher):
             return tmp
 
     def run_ocr(self, image: MatLike, threshold: float = None,
-                merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+                merge_line_distance: float = -1,
+                max_candidates: Optional[int] = None,
+                det_size: Optional[int] = None,
+                text_height: Optional[float] = None) -> dict[str, MatchResultList]:
         """
         对图片进行OCR 返回所有匹配结果
         :param image: 图片
         :param threshold: 匹配阈值
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
+        :param max_candidates: 文本检测最多检查的候选区域数量 None时使用模型默认值(1000) 候选区域没有按得分排序 小于实际数量时会丢失文字 目前的画面远达不到默认值 一般不需要传入
+        :param det_size: 文本检测时图片长边的上限 超过时缩小 None时使用模型默认值
+        :param text_height: 图片上预期的文字高度 传入且没有 det_size 时 按文字高度自动选择检测尺寸 只适合大字的整屏
         :return: {key_word: []}
         """
         start_time = time.time()
+        if det_size is None and text_height is not None:
+            from onnxocr.predict_det import get_det_size_by_text_height
+            det_size = get_det_size_by_text_height(image.shape, text_height)
+        cache_key = OcrCache.make_key(image, 'det', threshold, merge_line_distance,
+                                      max_candidates, det_size) if self.cache.enabled else None
+        if cache_key is not None:
+            result_map = self.cache.get(cache_key)
+            if result_map is not None:
+                log.debug('OCR结果(缓存) %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+                return result_map
+
         result_map: dict = {}
-        scan_result_list: list = self._model.ocr(image, cls=False)
-        if len(scan_result_list) == 0:
-            log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
-            return result_map
+        scan_result_list: list = self._model.ocr(image, cls=False, max_candidates=max_candidates, det_size=det_size)
+        if len(scan_result_list) > 0:
+            result_map = self._convert_scan_result(scan_result_list[0], threshold, merge_line_distance)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result_map)
+        log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+        return result_map
+
+    def run_ocr_batch(self, image_list: List[MatLike], threshold: float = None,
+                      merge_line_distance: float = -1) -> List[dict[str, MatchResultList]]:
+        """
+        对多张图片进行OCR 每张图片单独检测 所有文本框合并成一批识别
+        :param image_list: 图片列表
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: 每张图片的结果 {key_word: []}
+        """
+        if len(image_list) == 0:
+            return []
+        start_time = time.time()
+        result_list: List[Optional[dict[str, MatchResultList]]] = [None] * len(image_list)
+        cache_key_list: List[Optional[tuple]] = [None] * len(image_list)
+        to_ocr_idx_list: List[int] = []
+        for idx, image in enumerate(image_list):
+            if self.cache.enabled:
+                cache_key_list[idx] = OcrCache.make_key(image, 'det', threshold, merge_line_distance, None, None)
+                result_list[idx] = self.cache.get(cache_key_list[idx])
+            if result_list[idx] is None:
+                to_ocr_idx_list.append(idx)
+
+        if len(to_ocr_idx_list) > 0:
+            scan_result_list: list = self._model.ocr_batch([image_list[idx] for idx in to_ocr_idx_list], cls=False)
+            for idx, scan_result in zip(to_ocr_idx_list, scan_result_list):
+                result_list[idx] = self._convert_scan_result(scan_result, threshold, merge_line_distance)
+                if cache_key_list[idx] is not None:
+                    self.cache.put(cache_key_list[idx], result_list[idx])
 
-        scan_result = scan_result_list[0]
+        log.debug('批量OCR结果 %s 耗时 %.2f', [i.keys() for i in result_list], time.time() - start_time)
+        return result_list
+
+    def _convert_scan_result(self, scan_result: list, threshold: float = None,
+                             merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+        """
+        将模型返回的结果转换成匹配结果
+        :param scan_result: 一张图片的识别结果 [[box, (text, score)]]
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return: {key_word: []}
+        """
+        result_map: dict = {}
         for anchor in scan_result:
             anchor_position = anchor[0]
             anchor_text = anchor[1][0]
@@ -107,6 +173,32 @@ class OnnxOcrMatcher(OcrMatcher):
         if merge_line_distance != -1:
             result_map = ocr_utils.merge_ocr_result_to_multiple_line(result_map, join_space=True,
                                                                      merge_line_distance=merge_line_distance)
+        return result_map
+
+    def run_ocr_without_det(self, image: MatLike, threshold: float = None) -> dict[str, MatchResultList]:
+        """
+        不进行文本检测 将整张图片作为单行文本识别 适用于固定位置的单行文本
+        :param image: 图片
+        :param threshold: 匹配阈值
+        :return: {key_word: []} 结果位置为整张图片
+        """
+        start_time = time.time()
+        cache_key = OcrCache.make_key(image, 'rec', threshold) if self.cache.enabled else None
+        if cache_key is not None:
+            result_map = self.cache.get(cache_key)
+            if result_map is not None:
+                log.debug('OCR结果(缓存) %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+                return result_map
+
+        result_map: dict = {}
+        text, score = self._rec_without_det(image)
+        if len(text) > 0 and (threshold is None or score >= threshold):
+            mrl = MatchResultList(only_best=False)
+            mrl.append(MatchResult(score, 0, 0, image.shape[1], image.shape[0], data=text))
+            result_map[text] = mrl
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result_map)
         log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
         return result_map
 
@@ -116,19 +208,29 @@ class OnnxOcrMatcher(OcrMatcher):
         默认传入的图片仅有文字信息
         :param image: 图片
         :param threshold: 匹配阈值
-        :return: [[("text", "score"),]] 由于禁用了空格，可以直接取第一个元素
+        :return: 识别的文本
         """
         start_time = time.time()
-        scan_result: list = self._model.ocr(image, det=False, cls=False)
+        text, score = self._rec_without_det(image)
+        if threshold is not None and score < threshold:
+            log.debug("OCR模型返回的识别结果置信度低于阈值")
+            return ""
+        log.debug('OCR结果 %s 耗时 %.2f', text, time.time() - start_time)
+        return text
+
+    def _rec_without_det(self, image: MatLike) -> Tuple[str, float]:
+        """
+        只使用识别模型
+        :param image: 图片
+        :return: 文本和置信度
+        """
+        scan_result: list = self._model.ocr(image, det=False, cls=False)  # [[("text", score),]]
         img_result = scan_result[0]  # 取第一张图片
         if len(img_result) > 1:
             log.debug("禁检测的OCR模型返回多个识别结果")  # 目前没有出现这种情况
-
-        if threshold is not None and scan_result[0][1] < threshold:
-            log.debug("OCR模型返回的识别结果置信度低于阈值")
-            return ""
-        log.debug('OCR结果 %s 耗时 %.2f', scan_result, time.time() - start_time)
-        return img_result[0][0]
+        if len(img_result) == 0:
+            return '', 0
+        return img_result[0][0], float(img_result[0][1])
 
     def match_words(self, image: MatLike, words: List[str], threshold: float = None,
                     same_word: bool = False,
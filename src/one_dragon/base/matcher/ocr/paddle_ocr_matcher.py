@@ -3,6 +3,7 @@ import time
 import logging
 import os
 from cv2.typing import MatLike
+from typing import Optional
 
 from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 from one_dragon.base.matcher.ocr import ocr_utils
@@ -69,12 +70,18 @@ class PaddleOcrMatcher(OcrMatcher):
             return tmp
 
     def run_ocr(self, image: MatLike, threshold: float = None,
-                merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+                merge_line_distance: float = -1,
+                max_candidates: Optional[int] = None,
+                det_size: Optional[int] = None,
+                text_height: Optional[float] = None) -> dict[str, MatchResultList]:
         """
         对图片进行OCR 返回所有匹配结果
         :param image: 图片
         :param threshold: 匹配阈值
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
+        :param max_candidates: 不支持 忽略
+        :param det_size: 不支持 忽略
+        :param text_height: 不支持 忽略
         :return: {key_word: []}
         """
         start_time = time.time()
@@ -0,0 +1,280 @@
+import threading
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional, Tuple
+
+from one_dragon.base.matcher.match_result import MatchResult
+from one_dragon.base.screen.template_info import TemplateInfo
+from one_dragon.base.screen.template_loader import TemplateLoader
+from one_dragon.utils.log_utils import log
+
+
+class _TemplateGroup:
+
+    def __init__(self, mask: np.ndarray):
+        """
+        同尺寸、同掩码的一组模板
+        这组模板可以共用原图的窗口均值和方差 只有分子部分需要逐个模板计算
+        :param mask: 二值化后的掩码 float64
+        """
+        self.mask: np.ndarray = mask
+        self.mask_sum: float = float(np.sum(mask))
+        self.height: int = mask.shape[0]
+        self.width: int = mask.shape[1]
+
+        self.template_id_list: List[str] = []
+        self.centered_list: List[np.ndarray] = []  # 掩码内去均值后的模板 T' = M * (T - mean)
+        self.norm_list: List[float] = []  # sqrt(sum(T'^2))
+
+        self.centered: Optional[np.ndarray] = None  # (K, h, w, c) 堆叠后的 T'
+        self.norm: Optional[np.ndarray] = None  # (K,)
+
+        # 按原图尺寸缓存的频谱 key=(fft_h, fft_w)
+        self._spectrum_cache: dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def add(self, template_id: str, image: np.ndarray) -> None:
+        """
+        加入一个模板 在这里完成掩码内去均值
+        :param template_id: 模板id
+        :param image: 模板图 (h, w, c) float64
+        :return:
+        """
+        mask_3d = self.mask[:, :, np.newaxis]
+        mean = np.sum(image * mask_3d, axis=(0, 1)) / self.mask_sum
+        centered = (image - mean) * mask_3d
+        self.template_id_list.append(template_id)
+        self.centered_list.append(centered)
+        self.norm_list.append(float(np.sqrt(np.sum(centered * centered))))
+
+    def build(self) -> None:
+        """
+        所有模板加入后 堆叠成一个数组
+        :return:
+        """
+        self.centered = np.stack(self.centered_list)
+        self.norm = np.array(self.norm_list, dtype=np.float64)
+        self.centered_list = []
+        self.norm_list = []
+
+    def get_spectrum(self, fft_h: int, fft_w: int) -> Tuple[List[List[np.ndarray]], np.ndarray]:
+        """
+        获取某个FFT尺寸下 模板和掩码的频谱 同一尺寸只计算一次
+        :param fft_h: FFT高度
+        :param fft_w: FFT宽度
+        :return: 每个模板每个通道的频谱 掩码的频谱
+        """
+        key = (fft_h, fft_w)
+        spectrum = self._spectrum_cache.get(key)
+        if spectrum is None:
+            template_spectrum = [
+                [cv2.dft(_pad_to(self.centered[k, :, :, c].astype(np.float32), fft_h, fft_w))
+                 for c in range(self.centered.shape[3])]
+                for k in range(self.centered.shape[0])
+            ]
+            mask_spectrum = cv2.dft(_pad_to(self.mask, fft_h, fft_w))
+            spectrum = (template_spectrum, mask_spectrum)
+            self._spectrum_cache[key] = spectrum
+        return spectrum
+
+
+def _pad_to(img: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    右下补0到目标尺寸 用于DFT
+    :param img: 单通道图
+    :param height: 目标高度
+    :param width: 目标宽度
+    :return:
+    """
+    return cv2.copyMakeBorder(img, 0, height - img.shape[0], 0, width - img.shape[1], cv2.BORDER_CONSTANT, value=0)
+
+
+class TemplateBank:
+
+    def __init__(self, template_loader: TemplateLoader,
+                 template_sub_dir: str,
+                 template_id_list: List[str],
+                 template_type: str = 'raw',
+                 ignore_template_mask: bool = False):
+        """
+        预编译的模板库 用于在同一张图中一次性匹配多个候选模板 返回最好的结果
+        结果与 cv2.matchTemplate(TM_CCOEFF_NORMED) 带掩码时一致
+
+        原理:
+        - 掩码内去均值后的模板 T' 满足 sum(T') = 0 因此分子只需原图与 T' 做互相关
+        - 同一掩码的模板 原图窗口的方差是一样的 只需计算一次
+        - 模板的频谱按原图尺寸缓存 每帧只需要原图做一次DFT 每个模板只需一次频域相乘和逆变换
+        :param template_loader: 模板加载器
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :param template_type: 模板类型
+        :param ignore_template_mask: 是否忽略模板自身的掩码
+        """
+        self.template_sub_dir: str = template_sub_dir
+        self.template_id_list: List[str] = template_id_list
+        self.template_type: str = template_type
+
+        self._groups: List[_TemplateGroup] = []
+        group_map: dict[tuple, _TemplateGroup] = {}
+
+        for template_id in template_id_list:
+            template: TemplateInfo = template_loader.get_template(template_sub_dir, template_id)
+            if template is None:
+                log.error('未加载模板 %s' % template_id)
+                continue
+            image = template.get_image(template_type)
+            if image is None:
+                log.error('未加载模板 %s' % template_id)
+                continue
+
+            image = image.astype(np.float64)
+            if image.ndim == 2:
+                image = image[:, :, np.newaxis]
+
+            if ignore_template_mask or template.mask is None:
+                mask = np.ones(image.shape[:2], dtype=np.float64)
+            else:
+                mask = (template.mask > 0).astype(np.float64)
+
+            key = (mask.shape, image.shape[2], np.packbits(mask > 0).tobytes())
+            group = group_map.get(key)
+            if group is None:
+                group = _TemplateGroup(mask)
+                group_map[key] = group
+                self._groups.append(group)
+            group.add(template_id, image)
+
+        for group in self._groups:
+            group.build()
+
+    def match_best(self, source: MatLike, threshold: float = 0.5) -> Optional[MatchResult]:
+        """
+        在原图中匹配所有模板 返回置信度最高的一个
+        :param source: 原图
+        :param threshold: 匹配阈值
+        :return: 最好的匹配结果 data 为对应的模板id 没有达到阈值时返回None
+        """
+        best: Optional[MatchResult] = None
+        for group in self._groups:
+            mr = self._match_group(source, group)
+            if mr is None:
+                continue
+            if best is None or mr.confidence > best.confidence:
+                best = mr
+
+        if best is None or best.confidence < threshold:
+            return None
+        return best
+
+    def _match_group(self, source: MatLike, group: _TemplateGroup) -> Optional[MatchResult]:
+        """
+        匹配一组同掩码的模板
+        :param source: 原图
+        :param group: 模板组
+        :return: 这组里最好的结果 不考虑阈值
+        """
+        src_h, src_w = source.shape[0], source.shape[1]
+        if src_h < group.height or src_w < group.width:
+            return None
+
+        src = source.astype(np.float64)
+        if src.ndim == 2:
+            src = src[:, :, np.newaxis]
+        if src.shape[2] != group.centered.shape[3]:
+            return None
+
+        fft_h = cv2.getOptimalDFTSize(src_h)
+        fft_w = cv2.getOptimalDFTSize(src_w)
+        template_spectrum, mask_spectrum = group.get_spectrum(fft_h, fft_w)
+        res_h = src_h - group.height + 1
+        res_w = src_w - group.width + 1
+
+        channel_list = [_pad_to(src[:, :, c], fft_h, fft_w) for c in range(src.shape[2])]
+
+        # 窗口内 掩码加权的 sum(I) 和 sum(I^2) 用于计算方差 这里存在相减抵消 需要用float64
+        src_sq_spectrum = cv2.dft(sum(channel * channel for channel in channel_list))
+        window_var = _cross_correlate(src_sq_spectrum, mask_spectrum, res_h, res_w)
+        for channel in channel_list:
+            window_sum = _cross_correlate(cv2.dft(channel), mask_spectrum, res_h, res_w)
+            window_var -= window_sum * window_sum / group.mask_sum
+
+        # 所有模板的分子 通道在频域里直接相加 每个模板只需一次逆变换 float32已足够
+        src_spectrum = [cv2.dft(channel.astype(np.float32)) for channel in channel_list]
+        numerator = np.empty((len(template_spectrum), res_h, res_w), dtype=np.float64)
+        for k, t_spectrum in enumerate(template_spectrum):
+            merged = cv2.mulSpectrums(src_spectrum[0], t_spectrum[0], 0, conjB=True)
+            for c in range(1, len(t_spectrum)):
+                merged += cv2.mulSpectrums(src_spectrum[c], t_spectrum[c], 0, conjB=True)
+            numerator[k] = cv2.idft(merged, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)[:res_h, :res_w]
+
+        # 方差接近0时 cv2会得到无穷大或NaN 这里统一视为无效
+        valid = window_var > 1e-6 * group.mask_sum
+        denominator = np.sqrt(np.where(valid, window_var, 1)[np.newaxis, :, :] * (group.norm * group.norm)[:, np.newaxis, np.newaxis])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = numerator / denominator
+        score[:, ~valid] = -1
+        score[group.norm <= 0] = -1
+
+        idx = int(np.argmax(score))
+        k, y, x = np.unravel_index(idx, score.shape)
+        return MatchResult(score[k, y, x], x, y, group.width, group.height,
+                           data=group.template_id_list[k])
+
+
+def _cross_correlate(src_spectrum: np.ndarray, template_spectrum: np.ndarray, res_h: int, res_w: int) -> np.ndarray:
+    """
+    使用频谱计算互相关 只返回有效区域
+    :param src_spectrum: 原图频谱
+    :param template_spectrum: 模板频谱
+    :param res_h: 有效区域高度
+    :param res_w: 有效区域宽度
+    :return:
+    """
+    merged = cv2.mulSpectrums(src_spectrum, template_spectrum, 0, conjB=True)
+    return cv2.idft(merged, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)[:res_h, :res_w]
+
+
+class TemplateBankCache:
+
+    def __init__(self, template_loader: TemplateLoader):
+        """
+        模板库的缓存 相同的模板组合只会编译一次
+        :param template_loader: 模板加载器
+        """
+        self.template_loader: TemplateLoader = template_loader
+        self._bank_map: dict[tuple, TemplateBank] = {}
+        self._lock = threading.Lock()
+
+    def get_bank(self, template_sub_dir: str,
+                 template_id_list: List[str],
+                 template_type: str = 'raw',
+                 ignore_template_mask: bool = False) -> TemplateBank:
+        """
+        获取模板库 不存在时创建
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :param template_type: 模板类型
+        :param ignore_template_mask: 是否忽略模板自身的掩码
+        :return:
+        """
+        key = (template_sub_dir, tuple(template_id_list), template_type, ignore_template_mask)
+        bank = self._bank_map.get(key)
+        if bank is not None:
+            return bank
+
+        with self._lock:
+            bank = self._bank_map.get(key)
+            if bank is None:
+                bank = TemplateBank(self.template_loader, template_sub_dir, list(template_id_list),
+                                    template_type=template_type, ignore_template_mask=ignore_template_mask)
+                self._bank_map[key] = bank
+            return bank
+
+    def clear(self) -> None:
+        """
+        清除所有缓存 模板有更新时使用
+        :return:
+        """
+        with self._lock:
+            self._bank_map.clear()
@@ -1,8 +1,9 @@
 import cv2
 from cv2.typing import MatLike
-from typing import Optional
+from typing import Optional, List
 
 from one_dragon.base.matcher.match_result import MatchResultList, MatchResult
+from one_dragon.base.matcher.template_bank import TemplateBankCache
 from one_dragon.base.screen.template_info import TemplateInfo
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import cv2_utils
@@ -13,6 +14,7 @@ class TemplateMatcher:
 
     def __init__(self, template_loader: TemplateLoader):
         self.template_loader: TemplateLoader = template_loader
+        self.template_bank_cache: TemplateBankCache = TemplateBankCache(template_loader)
 
     def match_template(self, source: MatLike,
                        template_sub_dir: str,
@@ -22,7 +24,8 @@ class TemplateMatcher:
                        mask: MatLike = None,
                        ignore_template_mask: bool = False,
                        only_best: bool = True,
-                       ignore_inf: bool = True) -> MatchResultList:
+                       ignore_inf: bool = True,
+                       pyramid_level: int = 0) -> MatchResultList:
         """
         在原图中 匹配模板 如果模板图中有掩码图 会自动使用
         :param source: 原图
@@ -34,6 +37,7 @@ class TemplateMatcher:
         :param ignore_template_mask: 是否忽略模板自身的掩码
         :param only_best: 只返回最好的结果
         :param ignore_inf: 是否忽略无限大的结果
+        :param pyramid_level: 金字塔层数 大于0时先在缩小图上粗略匹配 再在原图小范围内精确匹配
         :return: 所有匹配结果
         """
         template: TemplateInfo = self.template_loader.get_template(template_sub_dir, template_id)
@@ -46,9 +50,35 @@ class TemplateMatcher:
             mask_usage = cv2.bitwise_or(mask_usage, template.mask) if mask_usage is not None else template.mask
         if mask is not None:
             mask_usage = cv2.bitwise_or(mask_usage, mask) if mask_usage is not None else mask
+        if pyramid_level > 0:
+            return cv2_utils.match_template_pyramid(source, template.get_image(template_type), threshold,
+                                                    mask=mask_usage, only_best=only_best, ignore_inf=ignore_inf,
+                                                    pyramid_level=pyramid_level)
         return cv2_utils.match_template(source, template.get_image(template_type), threshold, mask=mask_usage,
                                         only_best=only_best, ignore_inf=ignore_inf)
 
+    def match_best_template(self, source: MatLike,
+                            template_sub_dir: str,
+                            template_id_list: List[str],
+                            template_type: str = 'raw',
+                            threshold: float = 0.5,
+                            ignore_template_mask: bool = False) -> Optional[MatchResult]:
+        """
+        在原图中 一次性匹配多个候选模板 返回置信度最高的一个
+        候选模板会预编译成模板库并缓存 适合每帧都要在同一区域匹配大量候选的场景 例如战斗中的角色头像
+        :param source: 原图
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 候选模板id列表
+        :param template_type: 模板类型
+        :param threshold: 匹配阈值
+        :param ignore_template_mask: 是否忽略模板自身的掩码
+        :return: 最好的匹配结果 data 为对应的模板id
+        """
+        bank = self.template_bank_cache.get_bank(template_sub_dir, template_id_list,
+                                                 template_type=template_type,
+                                                 ignore_template_mask=ignore_template_mask)
+        return bank.match_best(source, threshold=threshold)
+
     def match_one_by_feature(self, source: MatLike,
                              template_sub_dir: str,
                              template_id: str,
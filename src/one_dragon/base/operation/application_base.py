@@ -1,7 +1,7 @@
 from concurrent.futures import ThreadPoolExecutor
 
 from enum import Enum
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Tuple
 
 from one_dragon.base.operation.application_run_record import AppRunRecord
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
@@ -114,10 +114,28 @@ class Application(Operation):
     def get_preheat_executor() -> ThreadPoolExecutor:
         return _app_preheat_executor
 
+    def get_preload_template_list(self) -> List[Tuple[str, Optional[Callable[[str], bool]]]]:
+        """
+        应用需要预加载的模板 由子类实现
+        :return: 列表 每项为 (模板分类, 模板id过滤) 过滤为None时加载整个分类
+        """
+        return []
+
+    def preload_template(self) -> None:
+        """
+        预加载应用需要的模板
+        :return:
+        """
+        for sub_dir, predicate in self.get_preload_template_list():
+            self.ctx.template_loader.preload([sub_dir], predicate)
+
     def init_for_application(self) -> bool:
         """
         初始化
         """
+        if len(self.get_preload_template_list()) > 0:
+            # 在检测游戏窗口、进入游戏等启动阶段异步加载 避免在第一次识别时才读取
+            self.get_preheat_executor().submit(self.preload_template)
         if self.need_ocr:
             self.ctx.ocr.init_model()
         return True
@@ -16,10 +16,11 @@ from one_dragon.base.operation.one_dragon_custom_context import OneDragonCustomC
 from one_dragon.base.operation.one_dragon_env_context import OneDragonEnvContext, ONE_DRAGON_CONTEXT_EXECUTOR
 from one_dragon.base.screen.screen_loader import ScreenContext
 from one_dragon.base.screen.template_loader import TemplateLoader
-from one_dragon.utils import debug_utils, log_utils
+from one_dragon.utils import debug_utils, log_utils, os_utils
 from one_dragon.utils import thread_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
+from one_dragon.utils.onnx_session_registry import get_session_registry
 
 
 class ContextRunStateEnum(Enum):
@@ -68,6 +69,7 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
         self.screen_loader: ScreenContext = ScreenContext()
         self.template_loader: TemplateLoader = TemplateLoader()
         self.tm: TemplateMatcher = TemplateMatcher(self.template_loader)
+        get_session_registry().optimized_model_dir = os_utils.get_path_under_work_dir('.cache', 'onnx')
         self.ocr: OcrMatcher = OnnxOcrMatcher()
         self.controller: ControllerBase = controller
 
@@ -103,6 +105,9 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
             self.switch_context_pause_and_run()
         self.context_running_state = ContextRunStateEnum.STOP
         log.info('停止运行')
+        if self.ocr.cache.enabled:
+            log.info('OCR缓存 命中 %d 未命中 %d 命中率 %.2f',
+                     self.ocr.cache.hit_cnt, self.ocr.cache.miss_cnt, self.ocr.cache.hit_rate)
         self.dispatch_event(ContextRunningStateEventEnum.STOP_RUNNING.value, self.context_running_state)
 
     @property
@@ -213,6 +218,14 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
         f = ONE_DRAGON_CONTEXT_EXECUTOR.submit(self.ocr.init_model)
         f.add_done_callback(thread_utils.handle_future_result)
 
+    def async_init_template_cache(self) -> None:
+        """
+        异步使用模板缓存加载所有模板
+        :return:
+        """
+        f = ONE_DRAGON_CONTEXT_EXECUTOR.submit(self.template_loader.init_template_cache)
+        f.add_done_callback(thread_utils.handle_future_result)
+
     def after_app_shutdown(self) -> None:
         """
         App关闭后进行的操作 关闭一切可能资源操作
@@ -6,6 +6,7 @@ import inspect
 from cv2.typing import MatLike
 from typing import Optional, ClassVar, Callable, List, Any, Tuple
 
+from one_dragon.base.controller.screenshot_buffer import ScreenshotLease
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.matcher.match_result import MatchResultList
 from one_dragon.base.operation.one_dragon_context import OneDragonContext, ContextRunningStateEventEnum
@@ -90,6 +91,9 @@ class Operation(OperationBase):
         self.last_screenshot: Optional[MatLike] = None
         """上一次的截图 用于出错时保存"""
 
+        self._last_screenshot_lease: Optional[ScreenshotLease] = None
+        """上一次的截图在截图缓冲区中的占用 保证出错时保存的截图没有被之后的截图覆盖"""
+
         self.param_start_node: OperationNode = None
         """入参的开始节点 当网络存在环时 需要自己指定"""
 
@@ -478,9 +482,33 @@ class Operation(OperationBase):
         :return:
         """
         screen = self.ctx.controller.screenshot()
-        self.last_screenshot = screen
+        self._set_last_screenshot(screen, None)
         return self.last_screenshot
 
+    def screenshot_leased(self) -> Tuple[MatLike, Optional[ScreenshotLease]]:
+        """
+        截图并写入截图缓冲区 用于高频截图的战斗流程 同样会在内存中保存上一张截图
+        返回的占用需要在截图使用完后 release
+        :return: 截图, 缓冲区的占用 没有使用缓冲区时为None
+        """
+        frame, lease = self.ctx.controller.screenshot_frame_leased()
+        if lease is not None:
+            lease.retain()
+        self._set_last_screenshot(frame.image, lease)
+        return frame.image, lease
+
+    def _set_last_screenshot(self, screen: MatLike, lease: Optional[ScreenshotLease]) -> None:
+        """
+        更新上一次的截图 并归还之前截图的占用
+        :param screen: 截图
+        :param lease: 这次截图的占用 已经由调用方额外占用了一次
+        :return:
+        """
+        if self._last_screenshot_lease is not None:
+            self._last_screenshot_lease.release()
+        self._last_screenshot_lease = lease
+        self.last_screenshot = screen
+
     def save_screenshot(self, prefix: Optional[str] = None) -> str:
         """
         保存上一次的截图 并对UID打码
@@ -507,6 +535,9 @@ class Operation(OperationBase):
         :return:
         """
         self.ctx.unlisten_all_event(self)
+        if self._last_screenshot_lease is not None:
+            self._last_screenshot_lease.release()
+            self._last_screenshot_lease = None
         if result.success:
             log.info('%s 执行成功 返回状态 %s', self.display_name, coalesce_gt(result.status, '成功', model='ui'))
         else:
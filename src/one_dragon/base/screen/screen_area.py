@@ -18,6 +18,8 @@ class ScreenArea:
                  id_mark: bool = False,
                  goto_list: List[str] = None,
                  color_range: List[List[int]] = None,
+                 template_pyramid_level: int = 0,
+                 ocr_single_line: bool = False,
                  ):
         self.area_name: str = area_name
         self.pc_rect: Rect = pc_rect
@@ -30,6 +32,8 @@ class ScreenArea:
         self.id_mark: bool = id_mark  # 是否用于画面的唯一标识
         self.goto_list: List[str] = [] if goto_list is None else goto_list # 交互后 可能会跳转的画面名称列表
         self.color_range: List[List[int]] = color_range  # 识别时候的筛选的颜色范围 文本时候有效
+        self.template_pyramid_level: int = template_pyramid_level  # 模板匹配使用的金字塔层数 0为精确匹配 适合在大区域中找模板时开启
+        self.ocr_single_line: bool = ocr_single_line  # 文本是固定的单行 OCR时跳过文本检测 直接识别整个区域
 
     @property
     def rect(self) -> Rect:
@@ -119,6 +123,10 @@ class ScreenArea:
         order_dict['template_id'] = self.template_id
         order_dict['template_match_threshold'] = self.template_match_threshold
         order_dict['color_range'] = self.color_range
+        if self.template_pyramid_level > 0:
+            order_dict['template_pyramid_level'] = self.template_pyramid_level
+        if self.ocr_single_line:
+            order_dict['ocr_single_line'] = self.ocr_single_line
         order_dict['goto_list'] = self.goto_list
 
         return order_dict
@@ -0,0 +1,181 @@
+import time
+from typing import Callable, Any, Union, Optional, Hashable
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.utils import cv2_utils
+
+
+class ScreenFrame:
+
+    def __init__(self, image: MatLike, screenshot_time: float = 0):
+        """
+        一帧截图 以及由它派生出来的各种图片(灰度图、HSV、区域裁剪、掩码后的裁剪)
+        派生图片在第一次使用时生成 之后同一帧内的其它识别直接复用
+        多个线程同时识别同一帧时不加锁 极少数情况下会重复生成 结果一样 不影响正确性
+        派生图片都是共用的 使用方不能修改
+        :param image: 截图 RGB
+        :param screenshot_time: 截图时间
+        """
+        self.image: MatLike = image
+        self.screenshot_time: float = screenshot_time
+        self._cache: dict[Hashable, Any] = {}
+
+        self.hit_cnt: int = 0  # 复用次数
+        self.miss_cnt: int = 0  # 生成次数
+        self.preprocess_seconds: float = 0  # 生成派生图片的总耗时 用于和识别本身的耗时区分
+
+    @staticmethod
+    def of(screen: Union[MatLike, 'ScreenFrame'], screenshot_time: float = 0) -> 'ScreenFrame':
+        """
+        兼容传入截图的调用方
+        :param screen: 截图或者已经封装好的一帧
+        :param screenshot_time: 截图时间
+        :return:
+        """
+        if isinstance(screen, ScreenFrame):
+            return screen
+        return ScreenFrame(screen, screenshot_time)
+
+    def get(self, key: Hashable, creator: Callable[[], Any]) -> Any:
+        """
+        获取一个派生图片 不存在时生成
+        :param key: 唯一标识
+        :param creator: 生成方法
+        :return:
+        """
+        value = self._cache.get(key)
+        if value is not None:
+            self.hit_cnt += 1
+            return value
+
+        start_time = time.perf_counter()
+        value = creator()
+        self.preprocess_seconds += time.perf_counter() - start_time
+        self.miss_cnt += 1
+        return self._cache.setdefault(key, value)
+
+    @property
+    def gray(self) -> MatLike:
+        """
+        整张截图的灰度图
+        """
+        return self.get('gray', lambda: cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY))
+
+    @property
+    def hsv(self) -> MatLike:
+        """
+        整张截图的HSV
+        """
+        return self.get('hsv', lambda: cv2.cvtColor(self.image, cv2.COLOR_RGB2HSV))
+
+    def crop(self, rect: Rect) -> MatLike:
+        """
+        裁剪区域
+        :param rect: 区域
+        :return:
+        """
+        return self.get(('crop', rect.x1, rect.y1, rect.x2, rect.y2),
+                        lambda: cv2_utils.crop_image_only(self.image, rect))
+
+    def crop_area(self, area: ScreenArea) -> MatLike:
+        """
+        裁剪画面区域
+        :param area: 区域
+        :return:
+        """
+        return self.crop(area.rect)
+
+    def crop_gray(self, rect: Rect) -> MatLike:
+        """
+        裁剪区域的灰度图 整张灰度图已经生成时直接从里面裁剪
+        :param rect: 区域
+        :return:
+        """
+        def create() -> MatLike:
+            if 'gray' in self._cache:
+                return cv2_utils.crop_image_only(self._cache['gray'], rect)
+            return cv2.cvtColor(self.crop(rect), cv2.COLOR_RGB2GRAY)
+
+        return self.get(('crop_gray', rect.x1, rect.y1, rect.x2, rect.y2), create)
+
+    def crop_hsv(self, rect: Rect) -> MatLike:
+        """
+        裁剪区域的HSV 整张HSV已经生成时直接从里面裁剪
+        :param rect: 区域
+        :return:
+        """
+        def create() -> MatLike:
+            if 'hsv' in self._cache:
+                return cv2_utils.crop_image_only(self._cache['hsv'], rect)
+            return cv2.cvtColor(self.crop(rect), cv2.COLOR_RGB2HSV)
+
+        return self.get(('crop_hsv', rect.x1, rect.y1, rect.x2, rect.y2), create)
+
+    def masked_crop(self, rect: Rect, mask: Optional[MatLike]) -> MatLike:
+        """
+        裁剪区域后 只保留掩码部分
+        掩码通常来自模板 在模板的生命周期内不会变化 因此用对象id区分
+        :param rect: 区域
+        :param mask: 掩码 None时返回裁剪结果
+        :return:
+        """
+        if mask is None:
+            return self.crop(rect)
+
+        def create() -> MatLike:
+            part = self.crop(rect)
+            return cv2.bitwise_and(part, part, mask=mask)
+
+        return self.get(('masked_crop', rect.x1, rect.y1, rect.x2, rect.y2, id(mask)), create)
+
+    def masked_crop_channel_max(self, rect: Rect, mask: Optional[MatLike]) -> MatLike:
+        """
+        掩码后裁剪区域的各颜色通道最大值
+        :param rect: 区域
+        :param mask: 掩码
+        :return:
+        """
+        key = ('masked_crop_channel_max', rect.x1, rect.y1, rect.x2, rect.y2, None if mask is None else id(mask))
+        return self.get(key, lambda: np.max(self.masked_crop(rect, mask), axis=2))
+
+
+def __debug():
+    """
+    同一个区域多次识别时 对比每次重新处理和复用的耗时
+    """
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8)
+    rect = Rect(1500, 900, 1800, 1000)
+    mask = np.where(rng.random((100, 300)) > 0.5, 255, 0).astype(np.uint8)
+    run_times = 200
+    reuse_times = 4  # 同一帧内有几个识别使用同一区域
+
+    start_time = time.perf_counter()
+    for _ in range(run_times):
+        for _ in range(reuse_times):
+            part = cv2_utils.crop_image_only(image, rect)
+            cv2.bitwise_and(part, part, mask=mask)
+            cv2.cvtColor(part, cv2.COLOR_RGB2GRAY)
+    old_cost = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    preprocess_seconds = 0
+    for _ in range(run_times):
+        frame = ScreenFrame(image)
+        for _ in range(reuse_times):
+            frame.masked_crop(rect, mask)
+            frame.crop_gray(rect)
+        preprocess_seconds += frame.preprocess_seconds
+    new_cost = time.perf_counter() - start_time
+
+    print('每帧 重复处理 %.3fms 复用 %.3fms 其中生成 %.3fms' % (
+        old_cost / run_times * 1000, new_cost / run_times * 1000, preprocess_seconds / run_times * 1000))
+
+
+if __name__ == '__main__':
+    __debug()
@@ -78,7 +78,9 @@ class ScreenInfo(YamlOperator):
                 color_range=data_area.get('color_range'),
                 pc_alt=self.pc_alt,
                 id_mark=data_area.get('id_mark', False),
-                goto_list=data_area.get('goto_list', [])
+                goto_list=data_area.get('goto_list', []),
+                template_pyramid_level=data_area.get('template_pyramid_level', 0),
+                ocr_single_line=data_area.get('ocr_single_line', False),
             )
             self.area_list.append(area)
 
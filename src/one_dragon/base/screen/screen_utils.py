@@ -5,6 +5,7 @@ from enum import Enum
 from typing import Optional, List
 
 from one_dragon.base.geometry.point import Point
+from one_dragon.base.matcher.match_result import MatchResultList
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.screen.screen_info import ScreenInfo
@@ -53,34 +54,65 @@ def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea
 
     find: bool = False
     if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        if area.color_range is None:
-            to_ocr = part
-        else:
-            mask = cv2.inRange(part,
-                               np.array(area.color_range[0], dtype=np.uint8),
-                               np.array(area.color_range[1], dtype=np.uint8))
-            mask = cv2_utils.dilate(mask, 2)
-            to_ocr = cv2.bitwise_and(part, part, mask=mask)
-
-        ocr_result_map = ctx.ocr.run_ocr(to_ocr)
-        for ocr_result, mrl in ocr_result_map.items():
-            if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
-                find = True
-                break
+        ocr_result_map = run_area_ocr(ctx, get_area_image_to_ocr(screen, area), area)
+        find = is_area_text_in_ocr_result(area, ocr_result_map)
     elif area.is_template_area:
         rect = area.rect
         part = cv2_utils.crop_image_only(screen, rect)
 
         mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+                                    threshold=area.template_match_threshold,
+                                    pyramid_level=area.template_pyramid_level)
         find = mrl.max is not None
 
     return FindAreaResultEnum.TRUE if find else FindAreaResultEnum.FALSE
 
 
+def get_area_image_to_ocr(screen: MatLike, area: ScreenArea) -> MatLike:
+    """
+    获取文本区域用于OCR的图片 有颜色范围时只保留范围内的颜色
+    :param screen: 游戏截图
+    :param area: 文本区域
+    :return:
+    """
+    part = cv2_utils.crop_image_only(screen, area.rect)
+    if area.color_range is None:
+        return part
+
+    mask = cv2.inRange(part,
+                       np.array(area.color_range[0], dtype=np.uint8),
+                       np.array(area.color_range[1], dtype=np.uint8))
+    mask = cv2_utils.dilate(mask, 2)
+    return cv2.bitwise_and(part, part, mask=mask)
+
+
+def run_area_ocr(ctx: OneDragonContext, image: MatLike, area: ScreenArea) -> dict[str, MatchResultList]:
+    """
+    对文本区域进行OCR 固定单行的文本跳过文本检测
+    :param ctx: 上下文
+    :param image: 区域的图片
+    :param area: 文本区域
+    :return:
+    """
+    if area.ocr_single_line:
+        return ctx.ocr.run_ocr_without_det(image)
+    else:
+        return ctx.ocr.run_ocr(image)
+
+
+def is_area_text_in_ocr_result(area: ScreenArea, ocr_result_map: dict[str, MatchResultList]) -> bool:
+    """
+    OCR结果中是否包含区域的文本
+    :param area: 文本区域
+    :param ocr_result_map: OCR结果
+    :return:
+    """
+    for ocr_result in ocr_result_map.keys():
+        if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
+            return True
+    return False
+
+
 def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str, area_name: str) -> OcrClickResultEnum:
     """
     在一个区域匹配成功后进行点击
@@ -98,7 +130,7 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
         part = cv2_utils.crop_image_only(screen, rect)
         # cv2_utils.show_image(part, win_name='debug')
 
-        ocr_result_map = ctx.ocr.run_ocr(part)
+        ocr_result_map = run_area_ocr(ctx, part, area)
         for ocr_result, mrl in ocr_result_map.items():
             if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
                 to_click = mrl.max.center + area.left_top
@@ -113,7 +145,8 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
         part = cv2_utils.crop_image_only(screen, rect)
 
         mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+                                    threshold=area.template_match_threshold,
+                                    pyramid_level=area.template_pyramid_level)
         if mrl.max is None:
             return OcrClickResultEnum.OCR_CLICK_NOT_FOUND
         elif ctx.controller.click(mrl.max.center + rect.left_top, pc_alt=area.pc_alt):
@@ -204,17 +237,29 @@ def is_target_screen(ctx: OneDragonContext, screen: MatLike,
             return False
 
     existed_id_mark: bool = False
-    fit_id_mark: bool = True
+    text_area_list: List[ScreenArea] = []
     for screen_area in screen_info.area_list:
         if not screen_area.id_mark:
             continue
         existed_id_mark = True
 
-        if find_area_in_screen(ctx, screen, screen_area) != FindAreaResultEnum.TRUE:
-            fit_id_mark = False
-            break
+        if screen_area.is_text_area and not screen_area.ocr_single_line:  # 需要文本检测的区域放到最后一起识别
+            text_area_list.append(screen_area)
+        elif find_area_in_screen(ctx, screen, screen_area) != FindAreaResultEnum.TRUE:
+            return False
+
+    if not existed_id_mark:
+        return False
+
+    if len(text_area_list) == 1:
+        return find_area_in_screen(ctx, screen, text_area_list[0]) == FindAreaResultEnum.TRUE
+    elif len(text_area_list) > 1:
+        ocr_result_list = ctx.ocr.run_ocr_batch([get_area_image_to_ocr(screen, area) for area in text_area_list])
+        for area, ocr_result_map in zip(text_area_list, ocr_result_list):
+            if not is_area_text_in_ocr_result(area, ocr_result_map):
+                return False
 
-    return existed_id_mark and fit_id_mark
+    return True
 
 
 def find_by_ocr(ctx: OneDragonContext, screen: MatLike, target_cn: str,
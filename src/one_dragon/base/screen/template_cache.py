@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional, List
+
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.screen.template_info import TemplateInfo, get_template_raw_path, get_template_mask_path, \
+    get_template_config_path
+from one_dragon.utils import os_utils, cv2_utils
+from one_dragon.utils.log_utils import log
+
+TEMPLATE_CACHE_VERSION = 1
+TEMPLATE_CACHE_FILE_NAME = 'template_cache.npz'
+_META_KEY = '__meta__'
+
+
+class TemplateCacheItem:
+
+    def __init__(self, sub_dir: str, template_id: str, signature: str,
+                 config_data: dict,
+                 raw: Optional[MatLike] = None,
+                 mask: Optional[MatLike] = None,
+                 gray: Optional[MatLike] = None,
+                 kps_np: Optional[np.ndarray] = None,
+                 desc: Optional[MatLike] = None):
+        """
+        一个模板在缓存中的内容
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :param signature: 源文件签名 源文件变化后缓存失效
+        :param config_data: 配置文件内容
+        :param raw: 原图
+        :param mask: 掩码
+        :param gray: 灰度图
+        :param kps_np: 特征关键点 cv2_utils.feature_keypoints_to_np 的结果
+        :param desc: 特征描述
+        """
+        self.sub_dir: str = sub_dir
+        self.template_id: str = template_id
+        self.signature: str = signature
+        self.config_data: dict = config_data
+        self.raw: Optional[MatLike] = raw
+        self.mask: Optional[MatLike] = mask
+        self.gray: Optional[MatLike] = gray
+        self.kps_np: Optional[np.ndarray] = kps_np
+        self.desc: Optional[MatLike] = desc
+
+    @property
+    def key(self) -> str:
+        return get_template_cache_key(self.sub_dir, self.template_id)
+
+    def to_template_info(self) -> TemplateInfo:
+        """
+        转化成模板信息 不需要读取硬盘
+        :return:
+        """
+        template = TemplateInfo(self.sub_dir, self.template_id, load_from_disk=False)
+        template.init_from_cache(self.config_data, self.raw, self.mask, self.gray, self.kps_np, self.desc)
+        return template
+
+    @staticmethod
+    def from_template_info(template: TemplateInfo, signature: str) -> 'TemplateCacheItem':
+        """
+        从硬盘加载的模板信息中生成 会计算灰度图和特征
+        :param template: 模板信息
+        :param signature: 源文件签名
+        :return:
+        """
+        kps_np: Optional[np.ndarray] = None
+        desc: Optional[MatLike] = None
+        if template.raw is not None:
+            kps, desc = template.features
+            kps_np = cv2_utils.feature_keypoints_to_np(kps).reshape(-1, 7)
+
+        return TemplateCacheItem(
+            template.sub_dir, template.template_id, signature,
+            config_data=template.data,
+            raw=template.raw,
+            mask=template.mask,
+            gray=template.gray,
+            kps_np=kps_np,
+            desc=desc
+        )
+
+
+class TemplateCache:
+
+    def __init__(self, file_path: Optional[str] = None):
+        """
+        模板的预计算缓存 所有模板打包在一个文件中 启动时一次读取
+        包含原图、掩码、灰度图和特征点 按源文件的修改时间和大小判断是否失效
+        :param file_path: 缓存文件路径 不传入时使用默认路径
+        """
+        self.file_path: str = file_path if file_path is not None else get_template_cache_path()
+        self.item_map: dict[str, TemplateCacheItem] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """
+        从硬盘读取缓存文件
+        :return: 是否读取成功
+        """
+        self.item_map = {}
+        if not os.path.exists(self.file_path):
+            return False
+
+        try:
+            with np.load(self.file_path, allow_pickle=False) as npz:
+                arr_map = {key: npz[key] for key in npz.files}
+        except Exception:
+            log.error('模板缓存读取失败 将重新生成', exc_info=True)
+            return False
+
+        meta_arr = arr_map.get(_META_KEY)
+        if meta_arr is None:
+            return False
+        meta = json.loads(str(meta_arr))
+        if meta.get('version') != TEMPLATE_CACHE_VERSION:
+            return False
+
+        for key, item_meta in meta.get('items', {}).items():
+            self.item_map[key] = TemplateCacheItem(
+                item_meta['sub_dir'], item_meta['template_id'], item_meta['signature'],
+                config_data=item_meta['config'],
+                raw=arr_map.get(f'{key}|raw'),
+                mask=arr_map.get(f'{key}|mask'),
+                gray=arr_map.get(f'{key}|gray'),
+                kps_np=arr_map.get(f'{key}|kps'),
+                desc=arr_map.get(f'{key}|desc'),
+            )
+
+        return True
+
+    def save(self) -> None:
+        """
+        保存缓存文件 先写临时文件再替换 避免写一半的文件被读取
+        :return:
+        """
+        with self._lock:
+            arr_map: dict[str, np.ndarray] = {}
+            items_meta: dict[str, dict] = {}
+            for key, item in self.item_map.items():
+                items_meta[key] = {
+                    'sub_dir': item.sub_dir,
+                    'template_id': item.template_id,
+                    'signature': item.signature,
+                    'config': item.config_data,
+                }
+                for suffix, arr in [('raw', item.raw), ('mask', item.mask), ('gray', item.gray),
+                                    ('kps', item.kps_np), ('desc', item.desc)]:
+                    if arr is not None:
+                        arr_map[f'{key}|{suffix}'] = arr
+
+            arr_map[_META_KEY] = np.array(json.dumps({
+                'version': TEMPLATE_CACHE_VERSION,
+                'items': items_meta,
+            }, ensure_ascii=False))
+
+            temp_path = self.file_path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                np.savez(file, **arr_map)
+            os.replace(temp_path, self.file_path)
+
+    def refresh(self, template_key_list: List[tuple[str, str]]) -> bool:
+        """
+        按当前硬盘上的模板刷新缓存 只重新计算有变化的模板 并移除已经不存在的模板
+        :param template_key_list: 硬盘上所有模板的 (sub_dir, template_id)
+        :return: 缓存是否有变化
+        """
+        changed: bool = False
+        new_item_map: dict[str, TemplateCacheItem] = {}
+        for sub_dir, template_id in template_key_list:
+            key = get_template_cache_key(sub_dir, template_id)
+            signature = get_template_signature(sub_dir, template_id)
+            item = self.item_map.get(key)
+            if item is None or item.signature != signature:
+                item = TemplateCacheItem.from_template_info(TemplateInfo(sub_dir, template_id), signature)
+                changed = True
+            new_item_map[key] = item
+
+        if len(new_item_map) != len(self.item_map):
+            changed = True
+
+        with self._lock:
+            self.item_map = new_item_map
+
+        return changed
+
+
+def get_template_cache_key(sub_dir: str, template_id: str) -> str:
+    """
+    模板在缓存中的key
+    :param sub_dir: 模板分类
+    :param template_id: 模板id
+    :return:
+    """
+    return f'{sub_dir}/{template_id}'
+
+
+def get_template_signature(sub_dir: str, template_id: str) -> str:
+    """
+    模板源文件的签名 由原图、掩码和配置文件的修改时间和大小组成
+    :param sub_dir: 模板分类
+    :param template_id: 模板id
+    :return:
+    """
+    parts: List[str] = []
+    for file_path in [
+        get_template_raw_path(sub_dir, template_id),
+        get_template_mask_path(sub_dir, template_id),
+        get_template_config_path(sub_dir, template_id),
+    ]:
+        try:
+            stat = os.stat(file_path)
+            parts.append(f'{stat.st_mtime_ns}:{stat.st_size}')
+        except OSError:
+            parts.append('-')
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get_template_cache_path() -> str:
+    """
+    默认的模板缓存文件路径
+    :return:
+    """
+    return os.path.join(os_utils.get_path_under_work_dir('.cache'), TEMPLATE_CACHE_FILE_NAME)
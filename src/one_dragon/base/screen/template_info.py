@@ -30,7 +30,12 @@ class TemplateShapeEnum(Enum):
 
 class TemplateInfo(YamlOperator):
 
-    def __init__(self, sub_dir: str, template_id: str):
+    def __init__(self, sub_dir: str, template_id: str, load_from_disk: bool = True):
+        """
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :param load_from_disk: 是否从硬盘读取配置和图片 从模板缓存创建时不需要
+        """
         # 旧的模板ID 在开发工具中使用 方便更改后迁移文件
         self.old_sub_dir: str = sub_dir
         self.old_template_id: str = template_id
@@ -40,26 +45,64 @@ class TemplateInfo(YamlOperator):
 
         self.screen_image: Optional[MatLike] = None
 
-        YamlOperator.__init__(self, file_path=self.get_yml_file_path())
+        YamlOperator.__init__(self, file_path=self.get_yml_file_path() if load_from_disk else None)
+        self.file_path = self.get_yml_file_path()
 
-        self.template_name: str = self.get('template_name', '')
-        self.template_shape: str = self.get('template_shape', TemplateShapeEnum.RECTANGLE.value.value)
+        self.template_name: str = ''
+        self.template_shape: str = TemplateShapeEnum.RECTANGLE.value.value
         self.point_list: List[Point] = []
-        point_data: List[str] = self.get('point_list', [])
-        for point_str in point_data:
-            point_arr = point_str.split(',')
-            self.point_list.append(Point(int(point_arr[0]), int(point_arr[1])))
-        self.auto_mask: bool = self.get('auto_mask', True)
+        self.auto_mask: bool = True
+        self._init_from_data()
         self.point_updated: bool = False  # 点位是否更改过 开发工具中用
 
-        self.raw: MatLike = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))  # 原图
-        self.mask: MatLike = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))  # 掩码
+        self.raw: Optional[MatLike] = None  # 原图
+        self.mask: Optional[MatLike] = None  # 掩码
+        if load_from_disk:
+            self.raw = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))
+            self.mask = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))
 
         # 运算后保存在内存的
         self._gray: MatLike = None  # 灰度图
         self._kps: List[cv2.KeyPoint] = None  # 关键点
+        self._kps_np: Optional[np.ndarray] = None  # 从缓存读取的关键点 使用时再转换成 cv2.KeyPoint
         self._desc: MatLike = None  # 描述
 
+    def _init_from_data(self) -> None:
+        """
+        从配置数据中初始化
+        :return:
+        """
+        self.template_name = self.get('template_name', '')
+        self.template_shape = self.get('template_shape', TemplateShapeEnum.RECTANGLE.value.value)
+        self.point_list = []
+        point_data: List[str] = self.get('point_list', [])
+        for point_str in point_data:
+            point_arr = point_str.split(',')
+            self.point_list.append(Point(int(point_arr[0]), int(point_arr[1])))
+        self.auto_mask = self.get('auto_mask', True)
+
+    def init_from_cache(self, config_data: dict,
+                        raw: Optional[MatLike], mask: Optional[MatLike], gray: Optional[MatLike],
+                        kps_np: Optional[np.ndarray], desc: Optional[MatLike]) -> None:
+        """
+        使用模板缓存中预先计算好的数据初始化
+        :param config_data: 配置文件内容
+        :param raw: 原图
+        :param mask: 掩码
+        :param gray: 灰度图
+        :param kps_np: 关键点 cv2_utils.feature_keypoints_to_np 的结果 None 时表示未计算
+        :param desc: 描述
+        :return:
+        """
+        self.data = config_data
+        self._init_from_data()
+        self.raw = raw
+        self.mask = mask
+        self._gray = gray
+        self._kps = None
+        self._kps_np = kps_np
+        self._desc = desc
+
     def get_yml_file_path(self) -> str:
         return get_template_config_path(self.sub_dir, self.template_id)
 
@@ -130,6 +173,9 @@ class TemplateInfo(YamlOperator):
     def features(self) -> Tuple[List[cv2.KeyPoint], MatLike]:
         if self._kps is not None:
             return self._kps, self._desc
+        if self._kps_np is not None:
+            self._kps = cv2_utils.feature_keypoints_from_np(self._kps_np)
+            return self._kps, self._desc
         if self.raw is not None:
             self._kps, self._desc = cv2_utils.feature_detect_and_compute(self.raw, self.mask)
         return self._kps, self._desc
@@ -1,17 +1,44 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from cv2.typing import MatLike
-from typing import List, Optional
+from typing import List, Optional, Callable
 
+from one_dragon.base.screen.template_cache import TemplateCache
 from one_dragon.base.screen.template_info import TemplateInfo, is_template_existed
 from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+
+_template_preload_executor = ThreadPoolExecutor(thread_name_prefix='od_template_preload', max_workers=8)
 
 
 class TemplateLoader:
 
     def __init__(self):
         self.template: dict[str, TemplateInfo] = {}
+        self.template_cache: TemplateCache = TemplateCache()
+
+    def init_template_cache(self) -> None:
+        """
+        使用模板缓存初始化所有模板
+        缓存文件中包含预先计算好的图片和特征 启动时只需要读取一个文件
+        只有源文件变化了的模板需要重新计算 计算后会更新缓存文件
+        :return:
+        """
+        self.template_cache.load()
+
+        key_list = [(i.sub_dir, i.template_id) for i in self.get_all_template_info_from_disk(need_raw=True, need_config=False, load_from_disk=False)]
+        if self.template_cache.refresh(key_list):
+            try:
+                self.template_cache.save()
+            except Exception:
+                log.error('模板缓存保存失败', exc_info=True)
 
-    def get_all_template_info_from_disk(self, need_raw: bool = True, need_config: bool = False) -> List[TemplateInfo]:
+        for item in self.template_cache.item_map.values():
+            key = '%s:%s' % (item.sub_dir, item.template_id)
+            self.template[key] = item.to_template_info()
+
+    def get_all_template_info_from_disk(self, need_raw: bool = True, need_config: bool = False,
+                                        load_from_disk: bool = True) -> List[TemplateInfo]:
         """
         从硬盘加载模板信息
         模板存放在 assets/template 中，再按二级目录区分，例如 assets/template/x/y/
@@ -19,6 +46,7 @@ class TemplateLoader:
         y = 具体的模板文件夹
         :param need_raw: 至少需要有扣出来的原图 开发工具中使用=False
         :param need_config: 是否需要有模板的配置文件 开发工具中使用=True
+        :param load_from_disk: 是否读取模板的配置和图片 只需要模板列表时使用=False
         :return:
         """
         info_list: List[TemplateInfo] = []
@@ -38,10 +66,45 @@ class TemplateLoader:
                 if not is_template_existed(sub_name_1, sub_name_2, need_raw=need_raw, need_config=need_config):
                     continue
 
-                info_list.append(TemplateInfo(sub_name_1, sub_name_2))
+                info_list.append(TemplateInfo(sub_name_1, sub_name_2, load_from_disk=load_from_disk))
 
         return info_list
 
+    def preload(self, sub_dirs: List[str], predicate: Optional[Callable[[str], bool]] = None) -> int:
+        """
+        并发预加载模板到内存 避免首次使用时才读取硬盘
+        图片解码时会释放GIL 可以使用线程池并发加载
+        :param sub_dirs: 需要加载的模板分类
+        :param predicate: 过滤模板id 返回True的才加载 不传入时加载全部
+        :return: 本次加载的模板数量
+        """
+        to_load_list: List[tuple[str, str]] = []
+        template_dir = os_utils.get_path_under_work_dir('assets', 'template')
+        for sub_dir in sub_dirs:
+            sub_dir_path = os.path.join(template_dir, sub_dir)
+            if not os.path.isdir(sub_dir_path):
+                continue
+            for template_id in os.listdir(sub_dir_path):
+                if predicate is not None and not predicate(template_id):
+                    continue
+                if '%s:%s' % (sub_dir, template_id) in self.template:
+                    continue
+                to_load_list.append((sub_dir, template_id))
+
+        future_list = [
+            _template_preload_executor.submit(self.load_template, sub_dir, template_id)
+            for sub_dir, template_id in to_load_list
+        ]
+        cnt: int = 0
+        for future in future_list:
+            try:
+                if future.result() is not None:
+                    cnt += 1
+            except Exception:
+                log.error('预加载模板失败', exc_info=True)
+
+        return cnt
+
     def load_template(self, sub_dir: str, template_id: str, only_mask: bool = False) -> Optional[TemplateInfo]:
         """
         加载某个模板到内存
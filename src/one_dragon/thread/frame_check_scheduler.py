@@ -0,0 +1,257 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, List, Union, Any, Tuple
+
+from one_dragon.utils import cal_utils
+from one_dragon.utils.latency_histogram import LatencyHistogram
+from one_dragon.utils.log_utils import log
+
+
+def get_physical_core_count() -> int:
+    """
+    估算物理核心数 标准库只能拿到逻辑核心数 按超线程折半
+    :return:
+    """
+    return max(2, (os.cpu_count() or 4) // 2)
+
+
+class FrameCheck:
+
+    def __init__(self, name: str, func: Callable[..., Any],
+                 priority: int = 0,
+                 interval_getter: Optional[Callable[[], Union[float, List[float]]]] = None,
+                 sheddable: bool = False):
+        """
+        每帧的一种识别
+        :param name: 名称
+        :param func: 识别方法
+        :param priority: 优先级 越大越先执行
+        :param interval_getter: 获取识别间隔的方法 间隔可能在运行中改变 None时每帧都识别
+        :param sheddable: 画面过时或者负载过高时 是否可以放弃这一帧 留到下一帧再识别
+        """
+        self.name: str = name
+        self.func: Callable[..., Any] = func
+        self.priority: int = priority
+        self.interval_getter: Optional[Callable[[], Union[float, List[float]]]] = interval_getter
+        self.sheddable: bool = sheddable
+
+        self.last_check_time: float = 0  # 上一次识别使用的截图时间
+        self.pending: bool = False  # 已经提交 还没有执行完
+
+        self.cost_histogram: LatencyHistogram = LatencyHistogram()  # 识别本身的耗时
+        self.latency_histogram: LatencyHistogram = LatencyHistogram()  # 截图到识别完成的耗时
+        self.busy_cnt: int = 0  # 上一次还没完成 跳过的次数
+        self.shed_cnt: int = 0  # 放弃的次数
+
+    def clear_stats(self) -> None:
+        self.cost_histogram.clear()
+        self.latency_histogram.clear()
+        self.busy_cnt = 0
+        self.shed_cnt = 0
+
+
+class _FrameTask:
+
+    def __init__(self, check: FrameCheck, screenshot_time: float, prev_check_time: float,
+                 deadline: Optional[float], args: Tuple, future: Future,
+                 on_done: Callable[['_FrameTask', float, float, bool], None]):
+        self.check: FrameCheck = check
+        self.screenshot_time: float = screenshot_time
+        self.prev_check_time: float = prev_check_time
+        self.deadline: Optional[float] = deadline
+        self.args: Tuple = args
+        self.future: Future = future
+        self.on_done: Callable[['_FrameTask', float, float, bool], None] = on_done
+
+
+class FrameCheckPool:
+
+    def __init__(self, thread_name_prefix: str, max_workers: Optional[int] = None):
+        """
+        按优先级执行识别的线程池 多个调度器可以共用
+        - 优先级高的先执行 同优先级按提交顺序
+        - 取出任务时已经超过截止时间的 直接放弃
+        :param thread_name_prefix: 线程名称前缀
+        :param max_workers: 线程数 None时使用物理核心数
+        """
+        self.thread_name_prefix: str = thread_name_prefix
+        self.max_workers: int = max_workers if max_workers is not None else get_physical_core_count()
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, task: _FrameTask) -> None:
+        """
+        提交任务 第一次提交时再创建线程
+        :param task: 任务
+        :return:
+        """
+        if len(self._threads) < self.max_workers:
+            self._start_threads()
+        self._queue.put((-task.check.priority, next(self._seq), task))
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def _start_threads(self) -> None:
+        with self._lock:
+            while len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._worker, daemon=True,
+                                     name='%s_%d' % (self.thread_name_prefix, len(self._threads)))
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self) -> None:
+        while True:
+            _, _, task = self._queue.get()
+            start_time = time.time()
+            if task.deadline is not None and start_time > task.deadline:
+                task.on_done(task, start_time, start_time, True)
+                task.future.set_result(None)
+                continue
+
+            result = None
+            try:
+                result = task.check.func(*task.args)
+            except Exception:
+                log.error('识别 %s 失败', task.check.name, exc_info=True)
+            finish_time = time.time()
+            task.on_done(task, start_time, finish_time, False)
+            task.future.set_result(result)
+
+
+class FrameCheckScheduler:
+
+    def __init__(self, pool: FrameCheckPool, frame_budget: float = 0.2):
+        """
+        每帧识别的调度 统一管理各种识别的间隔、并发、优先级和耗时统计
+        - 同一种识别上一次还没完成时 跳过
+        - 没有达到识别间隔时 跳过
+        - 可放弃的识别 在线程池积压 或者截图已经超过 frame_budget 时放弃 不更新识别时间 下一帧再识别
+        :param pool: 执行识别的线程池
+        :param frame_budget: 一帧画面的有效时间 秒
+        """
+        self.pool: FrameCheckPool = pool
+        self.frame_budget: float = frame_budget
+        self._lock = threading.Lock()
+        self._check_map: dict[str, FrameCheck] = {}
+
+    def register(self, check: FrameCheck) -> None:
+        """
+        注册一种识别
+        :param check: 识别
+        :return:
+        """
+        self._check_map[check.name] = check
+
+    def get_check(self, name: str) -> Optional[FrameCheck]:
+        return self._check_map.get(name)
+
+    def reset(self) -> None:
+        """
+        重置识别时间 重新开始时使用
+        :return:
+        """
+        with self._lock:
+            for check in self._check_map.values():
+                check.last_check_time = 0
+
+    def submit(self, name: str, screenshot_time: float, *args) -> Optional[Future]:
+        """
+        提交一次识别
+        :param name: 识别名称
+        :param screenshot_time: 截图时间
+        :param args: 识别方法的入参
+        :return: 跳过或放弃时返回None
+        """
+        check = self._check_map[name]
+        with self._lock:
+            if check.pending:
+                check.busy_cnt += 1
+                return None
+            if check.interval_getter is not None:
+                interval = cal_utils.random_in_range(check.interval_getter())
+                if screenshot_time - check.last_check_time < interval:
+                    return None
+            if check.sheddable and self.pool.queue_size >= self.pool.max_workers:
+                # 线程池已经积压 低优先级的识别留到下一帧
+                check.shed_cnt += 1
+                return None
+
+            prev_check_time = check.last_check_time
+            check.last_check_time = screenshot_time
+            check.pending = True
+
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        deadline = screenshot_time + self.frame_budget if check.sheddable else None
+        self.pool.submit(_FrameTask(check, screenshot_time, prev_check_time, deadline, args, future, self._on_task_done))
+        return future
+
+    def _on_task_done(self, task: _FrameTask, start_time: float, finish_time: float, shed: bool) -> None:
+        check = task.check
+        with self._lock:
+            check.pending = False
+            if shed:
+                # 画面已经过时 恢复识别时间 下一帧再识别
+                check.last_check_time = task.prev_check_time
+                check.shed_cnt += 1
+                return
+        check.cost_histogram.record(finish_time - start_time)
+        check.latency_histogram.record(finish_time - task.screenshot_time)
+
+    def get_stats_text(self) -> List[str]:
+        """
+        各识别的统计
+        :return:
+        """
+        result = []
+        for check in sorted(self._check_map.values(), key=lambda c: -c.priority):
+            result.append('%s 耗时 [%s] 延迟 [%s] 跳过 %d 放弃 %d' % (
+                check.name, check.cost_histogram, check.latency_histogram, check.busy_cnt, check.shed_cnt))
+        return result
+
+    def log_stats(self) -> None:
+        for line in self.get_stats_text():
+            log.info(line)
+
+    def clear_stats(self) -> None:
+        for check in self._check_map.values():
+            check.clear_stats()
+
+
+def __debug():
+    """
+    模拟每帧提交识别 线程池只有2个线程 闪避识别需要10ms 其它识别需要30ms
+    """
+    import random
+    pool = FrameCheckPool('debug_frame_check', max_workers=2)
+    scheduler = FrameCheckScheduler(pool, frame_budget=0.1)
+
+    def work(cost: float) -> Callable[[], None]:
+        return lambda: time.sleep(cost * (0.5 + random.random()))
+
+    scheduler.register(FrameCheck('闪避', work(0.01), priority=3))
+    scheduler.register(FrameCheck('角色', work(0.03), priority=2, interval_getter=lambda: 0.1))
+    scheduler.register(FrameCheck('快速支援', work(0.03), priority=1, interval_getter=lambda: 0.1))
+    scheduler.register(FrameCheck('距离', work(0.03), priority=0, interval_getter=lambda: 0.2, sheddable=True))
+    scheduler.register(FrameCheck('战斗结束', work(0.03), priority=0, interval_getter=lambda: 0.2, sheddable=True))
+
+    for _ in range(200):
+        now = time.time()
+        for name in ['闪避', '角色', '快速支援', '距离', '战斗结束']:
+            scheduler.submit(name, now)
+        time.sleep(0.02)
+    time.sleep(0.5)
+    for line in scheduler.get_stats_text():
+        print(line)
+
+
+if __name__ == '__main__':
+    __debug()
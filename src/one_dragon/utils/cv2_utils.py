@@ -117,7 +117,8 @@ def mark_area_as_color(image: MatLike, pos: List, color, new_image: bool = False
 
 def match_template(source: MatLike, template: MatLike, threshold,
                    mask: np.ndarray = None, only_best: bool = True,
-                   ignore_inf: bool = False) -> MatchResultList:
+                   ignore_inf: bool = False,
+                   merge_distance: float = 10) -> MatchResultList:
     """
     在原图中匹配模板 注意无法从负偏移量开始匹配 即需要保证目标模板不会在原图边缘位置导致匹配不到
     :param source: 原图
@@ -126,7 +127,8 @@ def match_template(source: MatLike, template: MatLike, threshold,
     :param mask: 掩码
     :param only_best: 只返回最好的结果
     :param ignore_inf: 是否忽略无限大的结果
-    :return: 所有匹配结果
+    :param merge_distance: 返回多个结果时 多少距离内只保留置信度最高的一个
+    :return: 所有匹配结果 返回多个结果时按置信度从高到低排列 不再是按位置从上到下、从左到右
     """
     tx, ty = template.shape[1], template.shape[0]
     # 进行模板匹配
@@ -135,16 +137,138 @@ def match_template(source: MatLike, template: MatLike, threshold,
     # show_image(mask, win_name='mask')
     result = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=mask)
 
+    if mask is not None:
+        # 使用掩码时 原图区域为纯色会出现 nan 或 inf
+        np.nan_to_num(result, copy=False, nan=-1, posinf=(-1 if ignore_inf else np.inf), neginf=-1)
+
+    if only_best:
+        return _match_template_best(result, threshold, tx, ty)
+    else:
+        return _match_template_multi(result, threshold, tx, ty, merge_distance)
+
+
+def _match_template_best(result: np.ndarray, threshold: float, tx: int, ty: int) -> MatchResultList:
+    """
+    只取置信度最高的匹配结果 不需要遍历所有位置
+    :param result: cv2.matchTemplate 的结果
+    :param threshold: 阈值
+    :param tx: 模板宽度
+    :param ty: 模板高度
+    :return:
+    """
+    match_result_list = MatchResultList(only_best=True)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val >= threshold:
+        match_result_list.append(MatchResult(max_val, max_loc[0], max_loc[1], tx, ty))
+    return match_result_list
+
+
+def _match_template_multi(result: np.ndarray, threshold: float, tx: int, ty: int,
+                          merge_distance: float) -> MatchResultList:
+    """
+    返回所有匹配结果 使用非极大值抑制 一定距离内只保留置信度最高的
+    :param result: cv2.matchTemplate 的结果
+    :param threshold: 阈值
+    :param tx: 模板宽度
+    :param ty: 模板高度
+    :param merge_distance: 抑制距离
+    :return: 按置信度从高到低排列的匹配结果
+    """
+    match_result_list = MatchResultList(only_best=False)
+
+    # 先找出 3x3 范围内的局部最大值 减少候选点 距离的抑制留给下面按置信度的贪心处理
+    local_max = cv2.dilate(result, np.ones((3, 3), dtype=np.uint8))
+    ys, xs = np.where(np.logical_and(result >= threshold, result >= local_max))
+    if len(xs) == 0:
+        return match_result_list
+
+    confidence = result[ys, xs]
+    order = np.argsort(-confidence, kind='stable')
+    xs, ys, confidence = xs[order], ys[order], confidence[order]
+
+    # 按置信度从高到低 与已保留的结果距离在 merge_distance 内的抑制 被抑制的点不会再抑制其它点
+    kept_x = np.empty(len(xs), dtype=np.int64)
+    kept_y = np.empty(len(xs), dtype=np.int64)
+    kept_cnt = 0
+    max_dis2 = merge_distance ** 2
+    for x, y, c in zip(xs, ys, confidence):
+        if kept_cnt > 0:
+            dx = kept_x[:kept_cnt] - x
+            dy = kept_y[:kept_cnt] - y
+            if np.any(dx * dx + dy * dy <= max_dis2):
+                continue
+        kept_x[kept_cnt] = x
+        kept_y[kept_cnt] = y
+        kept_cnt += 1
+        match_result_list.append(MatchResult(c, x, y, tx, ty), auto_merge=False)
+
+    return match_result_list
+
+
+def match_template_pyramid(source: MatLike, template: MatLike, threshold,
+                           mask: np.ndarray = None, only_best: bool = True,
+                           ignore_inf: bool = False,
+                           merge_distance: float = 10,
+                           pyramid_level: int = 1,
+                           coarse_threshold_offset: float = 0.15,
+                           coarse_candidate_cnt: int = 3) -> MatchResultList:
+    """
+    金字塔匹配 先在缩小后的图上粗略匹配 再在原图中 只对粗略结果附近的小窗口做精确匹配
+    适合在大图中匹配模板 匹配结果与 match_template 一致
+    注意 模板需要有足够的纹理 缩小后特征消失的小图标不适合使用
+    :param source: 原图
+    :param template: 模板
+    :param threshold: 阈值
+    :param mask: 掩码
+    :param only_best: 只返回最好的结果
+    :param ignore_inf: 是否忽略无限大的结果
+    :param merge_distance: 返回多个结果时 多少距离内只保留置信度最高的一个
+    :param pyramid_level: 金字塔层数 每层缩小一半 0 时等同于 match_template
+    :param coarse_threshold_offset: 粗略匹配的阈值 比 threshold 低多少
+    :param coarse_candidate_cnt: 只返回最好的结果时 最多精确匹配多少个粗略结果
+    :return: 所有匹配结果
+    """
+    scale = 2 ** pyramid_level
+    tx, ty = template.shape[1], template.shape[0]
+    sx, sy = source.shape[1], source.shape[0]
+    coarse_tx, coarse_ty = tx // scale, ty // scale
+    if pyramid_level <= 0 or coarse_tx < 4 or coarse_ty < 4:
+        # 缩小后模板太小 无法可靠匹配
+        return match_template(source, template, threshold, mask=mask, only_best=only_best,
+                              ignore_inf=ignore_inf, merge_distance=merge_distance)
+
+    coarse_source = cv2.resize(source, (sx // scale, sy // scale), interpolation=cv2.INTER_AREA)
+    coarse_template = cv2.resize(template, (coarse_tx, coarse_ty), interpolation=cv2.INTER_AREA)
+    coarse_mask = None
+    if mask is not None:
+        coarse_mask = cv2.resize(mask, (coarse_tx, coarse_ty), interpolation=cv2.INTER_AREA)
+        _, coarse_mask = cv2.threshold(coarse_mask, 127, 255, cv2.THRESH_BINARY)
+
+    coarse_result_list = match_template(coarse_source, coarse_template, threshold - coarse_threshold_offset,
+                                        mask=coarse_mask, only_best=False, ignore_inf=ignore_inf,
+                                        merge_distance=max(1.0, merge_distance / scale))
+
     match_result_list = MatchResultList(only_best=only_best)
-    filtered_locations = np.where(np.logical_and(
-        result >= threshold,
-        np.isfinite(result) if ignore_inf else np.ones_like(result))
-    )  # 过滤低置信度的匹配结果
-
-    # 遍历所有匹配结果，并输出位置和置信度
-    for pt in zip(*filtered_locations[::-1]):
-        confidence = result[pt[1], pt[0]]  # 获取置信度
-        match_result_list.append(MatchResult(confidence, pt[0], pt[1], tx, ty))
+    for idx, coarse_mr in enumerate(coarse_result_list):
+        if only_best and idx >= coarse_candidate_cnt:
+            break
+
+        # 在原图中 粗略结果附近留出缩放误差的范围
+        pad = scale * 2
+        x1 = max(0, coarse_mr.x * scale - pad)
+        y1 = max(0, coarse_mr.y * scale - pad)
+        x2 = min(sx, coarse_mr.x * scale + tx + pad)
+        y2 = min(sy, coarse_mr.y * scale + ty + pad)
+        if x2 - x1 < tx or y2 - y1 < ty:
+            continue
+
+        fine_result_list = match_template(source[y1:y2, x1:x2], template, threshold, mask=mask,
+                                          only_best=only_best, ignore_inf=ignore_inf,
+                                          merge_distance=merge_distance)
+        for fine_mr in fine_result_list:
+            fine_mr.x += x1
+            fine_mr.y += y1
+            match_result_list.append(fine_mr, merge_distance=merge_distance)
 
     return match_result_list
 
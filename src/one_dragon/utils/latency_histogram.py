@@ -0,0 +1,65 @@
+import threading
+from typing import List
+
+
+class LatencyHistogram:
+
+    BUCKET_MS: List[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]  # 各个桶的上限 最后还有一个无上限的桶
+
+    def __init__(self):
+        """
+        耗时的直方图 用于统计识别、指令等的耗时分布 按机器调整识别间隔
+        """
+        self._lock = threading.Lock()
+        self.bucket_cnt: List[int] = [0] * (len(LatencyHistogram.BUCKET_MS) + 1)
+        self.cnt: int = 0
+        self.total_ms: float = 0
+        self.max_ms: float = 0
+
+    def record(self, seconds: float) -> None:
+        """
+        记录一次耗时
+        :param seconds: 耗时 秒
+        :return:
+        """
+        ms = seconds * 1000
+        idx = 0
+        while idx < len(LatencyHistogram.BUCKET_MS) and ms > LatencyHistogram.BUCKET_MS[idx]:
+            idx += 1
+        with self._lock:
+            self.bucket_cnt[idx] += 1
+            self.cnt += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def percentile(self, p: float) -> float:
+        """
+        估算百分位数 返回所在桶的上限
+        :param p: 0~1
+        :return: 毫秒 落在最后一个桶时返回最大值
+        """
+        if self.cnt == 0:
+            return 0
+        target = p * self.cnt
+        acc = 0
+        for idx, cnt in enumerate(self.bucket_cnt):
+            acc += cnt
+            if acc >= target:
+                return LatencyHistogram.BUCKET_MS[idx] if idx < len(LatencyHistogram.BUCKET_MS) else self.max_ms
+        return self.max_ms
+
+    @property
+    def avg_ms(self) -> float:
+        return 0 if self.cnt == 0 else self.total_ms / self.cnt
+
+    def clear(self) -> None:
+        with self._lock:
+            self.bucket_cnt = [0] * (len(LatencyHistogram.BUCKET_MS) + 1)
+            self.cnt = 0
+            self.total_ms = 0
+            self.max_ms = 0
+
+    def __str__(self):
+        return '次数 %d 平均 %.1fms p50<=%.0fms p95<=%.0fms 最大 %.1fms' % (
+            self.cnt, self.avg_ms, self.percentile(0.5), self.percentile(0.95), self.max_ms)
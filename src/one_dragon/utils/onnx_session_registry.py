@@ -0,0 +1,215 @@
+import os
+import threading
+from typing import Optional, List
+
+import onnxruntime as ort
+
+from one_dragon.utils.log_utils import log
+
+_GRAPH_OPTIMIZATION_LEVEL_MAP: dict[str, ort.GraphOptimizationLevel] = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+class OnnxSessionConfig:
+
+    def __init__(self,
+                 intra_op_num_threads: int = 0,
+                 inter_op_num_threads: int = 1,
+                 graph_optimization_level: str = 'all',
+                 parallel_execution: bool = False,
+                 enable_cpu_mem_arena: bool = True,
+                 allow_spinning: bool = False,
+                 cache_optimized_model: bool = True,
+                 ):
+        """
+        创建 InferenceSession 时使用的参数
+        :param intra_op_num_threads: 单个算子内并行的线程数 即这个模型的线程预算 0为由onnxruntime决定(使用所有核心)
+        :param inter_op_num_threads: 算子间并行的线程数 只在 parallel_execution 时有效
+        :param graph_optimization_level: 图优化等级 disable / basic / extended / all
+        :param parallel_execution: 是否使用并行执行模式
+        :param enable_cpu_mem_arena: 是否使用内存池
+        :param allow_spinning: 线程空闲时是否自旋等待 多个模型并发时关闭可以避免互相抢占CPU
+        :param cache_optimized_model: 是否把优化后的模型保存到硬盘 下次直接加载 只在使用CPU时有效
+        """
+        self.intra_op_num_threads: int = intra_op_num_threads
+        self.inter_op_num_threads: int = inter_op_num_threads
+        self.graph_optimization_level: str = graph_optimization_level
+        self.parallel_execution: bool = parallel_execution
+        self.enable_cpu_mem_arena: bool = enable_cpu_mem_arena
+        self.allow_spinning: bool = allow_spinning
+        self.cache_optimized_model: bool = cache_optimized_model
+
+    @property
+    def key(self) -> tuple:
+        """
+        参数的标识 参数一样的才能共用session
+        """
+        return (self.intra_op_num_threads, self.inter_op_num_threads, self.graph_optimization_level,
+                self.parallel_execution, self.enable_cpu_mem_arena, self.allow_spinning, self.cache_optimized_model)
+
+    def to_session_options(self, optimization_level: Optional[str] = None) -> ort.SessionOptions:
+        """
+        转化成 SessionOptions
+        :param optimization_level: 覆盖图优化等级
+        :return:
+        """
+        options = ort.SessionOptions()
+        if self.intra_op_num_threads > 0:
+            options.intra_op_num_threads = self.intra_op_num_threads
+        if self.inter_op_num_threads > 0:
+            options.inter_op_num_threads = self.inter_op_num_threads
+        level = self.graph_optimization_level if optimization_level is None else optimization_level
+        options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVEL_MAP.get(
+            level, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if self.parallel_execution
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+        options.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+        options.add_session_config_entry('session.intra_op.allow_spinning', '1' if self.allow_spinning else '0')
+        options.add_session_config_entry('session.inter_op.allow_spinning', '1' if self.allow_spinning else '0')
+        return options
+
+
+def get_thread_budget(max_threads: int) -> int:
+    """
+    按机器核心数限制线程预算
+    :param max_threads: 最多使用的线程数
+    :return:
+    """
+    cpu_cnt = os.cpu_count() or 1
+    return max(1, min(max_threads, cpu_cnt))
+
+
+class OnnxSessionRegistry:
+
+    def __init__(self):
+        """
+        统一创建和管理 InferenceSession
+        - 同一个模型文件+同样的providers+同样的参数 只创建一个session
+        - 可以按模型固定线程预算 避免OCR、闪光分类、YOLO并发时抢占所有核心
+        - 优化后的模型保存到硬盘 避免每次启动都重新优化
+        """
+        self._lock = threading.Lock()
+        self._session_map: dict[tuple, ort.InferenceSession] = {}
+        self._config_map: dict[str, OnnxSessionConfig] = {}
+        self.optimized_model_dir: Optional[str] = None  # 优化后模型的保存目录 None时保存在原模型旁边
+
+    def set_model_config(self, model_key: str, config: OnnxSessionConfig) -> None:
+        """
+        固定某个模型使用的参数 需要在创建session前设置
+        :param model_key: 模型的标识
+        :param config: 参数
+        :return:
+        """
+        with self._lock:
+            self._config_map[model_key] = config
+
+    def get_model_config(self, model_key: str, default_config: Optional[OnnxSessionConfig] = None) -> OnnxSessionConfig:
+        """
+        获取模型使用的参数
+        :param model_key: 模型的标识
+        :param default_config: 没有固定参数时使用的默认值
+        :return:
+        """
+        config = self._config_map.get(model_key)
+        if config is not None:
+            return config
+        if default_config is not None:
+            return default_config
+        return OnnxSessionConfig(intra_op_num_threads=get_thread_budget(4))
+
+    def get_session(self, model_path: str, providers: List[str],
+                    model_key: Optional[str] = None,
+                    default_config: Optional[OnnxSessionConfig] = None) -> ort.InferenceSession:
+        """
+        获取模型的session 不存在时创建
+        :param model_path: onnx模型的路径
+        :param providers: 使用的 ExecutionProvider
+        :param model_key: 模型的标识 用于查找固定的参数 不传入时使用模型路径
+        :param default_config: 没有固定参数时使用的默认值
+        :return:
+        """
+        config = self.get_model_config(model_key if model_key is not None else model_path, default_config)
+        key = (os.path.abspath(model_path), tuple(providers), config.key)
+        session = self._session_map.get(key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._session_map.get(key)
+            if session is None:
+                if any(i[:2] == key[:2] for i in self._session_map):
+                    log.warning('模型已经使用其它参数创建过session 将再创建一个 %s', model_path)
+                session = self._create_session(model_path, providers, config)
+                self._session_map[key] = session
+            return session
+
+    def _create_session(self, model_path: str, providers: List[str], config: OnnxSessionConfig) -> ort.InferenceSession:
+        """
+        创建session 使用CPU时优先加载硬盘上优化后的模型
+        :param model_path: onnx模型的路径
+        :param providers: 使用的 ExecutionProvider
+        :param config: 参数
+        :return:
+        """
+        if not config.cache_optimized_model or providers != ['CPUExecutionProvider']:
+            return ort.InferenceSession(model_path, sess_options=config.to_session_options(), providers=providers)
+
+        optimized_path = get_optimized_model_path(model_path, self.optimized_model_dir)
+        if (os.path.exists(optimized_path)
+                and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)):
+            try:
+                return ort.InferenceSession(optimized_path, sess_options=config.to_session_options(),
+                                            providers=providers)
+            except Exception:
+                log.error('加载优化后的模型失败 %s', optimized_path, exc_info=True)
+
+        # 离线保存时最多使用 extended 等级 all 等级的布局优化与CPU指令集相关 每次加载时再做
+        save_level = config.graph_optimization_level if config.graph_optimization_level != 'all' else 'extended'
+        try:
+            save_options = config.to_session_options(optimization_level=save_level)
+            save_options.optimized_model_filepath = optimized_path
+            ort.InferenceSession(model_path, sess_options=save_options, providers=providers)
+            log.info('已保存优化后的模型 %s', optimized_path)
+        except Exception:
+            log.error('保存优化后的模型失败 %s', optimized_path, exc_info=True)
+            return ort.InferenceSession(model_path, sess_options=config.to_session_options(), providers=providers)
+
+        return ort.InferenceSession(optimized_path, sess_options=config.to_session_options(), providers=providers)
+
+    def clear(self) -> None:
+        """
+        释放所有session
+        :return:
+        """
+        with self._lock:
+            self._session_map.clear()
+
+
+def get_optimized_model_path(model_path: str, save_dir: Optional[str] = None) -> str:
+    """
+    优化后的模型路径 与onnxruntime版本相关
+    :param model_path: 原模型路径
+    :param save_dir: 保存目录 None时保存在原模型旁边
+    :return:
+    """
+    if save_dir is None:
+        base, _ = os.path.splitext(model_path)
+    else:
+        # 不同模型的文件名可能一样(例如 model.onnx) 使用父目录名区分
+        abs_path = os.path.abspath(model_path)
+        parent_name = os.path.basename(os.path.dirname(abs_path))
+        file_name = os.path.splitext(os.path.basename(abs_path))[0]
+        os.makedirs(save_dir, exist_ok=True)
+        base = os.path.join(save_dir, f'{parent_name}.{file_name}')
+    return f'{base}.ort-{ort.__version__}.opt.onnx'
+
+
+_registry = OnnxSessionRegistry()
+
+
+def get_session_registry() -> OnnxSessionRegistry:
+    return _registry
@@ -145,19 +145,27 @@ def nms(boxes, scores, iou_threshold):
 
 
 def multiclass_nms(boxes, scores, class_ids, iou_threshold):
-
-    unique_class_ids = np.unique(class_ids)
-
-    keep_boxes = []
-    for class_id in unique_class_ids:
-        class_indices = np.where(class_ids == class_id)[0]
-        class_boxes = boxes[class_indices,:]
-        class_scores = scores[class_indices]
-
-        class_keep_boxes = nms(class_boxes, class_scores, iou_threshold)
-        keep_boxes.extend(class_indices[class_keep_boxes])
-
-    return keep_boxes
+    """
+    按类别分别进行NMS 使用 cv2.dnn.NMSBoxesBatched 一次完成
+    返回顺序与原来按类别逐个NMS一致 即按类别id从小到大 同类别内按置信度从高到低
+    :param boxes: xyxy
+    :param scores: 置信度
+    :param class_ids: 类别
+    :param iou_threshold: iou阈值
+    :return: 保留的下标
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    xywh = np.empty_like(boxes)
+    xywh[:, :2] = boxes[:, :2]
+    np.subtract(boxes[:, 2:], boxes[:, :2], out=xywh[:, 2:])
+    keep_boxes = np.asarray(
+        cv2.dnn.NMSBoxesBatched(xywh, scores, np.asarray(class_ids, dtype=np.int32), 0, iou_threshold),  # 置信度已经在外面过滤
+        dtype=np.int64
+    ).reshape(-1)
+
+    return keep_boxes[np.argsort(class_ids[keep_boxes], kind='stable')]
 
 
 def compute_iou(box, boxes):
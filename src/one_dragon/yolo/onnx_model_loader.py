@@ -6,6 +6,7 @@ import urllib.request
 import zipfile
 from typing import Optional, List
 
+from one_dragon.utils.onnx_session_registry import OnnxSessionConfig, get_session_registry
 from one_dragon.yolo.log_utils import log
 
 _GH_PROXY_URL = 'https://ghfast.top'
@@ -22,6 +23,7 @@ class OnnxModelLoader:
                  personal_proxy: Optional[str] = '',
                  gpu: bool = False,
                  backup_model_name: Optional[str] = None,
+                 session_config: Optional[OnnxSessionConfig] = None,
                  ):
         self.model_name: str = model_name
         self.backup_model_name: str = backup_model_name  # 备用模型 默认在本地一定有的模型 在新模型无法下载使用时使用
@@ -32,6 +34,7 @@ class OnnxModelLoader:
         self.gh_proxy_url: str = gh_proxy_url
         self.personal_proxy: Optional[str] = personal_proxy
         self.gpu: bool = gpu  # 是否使用GPU加速
+        self.session_config: Optional[OnnxSessionConfig] = session_config  # 创建session的参数 未在注册中心固定参数时使用
 
         # 从模型中读取到的输入输出信息
         self.session: ort.InferenceSession = None
@@ -134,9 +137,11 @@ class OnnxModelLoader:
 
         onnx_path = os.path.join(self.model_dir_path, 'model.onnx')
         log.info('加载模型 %s', onnx_path)
-        self.session = ort.InferenceSession(
+        self.session = get_session_registry().get_session(
             onnx_path,
-            providers=providers
+            providers=providers,
+            model_key=self.model_name,
+            default_config=self.session_config
         )
         self.get_input_details()
         self.get_output_details()
@@ -4,6 +4,7 @@ import numpy as np
 from cv2.typing import MatLike
 from typing import Optional, List
 
+from one_dragon.utils.onnx_session_registry import OnnxSessionConfig, get_thread_budget
 from one_dragon.yolo import onnx_utils
 from one_dragon.yolo.onnx_model_loader import OnnxModelLoader
 
@@ -60,12 +61,14 @@ class Yolov8Classifier(OnnxModelLoader):
                  gpu: bool = False,
                  backup_model_name: Optional[str] = None,
                  keep_result_seconds: float = 2,
+                 session_config: Optional[OnnxSessionConfig] = None,
                  ):
         """
         :param model_name: 模型名称 在根目录下会有一个以模型名称创建的子文件夹
         :param model_parent_dir_path: 放置所有模型的根目录
         :param gpu: 是否启用GPU加速
         :param keep_result_seconds: 保留多长时间的识别结果
+        :param session_config: 创建session的参数 不传入时使用默认的线程预算
         """
         OnnxModelLoader.__init__(
             self,
@@ -76,7 +79,10 @@ class Yolov8Classifier(OnnxModelLoader):
             gh_proxy_url=gh_proxy_url,
             personal_proxy=personal_proxy,
             gpu=gpu,
-            backup_model_name=backup_model_name
+            backup_model_name=backup_model_name,
+            session_config=session_config if session_config is not None else OnnxSessionConfig(
+                intra_op_num_threads=get_thread_budget(2)
+            )
         )
 
         self.keep_result_seconds: float = keep_result_seconds  # 保留识别结果的秒数
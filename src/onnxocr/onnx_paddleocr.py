@@ -26,19 +26,19 @@ class ONNXPaddleOcr(TextSystem):
         # 初始化模型
         super().__init__(params)
 
-    def ocr(self, img, det=True, rec=True, cls=True):
+    def ocr(self, img, det=True, rec=True, cls=True, max_candidates=None, det_size=None):
         if cls == True and self.use_angle_cls == False:
             print('Since the angle classifier is not initialized, the angle classifier will not be uesd during the forward process')
 
         if det and rec:
             ocr_res = []
-            dt_boxes, rec_res = self.__call__(img, cls)
+            dt_boxes, rec_res = self.__call__(img, cls, max_candidates=max_candidates, det_size=det_size)
             tmp_res = [[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)]
             ocr_res.append(tmp_res)
             return ocr_res
         elif det and not rec:
             ocr_res = []
-            dt_boxes = self.text_detector(img)
+            dt_boxes = self.text_detector(img, max_candidates=max_candidates, det_size=det_size)
             tmp_res = [box.tolist() for box in dt_boxes]
             ocr_res.append(tmp_res)
             return ocr_res
@@ -59,6 +59,26 @@ class ONNXPaddleOcr(TextSystem):
                 return cls_res
             return ocr_res
 
+    def ocr_batch(self, img_list, cls=True, max_candidates=None, det_size=None):
+        """
+        对多张图片进行检测+识别 识别部分合并成一批运行
+        :param img_list: 图片列表
+        :param cls: 是否使用方向分类
+        :param max_candidates: 检测时每张图片最多检查的轮廓数量 None时使用默认值
+        :param det_size: 检测时每张图片长边的上限 None时使用默认值
+        :return: 每张图片的结果 格式与 ocr(img)[0] 一致
+        """
+        if cls == True and self.use_angle_cls == False:
+            print('Since the angle classifier is not initialized, the angle classifier will not be uesd during the forward process')
+
+        ocr_res = []
+        for dt_boxes, rec_res in self.batch_call(img_list, cls, max_candidates=max_candidates, det_size=det_size):
+            if dt_boxes is None:
+                ocr_res.append([])
+                continue
+            ocr_res.append([[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)])
+        return ocr_res
+
 
 def sav2Img(org_img, result, name="draw_ocr.jpg"):
     # 显示结果
@@ -59,7 +59,10 @@ class DetResizeForTest(object):
 
         if self.resize_type == 0:
             # img, shape = self.resize_image_type0(img)
-            img, [ratio_h, ratio_w] = self.resize_image_type0(img)
+            # 调用方可以按次指定检测尺寸 不影响其它调用
+            img, [ratio_h, ratio_w] = self.resize_image_type0(img,
+                                                              limit_side_len=data.get('limit_side_len'),
+                                                              limit_type=data.get('limit_type'))
         elif self.resize_type == 2:
             img, [ratio_h, ratio_w] = self.resize_image_type2(img)
         else:
@@ -88,19 +91,24 @@ class DetResizeForTest(object):
         # return img, np.array([ori_h, ori_w])
         return img, [ratio_h, ratio_w]
 
-    def resize_image_type0(self, img):
+    def resize_image_type0(self, img, limit_side_len=None, limit_type=None):
         """
         resize image to a size multiple of 32 which is required by the network
         args:
             img(array): array with shape [h, w, c]
+            limit_side_len(int): override self.limit_side_len for this call
+            limit_type(str): override self.limit_type for this call
         return(tuple):
             img, (ratio_h, ratio_w)
         """
-        limit_side_len = self.limit_side_len
+        if limit_side_len is None:
+            limit_side_len = self.limit_side_len
+        if limit_type is None:
+            limit_type = self.limit_type
         h, w, c = img.shape
 
         # limit the max side
-        if self.limit_type == 'max':
+        if limit_type == 'max':
             if max(h, w) > limit_side_len:
                 if h > w:
                     ratio = float(limit_side_len) / h
@@ -108,7 +116,7 @@ class DetResizeForTest(object):
                     ratio = float(limit_side_len) / w
             else:
                 ratio = 1.
-        elif self.limit_type == 'min':
+        elif limit_type == 'min':
             if min(h, w) < limit_side_len:
                 if h < w:
                     ratio = float(limit_side_len) / h
@@ -116,7 +124,7 @@ class DetResizeForTest(object):
                     ratio = float(limit_side_len) / w
             else:
                 ratio = 1.
-        elif self.limit_type == 'resize_long':
+        elif limit_type == 'resize_long':
             ratio = float(limit_side_len) / max(h, w)
         else:
             raise Exception('not support limit type, image ')
@@ -1,17 +1,30 @@
-import onnxruntime
+from one_dragon.utils.onnx_session_registry import OnnxSessionConfig, get_session_registry, get_thread_budget
+
 
 class PredictBase(object):
     def __init__(self):
         pass
 
-    def get_onnx_session(self, model_dir, use_gpu):
+    def get_onnx_session(self, model_dir, use_gpu, model_key=None, max_threads=4):
+        """
+        通过注册中心获取session 线程数按模型分配 避免与其它模型并发时抢占所有核心
+        :param model_dir: 模型路径
+        :param use_gpu: 是否使用gpu
+        :param model_key: 模型标识 可以在注册中心中固定参数
+        :param max_threads: 默认的线程预算
+        :return:
+        """
         # 使用gpu
         if use_gpu:
             providers = providers=['CUDAExecutionProvider']
         else:
             providers = providers = ['CPUExecutionProvider']
 
-        onnx_session = onnxruntime.InferenceSession(model_dir, None,providers=providers)
+        onnx_session = get_session_registry().get_session(
+            model_dir, providers,
+            model_key=model_key,
+            default_config=OnnxSessionConfig(intra_op_num_threads=get_thread_budget(max_threads))
+        )
 
         # print("providers:", onnxruntime.get_device())
         return onnx_session
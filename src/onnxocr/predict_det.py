@@ -1,8 +1,28 @@
+import math
+
 import numpy as np
 from onnxocr.imaug import transform, create_operators
 from onnxocr.db_postprocess import DBPostProcess
 from onnxocr.predict_base import PredictBase
 
+DET_TARGET_TEXT_HEIGHT: int = 12  # 按文字高度选择检测尺寸时 缩放后文字的目标高度 与默认配置下1080p画面常见文字(约24px)缩小一半后一致
+DET_MIN_SIDE_LEN: int = 64  # 按文字高度选择检测尺寸时 最小的长边
+DET_MAX_SIDE_LEN: int = 1920  # 按文字高度选择检测尺寸时 最大的长边
+
+
+def get_det_size_by_text_height(img_shape, text_height):
+    """
+    按预期的文字高度 选择检测时的长边 使缩放后的文字高度接近 DET_TARGET_TEXT_HEIGHT
+    - 大字的整屏可以缩得更小 小字的整屏可以保留更多细节
+    - 长边不超过原图时不放大 与原来一样只按32对齐
+    :param img_shape: 图片的形状
+    :param text_height: 原图上预期的文字高度 像素
+    :return: 检测时的长边 32的倍数
+    """
+    max_side = max(img_shape[0], img_shape[1])
+    det_size = int(math.ceil(max_side * DET_TARGET_TEXT_HEIGHT / float(text_height) / 32)) * 32
+    return min(max(det_size, DET_MIN_SIDE_LEN), DET_MAX_SIDE_LEN)
+
 
 class TextDetector(PredictBase):
     def __init__(self, args):
@@ -44,7 +64,7 @@ class TextDetector(PredictBase):
         self.postprocess_op = DBPostProcess(**postprocess_params)
 
         # 初始化模型
-        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu)
+        self.det_onnx_session = self.get_onnx_session(args.det_model_dir, args.use_gpu, model_key='ocr_det', max_threads=4)
         self.det_input_name = self.get_input_name(self.det_onnx_session)
         self.det_output_name = self.get_output_name(self.det_onnx_session)
 
@@ -95,9 +115,18 @@ class TextDetector(PredictBase):
         dt_boxes = np.array(dt_boxes_new)
         return dt_boxes
 
-    def __call__(self, img):
+    def __call__(self, img, max_candidates=None, det_size=None):
+        """
+        :param img: 图片
+        :param max_candidates: 本次最多检查的轮廓数量 None时使用默认值
+        :param det_size: 本次检测时长边的上限 超过时缩小 None时使用 det_limit_side_len 和 det_limit_type
+        :return: 检测框
+        """
         ori_im = img.copy()
         data = {'image': img}
+        if det_size is not None:
+            data['limit_side_len'] = det_size
+            data['limit_type'] = 'max'
 
         data = transform(data, self.preprocess_op)
         img, shape_list = data
@@ -114,7 +143,7 @@ class TextDetector(PredictBase):
         preds = {}
         preds['maps'] = outputs[0]
 
-        post_result = self.postprocess_op(preds, shape_list)
+        post_result = self.postprocess_op(preds, shape_list, max_candidates=max_candidates)
         dt_boxes = post_result[0]['points']
 
         if self.args.det_box_type == 'poly':
@@ -124,3 +153,75 @@ class TextDetector(PredictBase):
 
         return dt_boxes
 
+
+def __debug():
+    """
+    对比默认检测尺寸 和按文字高度选择检测尺寸 的检测框数量与耗时
+    使用 .debug/images 下的截图和裁剪 没有时使用随机图片 只对比预处理和输入大小
+    """
+    import os
+    import time
+    from onnxocr.onnx_paddleocr import ONNXPaddleOcr
+    from one_dragon.utils import os_utils, debug_utils
+
+    # 图片名称, 裁剪区域, 预期文字高度
+    fixture_list = [
+        ('1', None, 24),  # 整屏
+        ('1', (1500, 40, 1700, 80), 24),  # 距离
+        ('1', (0, 0, 640, 360), 24),  # 左上角
+        ('1', (560, 800, 1360, 1000), 48),  # 大字标题
+    ]
+    rng = np.random.default_rng(0)
+    image_list = []
+    for name, rect, text_height in fixture_list:
+        if os.path.exists(debug_utils.get_debug_image_path(name)):
+            image = debug_utils.get_debug_image(name)
+        else:
+            image = rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8)
+        if rect is not None:
+            image = image[rect[1]:rect[3], rect[0]:rect[2]]
+        image_list.append((image, text_height))
+
+    models_dir = os_utils.get_path_under_work_dir('assets', 'models', 'onnx_ocr')
+    det_model_path = os.path.join(models_dir, 'det.onnx')
+    detector = None
+    if os.path.exists(det_model_path):
+        detector = ONNXPaddleOcr(
+            use_angle_cls=False, use_gpu=False,
+            det_model_dir=det_model_path,
+            rec_model_dir=os.path.join(models_dir, 'rec.onnx'),
+            cls_model_dir=os.path.join(models_dir, 'cls.onnx'),
+            rec_char_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
+        ).text_detector
+    else:
+        print('没有检测模型 只对比预处理')
+
+    resize_op = create_operators([{'DetResizeForTest': {'limit_side_len': 960, 'limit_type': 'max'}}])
+
+    def resize(image, size):
+        data = {'image': image}
+        if size is not None:
+            data['limit_side_len'] = size
+            data['limit_type'] = 'max'
+        return transform(data, resize_op)['image']
+
+    run_times = 20
+    for image, text_height in image_list:
+        det_size = get_det_size_by_text_height(image.shape, text_height)
+        line = '%s 文字高度 %d' % (image.shape[:2], text_height)
+        for title, size in [('默认', None), ('按文字高度 %d' % det_size, det_size)]:
+            input_shape = resize(image, size).shape[:2]
+            box_cnt = -1
+            t = time.perf_counter()
+            for _ in range(run_times):
+                if detector is None:
+                    resize(image, size)
+                else:
+                    box_cnt = len(detector(image, det_size=size))
+            cost = (time.perf_counter() - t) / run_times * 1000
+            line += ' | %s 输入 %s 检测框 %d 耗时 %.2fms' % (title, input_shape, box_cnt, cost)
+        print(line)
+
+
+if __name__ == '__main__':
+    __debug()
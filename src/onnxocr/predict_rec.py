@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 import math
+import threading
 from PIL import Image
 
 
@@ -12,10 +13,13 @@ class TextRecognizer(PredictBase):
         self.rec_image_shape = [int(v) for v in args.rec_image_shape.split(",")]
         self.rec_batch_num = args.rec_batch_num
         self.rec_algorithm = args.rec_algorithm
+        # 输入宽度按固定的档位补齐 onnxruntime 可以复用相同形状的内存分配 超过最后一档时按第一档的整数倍
+        self.rec_width_buckets = sorted(int(v) for v in args.rec_width_buckets.split(","))
+        self._batch_buffer_local = threading.local()  # 每个线程各自的预分配输入 避免多线程同时识别时互相覆盖
         self.postprocess_op = CTCLabelDecode(character_dict_path=args.rec_char_dict_path, use_space_char=args.use_space_char)
 
         # 初始化模型
-        self.rec_onnx_session = self.get_onnx_session(args.rec_model_dir, args.use_gpu)
+        self.rec_onnx_session = self.get_onnx_session(args.rec_model_dir, args.use_gpu, model_key='ocr_rec', max_threads=2)
         self.rec_input_name = self.get_input_name(self.rec_onnx_session)
         self.rec_output_name = self.get_output_name(self.rec_onnx_session)
 
@@ -265,6 +269,56 @@ class TextRecognizer(PredictBase):
 
         return img
 
+    def get_bucket_width(self, wh_ratio):
+        """
+        按宽高比获取补齐后的输入宽度
+        :param wh_ratio: 图片宽高比
+        :return:
+        """
+        imgH = self.rec_image_shape[1]
+        need_w = int(math.ceil(imgH * wh_ratio))
+        for bucket_w in self.rec_width_buckets:
+            if need_w <= bucket_w:
+                return bucket_w
+        step = self.rec_width_buckets[0]
+        return int(math.ceil(need_w / step)) * step
+
+    def get_batch_buffer(self, batch_size, imgW):
+        """
+        获取预分配的输入 按宽度档位缓存 每个线程一份
+        :param batch_size: 本批数量
+        :param imgW: 输入宽度
+        :return: 形状为 (batch_size, C, H, imgW) 的连续内存
+        """
+        buffer_map = getattr(self._batch_buffer_local, 'buffer_map', None)
+        if buffer_map is None:
+            buffer_map = {}
+            self._batch_buffer_local.buffer_map = buffer_map
+        buffer = buffer_map.get(imgW)
+        if buffer is None or buffer.shape[0] < batch_size:
+            imgC, imgH = self.rec_image_shape[:2]
+            buffer = np.zeros((max(batch_size, self.rec_batch_num), imgC, imgH, imgW), dtype=np.float32)
+            buffer_map[imgW] = buffer
+        return buffer[:batch_size]
+
+    def resize_norm_img_into(self, img, dst):
+        """
+        与 resize_norm_img 的默认处理一致 但直接写入预分配的输入 右侧补0
+        :param img: 图片
+        :param dst: 形状为 (C, H, W) 的输入
+        :return:
+        """
+        imgC, imgH, imgW = dst.shape
+        assert imgC == img.shape[2]
+        h, w = img.shape[:2]
+        resized_w = min(imgW, int(math.ceil(imgH * w / float(h))))
+        resized_image = cv2.resize(img, (resized_w, imgH))
+        part = dst[:, :, 0:resized_w]
+        np.divide(resized_image.transpose((2, 0, 1)), np.float32(255), out=part, dtype=np.float32)
+        part -= 0.5
+        part /= 0.5
+        dst[:, :, resized_w:] = 0
+
     def __call__(self, img_list):
         img_num = len(img_list)
         # Calculate the aspect ratio of all text bars
@@ -274,33 +328,20 @@ class TextRecognizer(PredictBase):
         # Sorting can speed up the recognition process
         indices = np.argsort(np.array(width_list))
         rec_res = [['', 0.0]] * img_num
-        batch_num = self.rec_batch_num
-
-        for beg_img_no in range(0, img_num, batch_num):
-            end_img_no = min(img_num, beg_img_no + batch_num)
-            norm_img_batch = []
-            imgC, imgH, imgW = self.rec_image_shape[:3]
-            max_wh_ratio = imgW / imgH
-            # max_wh_ratio = 0
-            for ino in range(beg_img_no, end_img_no):
-                h, w = img_list[indices[ino]].shape[0:2]
-                wh_ratio = w * 1.0 / h
-                max_wh_ratio = max(max_wh_ratio, wh_ratio)
-            for ino in range(beg_img_no, end_img_no):
-                norm_img = self.resize_norm_img(img_list[indices[ino]],
-                                                max_wh_ratio)
-                norm_img = norm_img[np.newaxis, :]
-                norm_img_batch.append(norm_img)
-
-            norm_img_batch = np.concatenate(norm_img_batch)
-            norm_img_batch = norm_img_batch.copy()
-
-            # img = img[:, :, ::-1].transpose(2, 0, 1)
-            # img = img[:, :, ::-1]
-            # img = img.transpose(2, 0, 1)
-            # img = img.astype(np.float32)
-            # img = np.expand_dims(img, axis=0)
-            # print(img.shape)
+
+        if self.rec_algorithm in ['NRTR', 'ViTSTR', 'RFL', 'RARE']:
+            batch_list = self._get_batch_list_by_max_ratio(indices, width_list)
+        else:
+            batch_list = self._get_batch_list_by_bucket(indices, width_list)
+
+        for batch_indices, imgW in batch_list:
+            if imgW is None:
+                norm_img_batch = self._get_norm_img_batch_by_max_ratio(img_list, batch_indices, width_list)
+            else:
+                norm_img_batch = self.get_batch_buffer(len(batch_indices), imgW)
+                for i, idx in enumerate(batch_indices):
+                    self.resize_norm_img_into(img_list[idx], norm_img_batch[i])
+
             input_feed = self.get_input_feed(self.rec_input_name, norm_img_batch)
             outputs = self.rec_onnx_session.run(self.rec_output_name, input_feed=input_feed)
 
@@ -308,6 +349,108 @@ class TextRecognizer(PredictBase):
 
             rec_result = self.postprocess_op(preds)
             for rno in range(len(rec_result)):
-                rec_res[indices[beg_img_no + rno]] = rec_result[rno]
+                rec_res[batch_indices[rno]] = rec_result[rno]
 
         return rec_res
+
+    def _get_batch_list_by_bucket(self, indices, width_list):
+        """
+        按宽高比排序后 相同宽度档位的连续图片分为一批 每批最多 rec_batch_num 张
+        :param indices: 按宽高比排序后的下标
+        :param width_list: 宽高比
+        :return: [(本批图片下标, 输入宽度)]
+        """
+        batch_list = []
+        batch_indices = []
+        batch_w = None
+        for idx in indices:
+            imgW = self.get_bucket_width(width_list[idx])
+            if len(batch_indices) > 0 and (imgW != batch_w or len(batch_indices) >= self.rec_batch_num):
+                batch_list.append((batch_indices, batch_w))
+                batch_indices = []
+            batch_indices.append(int(idx))
+            batch_w = imgW
+        if len(batch_indices) > 0:
+            batch_list.append((batch_indices, batch_w))
+        return batch_list
+
+    def _get_batch_list_by_max_ratio(self, indices, width_list):
+        """
+        原来的分批方式 按宽高比排序后 每 rec_batch_num 张一批 宽度在 resize_norm_img 中按本批最大宽高比计算
+        :return: [(本批图片下标, None)]
+        """
+        return [([int(idx) for idx in indices[beg:beg + self.rec_batch_num]], None)
+                for beg in range(0, len(indices), self.rec_batch_num)]
+
+    def _get_norm_img_batch_by_max_ratio(self, img_list, batch_indices, width_list):
+        imgC, imgH, imgW = self.rec_image_shape[:3]
+        max_wh_ratio = imgW / imgH
+        for idx in batch_indices:
+            max_wh_ratio = max(max_wh_ratio, width_list[idx])
+        norm_img_batch = []
+        for idx in batch_indices:
+            norm_img = self.resize_norm_img(img_list[idx], max_wh_ratio)
+            norm_img_batch.append(norm_img[np.newaxis, :])
+        return np.concatenate(norm_img_batch)
+
+
+def __debug():
+    """
+    没有识别模型时 只对比输入的预处理
+    - 同一宽度时 直接写入预分配输入 与 resize_norm_img 结果一致
+    - 一屏40个文本框 原来按最宽补齐+拼接+复制 与 按宽度档位写入预分配输入 的耗时
+    """
+    import time
+    recognizer = TextRecognizer.__new__(TextRecognizer)
+    recognizer.rec_image_shape = [3, 48, 320]
+    recognizer.rec_batch_num = 6
+    recognizer.rec_algorithm = 'SVTR_LCNet'
+    recognizer.rec_width_buckets = [320, 480, 640, 800, 960, 1280]
+    recognizer._batch_buffer_local = threading.local()
+
+    rng = np.random.default_rng(0)
+    img_list = []
+    for _ in range(40):
+        h = int(rng.integers(20, 60))
+        w = int(h * rng.uniform(1, 20))
+        img_list.append(rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8))
+    width_list = [img.shape[1] / float(img.shape[0]) for img in img_list]
+    indices = np.argsort(np.array(width_list))
+
+    max_diff = 0
+    for img in img_list:
+        wh_ratio = img.shape[1] / float(img.shape[0])
+        imgW = recognizer.get_bucket_width(wh_ratio)
+        old = recognizer.resize_norm_img(img, imgW / 48)
+        new = recognizer.get_batch_buffer(1, imgW)[0]
+        recognizer.resize_norm_img_into(img, new)
+        max_diff = max(max_diff, float(np.abs(old - new).max()))
+    print('单张最大差异 %f' % max_diff)
+
+    run_times = 100
+    t = time.perf_counter()
+    old_pixels = 0
+    for _ in range(run_times):
+        for batch_indices, _ in recognizer._get_batch_list_by_max_ratio(indices, width_list):
+            batch = recognizer._get_norm_img_batch_by_max_ratio(img_list, batch_indices, width_list).copy()
+            old_pixels += batch.size
+    old_cost = time.perf_counter() - t
+
+    t = time.perf_counter()
+    new_pixels = 0
+    shape_set = set()
+    for _ in range(run_times):
+        for batch_indices, imgW in recognizer._get_batch_list_by_bucket(indices, width_list):
+            batch = recognizer.get_batch_buffer(len(batch_indices), imgW)
+            for i, idx in enumerate(batch_indices):
+                recognizer.resize_norm_img_into(img_list[idx], batch[i])
+            new_pixels += batch.size
+            shape_set.add(batch.shape)
+    new_cost = time.perf_counter() - t
+
+    print('原来 预处理 %.3fms 输入大小 %.1fM' % (old_cost / run_times * 1000, old_pixels / run_times / 1e6))
+    print('档位 预处理 %.3fms 输入大小 %.1fM 输入形状 %d 种' % (new_cost / run_times * 1000, new_pixels / run_times / 1e6, len(shape_set)))
+
+
+if __name__ == '__main__':
+    __debug()
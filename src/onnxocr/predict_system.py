@@ -31,10 +31,72 @@ class TextSystem(object):
 
         self.crop_image_res_index += bbox_num
 
-    def __call__(self, img, cls=True):
+    def __call__(self, img, cls=True, max_candidates=None, det_size=None):
+        dt_boxes, img_crop_list = self.detect_and_crop(img, max_candidates=max_candidates, det_size=det_size)
+        if dt_boxes is None:
+            return None, None
+
+        # 方向分类
+        if self.use_angle_cls and cls:
+            img_crop_list, angle_list = self.text_classifier(img_crop_list)
+
+        # 图像识别
+        rec_res = self.text_recognizer(img_crop_list)
+
+        if self.args.save_crop_res:
+            self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list,rec_res)
+        return self.filter_rec_res(dt_boxes, rec_res)
+
+    def batch_call(self, img_list, cls=True, max_candidates=None, det_size=None):
+        """
+        多张图片分别检测 所有文本框合并成一批进行识别
+        识别模型按 rec_batch_num 分批 多张小图只需要一次识别
+        :param img_list: 图片列表
+        :param cls: 是否使用方向分类
+        :param max_candidates: 检测时每张图片最多检查的轮廓数量 None时使用默认值
+        :param det_size: 检测时每张图片长边的上限 None时使用默认值
+        :return: 每张图片的 (dt_boxes, rec_res)
+        """
+        box_list = []
+        all_crop_list = []
+        crop_cnt_list = []
+        for img in img_list:
+            dt_boxes, img_crop_list = self.detect_and_crop(img, max_candidates=max_candidates, det_size=det_size)
+            box_list.append(dt_boxes)
+            if dt_boxes is None:
+                crop_cnt_list.append(0)
+                continue
+            all_crop_list.extend(img_crop_list)
+            crop_cnt_list.append(len(img_crop_list))
+
+        if self.use_angle_cls and cls and len(all_crop_list) > 0:
+            all_crop_list, angle_list = self.text_classifier(all_crop_list)
+
+        all_rec_res = self.text_recognizer(all_crop_list) if len(all_crop_list) > 0 else []
+
+        result_list = []
+        start_idx = 0
+        for dt_boxes, crop_cnt in zip(box_list, crop_cnt_list):
+            if dt_boxes is None:
+                result_list.append((None, None))
+                continue
+            rec_res = all_rec_res[start_idx:start_idx + crop_cnt]
+            start_idx += crop_cnt
+            result_list.append(self.filter_rec_res(dt_boxes, rec_res))
+
+        return result_list
+
+    def detect_and_crop(self, img, max_candidates=None, det_size=None):
+        """
+        文字检测 并按检测框裁剪出文本图片
+        :param img: 图片
+        :param max_candidates: 最多检查的轮廓数量 None时使用默认值
+        :param det_size: 检测时长边的上限 None时使用默认值
+        :return: 排序后的检测框 裁剪的图片
+        """
         ori_im = img.copy()
         # 文字检测
-        dt_boxes = self.text_detector(img)
+        dt_boxes = self.text_detector(img, max_candidates=max_candidates, det_size=det_size)
 
         if dt_boxes is None:
             return None, None
@@ -52,15 +114,15 @@ class TextSystem(object):
                 img_crop = get_minarea_rect_crop(ori_im, tmp_box)
             img_crop_list.append(img_crop)
 
-        # 方向分类
-        if self.use_angle_cls and cls:
-            img_crop_list, angle_list = self.text_classifier(img_crop_list)
-
-        # 图像识别
-        rec_res = self.text_recognizer(img_crop_list)
+        return dt_boxes, img_crop_list
 
-        if self.args.save_crop_res:
-            self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list,rec_res)
+    def filter_rec_res(self, dt_boxes, rec_res):
+        """
+        过滤低于 drop_score 的识别结果
+        :param dt_boxes: 检测框
+        :param rec_res: 识别结果
+        :return:
+        """
         filter_boxes, filter_rec_res = [], []
         for box, rec_result in zip(dt_boxes, rec_res):
             text, score = rec_result
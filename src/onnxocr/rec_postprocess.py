@@ -54,8 +54,53 @@ class BaseRecLabelDecode(object):
     def add_special_char(self, dict_character):
         return dict_character
 
+    def get_character_array(self):
+        """ character list as a numpy object array, rebuilt only when self.character is replaced """
+        if getattr(self, '_character_array_src', None) is not self.character:
+            self._character_array = np.array(self.character, dtype=object)
+            self._character_array_src = self.character
+        return self._character_array
+
     def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        """ convert text-index into text-label. """
+        """ convert text-index into text-label.
+
+        The repeat/blank collapse is computed for the whole batch at once and
+        indices are mapped through a numpy character array. Only the final
+        join and mean are done per item, so results match _decode_by_row.
+        """
+        if not isinstance(text_index, np.ndarray) or text_index.ndim != 2:
+            return self._decode_by_row(text_index, text_prob, is_remove_duplicate)
+
+        selection = np.ones(text_index.shape, dtype=bool)
+        if is_remove_duplicate:
+            selection[:, 1:] = text_index[:, 1:] != text_index[:, :-1]
+        for ignored_token in self.get_ignored_tokens():
+            selection &= text_index != ignored_token
+
+        char_array = self.get_character_array()
+        flat_char = char_array[text_index[selection]].tolist()
+        flat_prob = text_prob[selection] if text_prob is not None else None
+        ends = np.cumsum(selection.sum(axis=1)).tolist()
+
+        result_list = []
+        start = 0
+        for end in ends:
+            text = ''.join(flat_char[start:end])
+            if self.reverse:  # for arabic rec
+                text = self.pred_reverse(text)
+
+            if flat_prob is None:
+                conf = 1.0 if text_index.shape[1] > 0 else 0.0
+            elif end > start:
+                conf = np.mean(flat_prob[start:end]).tolist()
+            else:
+                conf = 0.0
+            result_list.append((text, conf))
+            start = end
+        return result_list
+
+    def _decode_by_row(self, text_index, text_prob=None, is_remove_duplicate=False):
+        """ convert text-index into text-label, one batch item at a time. """
         result_list = []
         ignored_tokens = self.get_ignored_tokens()
         batch_size = len(text_index)
@@ -103,8 +148,9 @@ class CTCLabelDecode(BaseRecLabelDecode):
             preds = preds[-1]
         # if isinstance(preds, paddle.Tensor):
         #     preds = preds.numpy()
+        # one pass over the logits, the max value is gathered at the argmax
         preds_idx = preds.argmax(axis=2)
-        preds_prob = preds.max(axis=2)
+        preds_prob = np.take_along_axis(preds, preds_idx[:, :, np.newaxis], axis=2)[:, :, 0]
         text = self.decode(preds_idx, preds_prob, is_remove_duplicate=True)
         if label is None:
             return text
@@ -916,3 +962,98 @@ class CANLabelDecode(BaseRecLabelDecode):
             return text
         label = self.decode(label)
         return text, label
+
+
+def __debug():
+    """
+    compare CTCLabelDecode with the previous decoder (separate argmax/max + _decode_by_row)
+    - synthetic logits shaped like the rec model output, 6 crops per batch, 80 time steps
+    - real logits captured from the rec model on the game text crops under assets/template,
+      when rec.onnx is found in the model dir (argv[1], default assets/models/onnx_ocr)
+    """
+    import os
+    import sys
+    import time
+    from one_dragon.utils import os_utils
+
+    models_dir = sys.argv[1] if len(sys.argv) > 1 else os_utils.get_path_under_work_dir('assets', 'models', 'onnx_ocr')
+    decoder = CTCLabelDecode(
+        character_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
+        use_space_char=True)
+    class_num = len(decoder.character)
+    rng = np.random.default_rng(0)
+
+    def fake_preds(batch_size, time_step):
+        # mostly blanks with runs of repeated characters, probabilities like a softmax output
+        preds = rng.random((batch_size, time_step, class_num), dtype=np.float32) * 1e-4
+        label = rng.integers(1, class_num, size=(batch_size, time_step))
+        label[rng.random((batch_size, time_step)) < 0.5] = 0
+        label[:, 1::2] = np.where(rng.random((batch_size, time_step // 2)) < 0.3, label[:, 0::2], label[:, 1::2])
+        np.put_along_axis(preds, label[:, :, np.newaxis], rng.uniform(0.5, 1, size=(batch_size, time_step, 1)).astype(np.float32), axis=2)
+        return preds
+
+    def compare(title, preds_list):
+        mismatch = 0
+        old_cost = 0
+        new_cost = 0
+        for preds in preds_list:
+            t = time.perf_counter()
+            old_result = decoder._decode_by_row(preds.argmax(axis=2), preds.max(axis=2), is_remove_duplicate=True)
+            old_cost += time.perf_counter() - t
+
+            t = time.perf_counter()
+            new_result = decoder(preds)
+            new_cost += time.perf_counter() - t
+
+            if old_result != new_result:
+                mismatch += 1
+
+        print('%s mismatch %d / %d' % (title, mismatch, len(preds_list)))
+        print('%s old %.3fms new %.3fms per batch' % (title, old_cost / len(preds_list) * 1000, new_cost / len(preds_list) * 1000))
+
+    fake_preds_list = []
+    for i in range(200):
+        preds = fake_preds(6 if i % 4 else 1, 80)
+        if i % 10 == 0:
+            preds[0] = 0  # all blank
+            preds[0, :, 0] = 1
+        fake_preds_list.append(preds)
+    compare('synthetic', fake_preds_list)
+
+    if not os.path.exists(os.path.join(models_dir, 'rec.onnx')):
+        print('rec.onnx not found in %s, skip real logits' % models_dir)
+        return
+
+    from onnxocr.onnx_paddleocr import ONNXPaddleOcr
+    from one_dragon.utils import cv2_utils
+    recognizer = ONNXPaddleOcr(
+        use_angle_cls=False, use_gpu=False,
+        det_model_dir=os.path.join(models_dir, 'det.onnx'),
+        rec_model_dir=os.path.join(models_dir, 'rec.onnx'),
+        cls_model_dir=os.path.join(models_dir, 'cls.onnx'),
+        rec_char_dict_path=os.path.join(models_dir, 'ppocr_keys_v1.txt'),
+    ).text_recognizer
+
+    real_preds_list = []
+    origin_postprocess = recognizer.postprocess_op
+
+    def capture_postprocess(preds, *args, **kwargs):
+        real_preds_list.append(np.array(preds))
+        return origin_postprocess(preds, *args, **kwargs)
+
+    recognizer.postprocess_op = capture_postprocess
+    img_list = []
+    for root, _, files in os.walk(os_utils.get_path_under_work_dir('assets', 'template')):
+        if 'raw.png' in files:
+            img = cv2_utils.read_image(os.path.join(root, 'raw.png'))
+            if img is not None and img.ndim == 3 and img.shape[0] >= 8 and img.shape[1] >= 8:
+                img_list.append(img)  # fed as RGB, same as OnnxOcrMatcher
+    rec_result = recognizer(img_list)
+    recognizer.postprocess_op = origin_postprocess
+    print('captured %d batches from %d template crops, %d recognized as text' % (
+        len(real_preds_list), len(img_list), len([i for i in rec_result if len(i[0]) > 0])))
+    compare('real', real_preds_list)
+
+
+if __name__ == '__main__':
+    __debug()
@@ -1,6 +1,6 @@
 import time
 
-from typing import Optional, ClassVar
+from typing import Optional, ClassVar, List, Tuple, Callable
 
 from one_dragon.base.controller.pc_button import pc_button_utils
 from one_dragon.base.operation.operation_base import OperationResult
@@ -32,6 +32,16 @@ class AutoBattleApp(ZApplication):
 
         self.auto_op: Optional[AutoBattleOperator] = None
 
+    def get_preload_template_list(self) -> List[Tuple[str, Optional[Callable[[str], bool]]]]:
+        """
+        应用需要预加载的模板
+        :return:
+        """
+        return [
+            ('battle', lambda template_id: template_id.startswith('avatar_')),
+            ('agent_state', None),
+        ]
+
     def handle_init(self) -> None:
         """
         执行前的初始化 由子类实现
@@ -74,6 +84,8 @@ class AutoBattleApp(ZApplication):
                 AutoBattleApp.EVENT_OP_LOADED,
                 self.auto_op,
             )
+            auto_battle_utils.enable_screenshot_buffer(self, self.auto_op,
+                                                       self.ctx.battle_assistant_config.screenshot_interval)
             self.auto_op.start_running_async()
 
         return result
@@ -87,8 +99,12 @@ class AutoBattleApp(ZApplication):
         """
         now = time.time()
 
-        screen = self.screenshot()
-        self.auto_op.auto_battle_context.check_battle_state(screen, now)
+        screen, lease = self.screenshot_leased()
+        try:
+            self.auto_op.auto_battle_context.check_battle_state(screen, now, lease=lease)
+        finally:
+            if lease is not None:
+                lease.release()
 
         return self.round_wait(wait_round_time=self.ctx.battle_assistant_config.screenshot_interval)
 
@@ -102,6 +118,7 @@ class AutoBattleApp(ZApplication):
 
     def after_operation_done(self, result: OperationResult):
         ZApplication.after_operation_done(self, result)
+        auto_battle_utils.disable_screenshot_buffer(self)
         if self.auto_op is not None:
             self.auto_op.dispose()
             self.auto_op = None
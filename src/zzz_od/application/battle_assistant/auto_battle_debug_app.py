@@ -91,7 +91,7 @@ class AutoBattleDebugApp(ZApplication):
         time.sleep(0.2)
         new_task = self.auto_op._normal_scene_handler.get_operations(time.time())
         if new_task is not None:
-            new_task.run_async().result()
+            new_task.run_async(self.auto_op.op_runner).result()
 
         return self.round_success()
 
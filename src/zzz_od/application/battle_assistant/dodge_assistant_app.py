@@ -3,6 +3,7 @@ import time
 from typing import Optional
 
 from one_dragon.base.controller.pc_button import pc_button_utils
+from one_dragon.base.operation.operation_base import OperationResult
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
@@ -72,6 +73,8 @@ class DodgeAssistantApp(ZApplication):
                 AutoBattleApp.EVENT_OP_LOADED,
                 self.auto_op
             )
+            auto_battle_utils.enable_screenshot_buffer(self, self.auto_op,
+                                                       self.ctx.battle_assistant_config.screenshot_interval)
             self.auto_op.start_running_async()
 
         return result
@@ -85,8 +88,12 @@ class DodgeAssistantApp(ZApplication):
         """
         now = time.time()
 
-        screen = self.screenshot()
-        self.auto_op.auto_battle_context.check_battle_state(screen, now)
+        screen, lease = self.screenshot_leased()
+        try:
+            self.auto_op.auto_battle_context.check_battle_state(screen, now, lease=lease)
+        finally:
+            if lease is not None:
+                lease.release()
 
         return self.round_wait(wait_round_time=self.ctx.battle_assistant_config.screenshot_interval)
 
@@ -97,3 +104,7 @@ class DodgeAssistantApp(ZApplication):
     def _on_resume(self, e=None):
         ZApplication._on_resume(self, e)
         auto_battle_utils.resume_running(self.auto_op)
+
+    def after_operation_done(self, result: OperationResult):
+        ZApplication.after_operation_done(self, result)
+        auto_battle_utils.disable_screenshot_buffer(self)
@@ -1,3 +1,4 @@
+import os
 import time
 
 from typing import Optional
@@ -9,8 +10,10 @@ from one_dragon.base.operation.operation_node import OperationNode
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
 from one_dragon.utils import debug_utils
 from one_dragon.utils.i18_utils import gt
+from one_dragon.utils.log_utils import log
 from zzz_od.application.zzz_application import ZApplication
 from zzz_od.auto_battle import auto_battle_utils
+from zzz_od.auto_battle.auto_battle_replay import save_replay_frame, save_replay_audio
 from zzz_od.auto_battle.auto_battle_operator import AutoBattleOperator
 from zzz_od.context.zzz_context import ZContext
 
@@ -31,6 +34,7 @@ class ScreenshotHelperApp(ZApplication):
         self.last_save_screenshot_time: float = 0  # 上次保存截图时间
 
         self.auto_op: Optional[AutoBattleOperator] = None
+        self.replay_dir: Optional[str] = None  # 录制回放的文件夹 不录制时为None
 
     def add_edges_and_nodes(self) -> None:
         """
@@ -56,9 +60,17 @@ class ScreenshotHelperApp(ZApplication):
 
         self.ctx.listen_event(ContextKeyboardEventEnum.PRESS.value, self._on_key_press)
 
+        if self.ctx.screenshot_helper_config.record_replay:
+            self.replay_dir = os.path.join(debug_utils.get_debug_dir_path(), 'replay', '%d' % int(time.time() * 1000))
+        else:
+            self.replay_dir = None
+
     def init_context(self) -> OperationRoundResult:
         auto_battle_utils.load_auto_op(self, 'dodge',
                                        self.ctx.battle_assistant_config.dodge_assistant_config)
+        if self.replay_dir is not None:  # 这里不运行自动战斗指令 录制回放时需要单独启动录音
+            self.auto_op.auto_battle_context.dodge_context.start_audio_capture()
+            self.auto_op.auto_battle_context.dodge_context.start_context()
         return self.round_success()
 
     def repeat_screenshot(self) -> OperationRoundResult:
@@ -68,6 +80,9 @@ class ScreenshotHelperApp(ZApplication):
         now = time.time()
         screen = self.screenshot()
 
+        if self.replay_dir is not None:
+            save_replay_frame(self.replay_dir, screen, now)
+
         if self.ctx.screenshot_helper_config.dodge_detect:
             if self.auto_op.auto_battle_context.dodge_context.check_dodge_flash(screen, now):
                 debug_utils.save_debug_image(screen, prefix='dodge')
@@ -110,3 +125,10 @@ class ScreenshotHelperApp(ZApplication):
         ZApplication.after_operation_done(self, result)
 
         self.ctx.controller.max_screenshot_cnt = 0
+
+        if self.replay_dir is not None and self.auto_op is not None:
+            self.auto_op.auto_battle_context.dodge_context.stop_context()
+            audio, start_time = self.auto_op.auto_battle_context.dodge_context.stop_audio_capture()
+            if audio is not None:
+                save_replay_audio(self.replay_dir, audio, start_time)
+            log.info('回放已保存 %s', self.replay_dir)
@@ -37,3 +37,11 @@ class ScreenshotHelperConfig(YamlConfig):
     @dodge_detect.setter
     def dodge_detect(self, new_value: bool) -> None:
         self.update('dodge_detect', new_value)
+
+    @property
+    def record_replay(self) -> bool:
+        return self.get('record_replay', False)
+
+    @record_replay.setter
+    def record_replay(self, new_value: bool) -> None:
+        self.update('record_replay', new_value)
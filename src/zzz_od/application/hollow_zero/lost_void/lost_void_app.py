@@ -1,4 +1,4 @@
-from typing import ClassVar
+from typing import ClassVar, List, Tuple, Optional, Callable
 
 from one_dragon.base.operation.operation import Operation
 from one_dragon.base.operation.operation_edge import node_from
@@ -31,6 +31,17 @@ class LostVoidApp(ZApplication):
 
         self.next_region_type: LostVoidRegionType = LostVoidRegionType.ENTRY # 下一个区域的类型
 
+    def get_preload_template_list(self) -> List[Tuple[str, Optional[Callable[[str], bool]]]]:
+        """
+        应用需要预加载的模板
+        :return:
+        """
+        return [
+            ('lost_void', None),
+            ('battle', lambda template_id: template_id.startswith('avatar_')),
+            ('agent_state', None),
+        ]
+
     @operation_node(name='初始化加载', is_start_node=True)
     def init_for_lost_void(self) -> OperationRoundResult:
         if self.ctx.lost_void_record.is_finished_by_day():
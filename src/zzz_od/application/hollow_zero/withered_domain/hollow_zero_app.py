@@ -1,6 +1,6 @@
 import time
 
-from typing import ClassVar
+from typing import ClassVar, List, Tuple, Optional, Callable
 
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
@@ -38,6 +38,17 @@ class HollowZeroApp(ZApplication):
         self.level: int = 1
         self.phase: int = 1
 
+    def get_preload_template_list(self) -> List[Tuple[str, Optional[Callable[[str], bool]]]]:
+        """
+        应用需要预加载的模板
+        :return:
+        """
+        return [
+            ('hollow', None),
+            ('battle', lambda template_id: template_id.startswith('avatar_')),
+            ('agent_state', None),
+        ]
+
     def handle_init(self):
         self.ctx.init_hollow_config()
         mission_name = self.ctx.hollow_zero_config.mission_name
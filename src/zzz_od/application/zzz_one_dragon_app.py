@@ -61,6 +61,7 @@ def __debug():
 
     # 异步加载OCR
     ctx.async_init_ocr()
+    ctx.async_init_template_cache()
 
     # 异步更新免费代理
     ctx.async_update_gh_proxy()
@@ -1,11 +1,13 @@
 import cv2
 import numpy as np
 from cv2.typing import MatLike
-from typing import Optional
+from typing import Optional, Union, List, Tuple, Callable
 
+from one_dragon.base.screen.screen_frame import ScreenFrame
 from one_dragon.utils import cv2_utils
+from one_dragon.utils.log_utils import log
 from zzz_od.context.zzz_context import ZContext
-from zzz_od.game_data.agent import AgentStateDef
+from zzz_od.game_data.agent import AgentStateDef, AgentStateCheckWay
 
 
 def get_template(ctx: ZContext, state_def: AgentStateDef,
@@ -31,7 +33,7 @@ def get_template(ctx: ZContext, state_def: AgentStateDef,
 
 def check_cnt_by_color_range(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -39,7 +41,7 @@ def check_cnt_by_color_range(
     """
     在指定区域内，按颜色判断连通块有多少个
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -48,8 +50,7 @@ def check_cnt_by_color_range(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return 0
-    part = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
-    to_check = cv2.bitwise_and(part, part, mask=template.mask)
+    to_check = ScreenFrame.of(screen).masked_crop(template.get_template_rect_by_point(), template.mask)
 
     mask = cv2.inRange(to_check, state_def.lower_color, state_def.upper_color)
     mask = cv2_utils.dilate(mask, 2)
@@ -69,7 +70,7 @@ def check_cnt_by_color_range(
 
 def check_exist_by_color_range(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -77,7 +78,7 @@ def check_exist_by_color_range(
     """
     在指定区域内，按颜色判断是否有出现
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -89,7 +90,7 @@ def check_exist_by_color_range(
 
 def check_length_by_background_gray(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -97,7 +98,7 @@ def check_length_by_background_gray(
     """
     在指定区域内，按背景的灰度色来反推横条的长度
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -106,11 +107,8 @@ def check_length_by_background_gray(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return 0
-    part = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
     # 模版需要保证高度是1
-    to_check = part
-
-    gray = cv2.cvtColor(to_check, cv2.COLOR_RGB2GRAY).mean(axis=0)
+    gray = ScreenFrame.of(screen).crop_gray(template.get_template_rect_by_point()).mean(axis=0)
     mask = (gray >= state_def.lower_color) & (gray <= state_def.upper_color)
     bg_mask_idx = np.where(mask)
     fg_mask_idx = np.where(~mask)
@@ -146,7 +144,7 @@ def check_length_by_background_gray(
 
 def check_length_by_foreground_gray(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -154,7 +152,7 @@ def check_length_by_foreground_gray(
     """
     在指定区域内，按背景的灰度色来反推横条的长度
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -163,9 +161,8 @@ def check_length_by_foreground_gray(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return 0
-    part = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
     # 模版需要保证高度是1
-    gray = cv2.cvtColor(part, cv2.COLOR_RGB2GRAY).mean(axis=0)
+    gray = ScreenFrame.of(screen).crop_gray(template.get_template_rect_by_point()).mean(axis=0)
     if state_def.split_color_range is not None:
         split_mask = (gray >= state_def.split_color_range[0]) & (gray <= state_def.split_color_range[1])
         gray = gray[np.where(split_mask == False)]
@@ -188,7 +185,7 @@ def check_length_by_foreground_gray(
 
 def check_length_by_foreground_color(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -196,7 +193,7 @@ def check_length_by_foreground_color(
     """
     在指定区域内，按前景色(彩色)来计算横条的长度
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -205,8 +202,7 @@ def check_length_by_foreground_color(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return 0
-    part = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
-    to_check = part
+    to_check = ScreenFrame.of(screen).crop(template.get_template_rect_by_point())
 
     mask = cv2.inRange(to_check, state_def.lower_color, state_def.upper_color)
     fg_cnt = np.sum(mask == 255)
@@ -217,7 +213,7 @@ def check_length_by_foreground_color(
 
 def check_template_not_found(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -225,7 +221,7 @@ def check_template_not_found(
     """
     在指定区域内，找不到对应模板
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -234,7 +230,7 @@ def check_template_not_found(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return False
-    to_check = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
+    to_check = ScreenFrame.of(screen).crop(template.get_template_rect_by_point())
     mrl = cv2_utils.match_template(source=to_check, template=template.raw, mask=template.mask,
                                    threshold=state_def.template_threshold)
 
@@ -243,7 +239,7 @@ def check_template_not_found(
 
 def check_template_found(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -251,7 +247,7 @@ def check_template_found(
     """
     在指定区域内，找到对应模板
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -260,7 +256,7 @@ def check_template_found(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return False
-    to_check = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
+    to_check = ScreenFrame.of(screen).crop(template.get_template_rect_by_point())
     mrl = cv2_utils.match_template(source=to_check, template=template.raw, mask=template.mask,
                                    threshold=state_def.template_threshold)
 
@@ -269,7 +265,7 @@ def check_template_found(
 
 def check_cnt_by_color_channel_max_range(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -277,7 +273,7 @@ def check_cnt_by_color_channel_max_range(
     """
     在指定区域内，按颜色通道的最大值判断连通块有多少个
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
@@ -286,11 +282,7 @@ def check_cnt_by_color_channel_max_range(
     template = get_template(ctx, state_def, total, pos)
     if template is None:
         return 0
-    part = cv2_utils.crop_image_only(screen, template.get_template_rect_by_point())
-    to_check = cv2.bitwise_and(part, part, mask=template.mask)
-
-    r, g, b = cv2.split(to_check)
-    max_channel = np.max(np.array([r, g, b]), axis=0)
+    max_channel = ScreenFrame.of(screen).masked_crop_channel_max(template.get_template_rect_by_point(), template.mask)
     mask = cv2.inRange(max_channel, state_def.lower_color, state_def.upper_color)
     mask = cv2_utils.dilate(mask, 2)
     # cv2_utils.show_image(mask, wait=0)
@@ -309,7 +301,7 @@ def check_cnt_by_color_channel_max_range(
 
 def check_exist_by_color_channel_max_range(
         ctx: ZContext,
-        screen: MatLike,
+        screen: Union[MatLike, ScreenFrame],
         state_def: AgentStateDef,
         total: Optional[int] = None,
         pos: Optional[int] = None
@@ -317,10 +309,321 @@ def check_exist_by_color_channel_max_range(
     """
     在指定区域内，按颜色通道的最大值判断是否有出现
     :param ctx: 上下文
-    :param screen: 游戏画面
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
     :param state_def: 角色状态定义
     :param total: 总角色数量
     :param pos: 角色位置 从1开始
     """
     cnt = check_cnt_by_color_channel_max_range(ctx, screen, state_def, total, pos)
     return 1 if cnt > 0 else 0
+
+
+_check_method_map: dict[AgentStateCheckWay, Callable[..., int]] = {
+    AgentStateCheckWay.COLOR_RANGE_CONNECT: check_cnt_by_color_range,
+    AgentStateCheckWay.COLOR_RANGE_EXIST: check_exist_by_color_range,
+    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH: check_length_by_background_gray,
+    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH: check_length_by_foreground_gray,
+    AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH: check_length_by_foreground_color,
+    AgentStateCheckWay.TEMPLATE_NOT_FOUND: check_template_not_found,
+    AgentStateCheckWay.TEMPLATE_FOUND: check_template_found,
+    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST: check_exist_by_color_channel_max_range,
+}
+
+_GRAY_LENGTH_WAYS = {
+    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH,
+    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH,
+}
+_CONNECT_WAYS = {
+    AgentStateCheckWay.COLOR_RANGE_CONNECT,
+    AgentStateCheckWay.COLOR_RANGE_EXIST,
+    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST,
+}
+_CONNECT_GAP = 4  # 拼接连通块区域时中间留空的列数 需要大于膨胀的范围 保证不同区域的连通块不会连在一起
+
+
+def check_agent_state(
+        ctx: ZContext,
+        screen: Union[MatLike, ScreenFrame],
+        state_def: AgentStateDef,
+        total: Optional[int] = None,
+        pos: Optional[int] = None
+) -> int:
+    """
+    按状态定义的识别方式 识别一个角色状态
+    :param ctx: 上下文
+    :param screen: 游戏画面
+    :param state_def: 角色状态定义
+    :param total: 总角色数量
+    :param pos: 角色位置 从1开始
+    :return: 状态值
+    """
+    return _check_method_map[state_def.check_way](ctx=ctx, screen=screen, state_def=state_def, total=total, pos=pos)
+
+
+def check_agent_state_in_batch(
+        ctx: ZContext,
+        screen: Union[MatLike, ScreenFrame],
+        to_check_list: List[Tuple[AgentStateDef, Optional[int], Optional[int]]]
+) -> List[int]:
+    """
+    批量识别多个角色状态 结果与逐个调用 check_agent_state 一致
+    - 灰度长度: 所有区域拼成一行 一次转灰度 一次计算前景背景的左右边界
+    - 彩色长度: 所有区域拼成一行 一次判断颜色范围
+    - 连通块: 所有区域的掩码拼成一张图 一次膨胀 一次查找连通块 再按位置分回各个区域
+    - 模板匹配: 无法合并 逐个识别
+    某一组批量识别出错时 只有这一组改为逐个识别 不影响其它组的结果
+    :param ctx: 上下文
+    :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
+    :param to_check_list: 需要识别的状态 (状态定义, 总角色数量, 角色位置)
+    :return: 各个状态的值 识别失败时为-1
+    """
+    frame = ScreenFrame.of(screen)
+    result: List[int] = [0] * len(to_check_list)
+
+    gray_list: List[Tuple[int, AgentStateDef, MatLike]] = []
+    color_list: List[Tuple[int, AgentStateDef, MatLike]] = []
+    connect_list: List[Tuple[int, AgentStateDef, MatLike]] = []
+    for idx, (state_def, total, pos) in enumerate(to_check_list):
+        if state_def.check_way in _GRAY_LENGTH_WAYS:
+            target_list = gray_list
+        elif state_def.check_way == AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH:
+            target_list = color_list
+        elif state_def.check_way in _CONNECT_WAYS:
+            target_list = connect_list
+        else:
+            result[idx] = _check_agent_state_safely(ctx, frame, state_def, total, pos)
+            continue
+
+        try:
+            template = get_template(ctx, state_def, total, pos)
+            if template is None:
+                continue
+            rect = template.get_template_rect_by_point()
+            if state_def.check_way == AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST:
+                part = frame.masked_crop_channel_max(rect, template.mask)
+            elif state_def.check_way in _CONNECT_WAYS:
+                part = frame.masked_crop(rect, template.mask)
+            else:
+                part = frame.crop(rect)
+        except Exception:
+            log.error('识别角色状态失败 %s', state_def.state_name, exc_info=True)
+            result[idx] = -1
+            continue
+        target_list.append((idx, state_def, part))
+
+    for item_list, batch_method in [
+        (gray_list, _check_gray_length_in_batch),
+        (color_list, _check_color_length_in_batch),
+        (connect_list, _check_connect_cnt_in_batch),
+    ]:
+        if len(item_list) == 0:
+            continue
+        try:
+            batch_method(item_list, result)
+        except Exception:
+            log.error('批量识别角色状态失败 改为逐个识别', exc_info=True)
+            for idx, _, _ in item_list:
+                state_def, total, pos = to_check_list[idx]
+                result[idx] = _check_agent_state_safely(ctx, frame, state_def, total, pos)
+
+    return result
+
+
+def _check_agent_state_safely(
+        ctx: ZContext,
+        frame: ScreenFrame,
+        state_def: AgentStateDef,
+        total: Optional[int] = None,
+        pos: Optional[int] = None
+) -> int:
+    """
+    逐个识别一个角色状态 出错时只影响这一个状态
+    :param ctx: 上下文
+    :param frame: 游戏画面
+    :param state_def: 角色状态定义
+    :param total: 总角色数量
+    :param pos: 角色位置 从1开始
+    :return: 状态值 识别失败时为-1
+    """
+    try:
+        return check_agent_state(ctx, frame, state_def, total, pos)
+    except Exception:
+        log.error('识别角色状态失败 %s', state_def.state_name, exc_info=True)
+        return -1
+
+
+def _concat_by_height(item_list: List[Tuple[int, AgentStateDef, MatLike]]
+                      ) -> List[Tuple[List[Tuple[int, AgentStateDef, MatLike]], MatLike, np.ndarray]]:
+    """
+    按高度分组 同一组的区域横向拼接
+    :param item_list: 需要识别的区域
+    :return: 每组的 (区域列表, 拼接后的图片, 每个区域的开始列)
+    """
+    height_map: dict[int, List[Tuple[int, AgentStateDef, MatLike]]] = {}
+    for item in item_list:
+        height_map.setdefault(item[2].shape[0], []).append(item)
+
+    group_list = []
+    for group in height_map.values():
+        width_arr = np.array([item[2].shape[1] for item in group], dtype=np.intp)
+        start_arr = np.concatenate(([0], np.cumsum(width_arr)[:-1]))
+        group_list.append((group, np.concatenate([item[2] for item in group], axis=1), start_arr))
+    return group_list
+
+
+def _check_gray_length_in_batch(item_list: List[Tuple[int, AgentStateDef, MatLike]], result: List[int]) -> None:
+    """
+    批量按灰度计算横条长度
+    每列的灰度、前景判断、分割判断 以及每个区域内的左右边界 都在拼接后的一行上计算
+    :param item_list: 需要识别的区域 裁剪后的彩色图
+    :param result: 写入结果
+    :return:
+    """
+    for group, concat, start_arr in _concat_by_height(item_list):
+        width_arr = np.array([item[2].shape[1] for item in group], dtype=np.intp)
+        gray = cv2.cvtColor(concat, cv2.COLOR_RGB2GRAY).mean(axis=0)
+        n = len(gray)
+
+        lower = np.repeat([item[1].lower_color for item in group], width_arr)
+        upper = np.repeat([item[1].upper_color for item in group], width_arr)
+        split_lower = np.repeat([np.inf if item[1].split_color_range is None else item[1].split_color_range[0]
+                                 for item in group], width_arr)
+        split_upper = np.repeat([-np.inf if item[1].split_color_range is None else item[1].split_color_range[1]
+                                 for item in group], width_arr)
+        is_background = np.repeat([item[1].check_way == AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH
+                                   for item in group], width_arr)
+
+        in_range = (gray >= lower) & (gray <= upper)
+        # 前景灰度时去掉分割的列 剩下的列重新编号
+        keep = is_background | ~((gray >= split_lower) & (gray <= split_upper))
+        keep_cnt = np.add.reduceat(keep, start_arr)
+        keep_rank = np.cumsum(keep) - 1
+        keep_rank -= np.repeat(keep_rank[start_arr] + (~keep[start_arr]).astype(np.intp), width_arr)
+        col_idx = np.arange(n) - np.repeat(start_arr, width_arr)
+
+        fg = in_range & keep
+        fg_idx = np.where(is_background, col_idx, keep_rank)
+        fg_left = np.minimum.reduceat(np.where(fg, fg_idx, n), start_arr)
+        fg_right = np.maximum.reduceat(np.where(fg, fg_idx, -1), start_arr)
+        # 背景灰度时 in_range 为背景 其余为前景
+        lg = is_background & ~in_range
+        lg_left = np.minimum.reduceat(np.where(lg, col_idx, n), start_arr)
+        lg_right = np.maximum.reduceat(np.where(lg, col_idx, -1), start_arr)
+
+        for i, (idx, state_def, _) in enumerate(group):
+            if state_def.check_way == AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH:
+                total_cnt = int(width_arr[i])
+                bg_left, bg_right = int(fg_left[i]), int(fg_right[i])
+                if bg_right >= 0 and (lg_right[i] < 0 or bg_left < lg_left[i]):  # 用背景色来判断长度
+                    fg_cnt = total_cnt - min(bg_right - bg_left + 1, total_cnt)
+                elif lg_right[i] >= 0:  # 用前景色来判断长度
+                    fg_cnt = min(int(lg_right[i] - lg_left[i]) + 1, total_cnt)
+                else:
+                    fg_cnt = 0
+                result[idx] = int(fg_cnt * 100.0 / total_cnt)
+            else:
+                total_cnt = int(keep_cnt[i])
+                if total_cnt == 0:
+                    result[idx] = -1
+                    continue
+                fg_cnt = int(fg_right[i] - fg_left[i]) + 1 if fg_right[i] >= 0 else 0
+                result[idx] = int(min(fg_cnt, total_cnt) * state_def.max_length / total_cnt)
+
+
+def _check_color_length_in_batch(item_list: List[Tuple[int, AgentStateDef, MatLike]], result: List[int]) -> None:
+    """
+    批量按前景色计算横条长度
+    :param item_list: 需要识别的区域 裁剪后的彩色图
+    :param result: 写入结果
+    :return:
+    """
+    for group, concat, start_arr in _concat_by_height(item_list):
+        width_arr = np.array([item[2].shape[1] for item in group], dtype=np.intp)
+        lower = np.repeat(np.array([item[1].lower_color for item in group]), width_arr, axis=0)
+        upper = np.repeat(np.array([item[1].upper_color for item in group]), width_arr, axis=0)
+        in_range = np.all((concat >= lower) & (concat <= upper), axis=2)
+        fg_cnt = np.add.reduceat(np.count_nonzero(in_range, axis=0), start_arr)
+        for i, (idx, _, _) in enumerate(group):
+            result[idx] = int(fg_cnt[i] * 100.0 / width_arr[i])
+
+
+def _check_connect_cnt_in_batch(item_list: List[Tuple[int, AgentStateDef, MatLike]], result: List[int]) -> None:
+    """
+    批量按颜色统计连通块数量
+    各区域的颜色掩码拼到一张图上 区域之间留空 一次膨胀 一次查找连通块
+    膨胀后再去掉各区域以外的部分 与单独膨胀时超出区域的部分被裁掉一致
+    :param item_list: 需要识别的区域 掩码后的彩色图或者通道最大值
+    :param result: 写入结果
+    :return:
+    """
+    if len(item_list) == 0:
+        return
+
+    height = max(item[2].shape[0] for item in item_list)
+    start_list: List[int] = []
+    width = 0
+    for item in item_list:
+        start_list.append(width)
+        width += item[2].shape[1] + _CONNECT_GAP
+
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    valid = np.zeros((height, width), dtype=np.uint8)
+    for (_, state_def, part), start in zip(item_list, start_list):
+        h, w = part.shape[0], part.shape[1]
+        canvas[:h, start:start + w] = cv2.inRange(part, state_def.lower_color, state_def.upper_color)
+        valid[:h, start:start + w] = 255
+
+    canvas = cv2.bitwise_and(cv2_utils.dilate(canvas, 2), valid)
+    num_labels, _, stats, _ = cv2.connectedComponentsWithStats(canvas, connectivity=8)
+
+    label_item_idx = np.searchsorted(start_list, stats[1:, cv2.CC_STAT_LEFT], side='right') - 1
+    label_area = stats[1:, cv2.CC_STAT_AREA]
+    for i, (idx, state_def, _) in enumerate(item_list):
+        count = int(np.count_nonzero((label_item_idx == i) & (label_area >= state_def.connect_cnt)))
+        if state_def.check_way == AgentStateCheckWay.COLOR_RANGE_CONNECT:
+            result[idx] = count
+        else:
+            result[idx] = 1 if count > 0 else 0
+
+
+def __debug():
+    """
+    对比逐个识别和批量识别的结果与耗时
+    """
+    import time
+    from zzz_od.game_data.agent import AgentEnum, CommonAgentStateEnum
+    ctx = ZContext()
+    ctx.init_by_config()
+
+    to_check_list: List[Tuple[AgentStateDef, Optional[int], Optional[int]]] = [
+        (state_enum.value, None, None) for state_enum in CommonAgentStateEnum if state_enum.name[-2] == '3'
+    ]
+    for agent_enum in AgentEnum:
+        for state_def in (agent_enum.value.state_list or []):
+            for pos in range(1, 4):
+                to_check_list.append((state_def, 3, pos))
+    to_check_list = [i for i in to_check_list if get_template(ctx, *i) is not None]
+
+    rng = np.random.default_rng(0)
+    run_times = 200
+    diff_cnt = 0
+    single_cost = 0
+    batch_cost = 0
+    for _ in range(run_times):
+        screen = rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8)
+        start_time = time.perf_counter()
+        single_result = [int(check_agent_state(ctx, ScreenFrame(screen), *i)) for i in to_check_list]
+        single_cost += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        batch_result = check_agent_state_in_batch(ctx, ScreenFrame(screen), to_check_list)
+        batch_cost += time.perf_counter() - start_time
+        if single_result != batch_result:
+            diff_cnt += 1
+
+    print('状态数 %d 结果不一致 %d 逐个 %.3fms 批量 %.3fms' % (
+        len(to_check_list), diff_cnt, single_cost / run_times * 1000, batch_cost / run_times * 1000))
+
+
+if __name__ == '__main__':
+    __debug()
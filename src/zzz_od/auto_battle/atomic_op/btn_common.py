@@ -1,9 +1,8 @@
-import time
-
 import threading
 from enum import Enum
 from typing import Callable
 
+from one_dragon.base.conditional_operation import operation_runner
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 from zzz_od.auto_battle.auto_battle_context import AutoBattleContext
@@ -95,13 +94,13 @@ class AtomicBtnCommon(AtomicOp):
                 break
 
             if self._status == BtnRunStatus.RUNNING and self.pre_delay > 0:
-                time.sleep(self.pre_delay)
+                operation_runner.sleep(self.pre_delay)
 
             if self._status == BtnRunStatus.RUNNING:
                 self._method(press=self.is_press, press_time=self.press_time, release=self.is_release)
 
             if self._status == BtnRunStatus.RUNNING and self.post_delay > 0:
-                time.sleep(self.post_delay)
+                operation_runner.sleep(self.post_delay)
 
         with self._update_lock:
             self._status = BtnRunStatus.WAIT
@@ -1,8 +1,7 @@
-import time
-
 import threading
 from typing import ClassVar
 
+from one_dragon.base.conditional_operation import operation_runner
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 from zzz_od.auto_battle.atomic_op.btn_common import BtnRunStatus
@@ -31,13 +30,13 @@ class AtomicBtnQuickAssist(AtomicOp):
             self._status = BtnRunStatus.RUNNING
 
         if self._status == BtnRunStatus.RUNNING and self.pre_delay > 0:
-            time.sleep(self.pre_delay)
+            operation_runner.sleep(self.pre_delay)
 
         if self._status == BtnRunStatus.RUNNING:
             self.ctx.quick_assist()
 
         if self._status == BtnRunStatus.RUNNING and self.post_delay > 0:
-            time.sleep(self.post_delay)
+            operation_runner.sleep(self.post_delay)
 
         with self._update_lock:
             self._status = BtnRunStatus.WAIT
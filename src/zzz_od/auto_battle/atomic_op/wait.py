@@ -1,7 +1,6 @@
-import time
-
 from typing import ClassVar
 
+from one_dragon.base.conditional_operation import operation_runner
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 
@@ -19,4 +18,4 @@ class AtomicWait(AtomicOp):
         self.wait_seconds: float = wait_seconds
 
     def execute(self):
-        time.sleep(self.wait_seconds)
+        operation_runner.sleep(self.wait_seconds)
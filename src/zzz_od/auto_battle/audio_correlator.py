@@ -0,0 +1,278 @@
+import threading
+import time
+
+import numpy as np
+from scipy import fft
+from scipy.signal import butter, sosfilt
+from typing import Optional
+
+
+class StreamingAudioCorrelator:
+
+    def __init__(self, sample_rate: int, chunk_size: int, window_size: int,
+                 filter_degree: int = 4, cut_off: int = 1000):
+        """
+        流式计算最近一段音频与模板的最大相关性
+        与原来每次识别时 对整段音频做 filtfilt + 标准化 + 互相关 的结果对应 但计算分摊到每个音频块上
+        - 滤波: 高通滤波器串联两次 跨块保持滤波状态 与 filtfilt 的幅频响应一致
+        - 互相关: 预先计算模板的频谱 每个新的音频块只和模板做一次FFT互相关(overlap-save) 累加到按对齐位置保存的环形数组里 离开窗口的块再减去
+        - 标准化: 按块保存和与平方和 窗口内的标准差不需要重新遍历
+        每个块处理完就得到当前窗口的相关性 识别时直接读取
+        :param sample_rate: 采样率
+        :param chunk_size: 每个音频块的采样数
+        :param window_size: 窗口的采样数 需要是 chunk_size 的整数倍
+        :param filter_degree: 高通滤波的阶数
+        :param cut_off: 高通滤波的截止频率
+        """
+        self.sample_rate: int = sample_rate
+        self.chunk_size: int = chunk_size
+        self.window_chunk_cnt: int = max(1, window_size // chunk_size)
+        self.window_size: int = self.window_chunk_cnt * chunk_size
+
+        sos = butter(filter_degree, cut_off, btype='highpass', output='sos', fs=sample_rate)
+        self._sos: np.ndarray = np.vstack([sos, sos])  # 串联两次 幅频响应与 filtfilt 一致
+        self._zi: np.ndarray = np.zeros((self._sos.shape[0], 2), dtype=np.float64)
+
+        self._lock = threading.Lock()
+        self._pending: np.ndarray = np.empty(0, dtype=np.float64)  # 不足一个块的已滤波数据
+
+        self._template_len: int = 0
+        self._template_std: float = 0
+        self._template_spectrum: Optional[np.ndarray] = None
+        self._fft_size: int = 0
+
+        self._acc: Optional[np.ndarray] = None  # 下标为 对齐位置 % 长度 的互相关累加值
+        self._contrib_ring: Optional[np.ndarray] = None  # 窗口内每个块对互相关的贡献 离开窗口时减去
+        self._chunk_sum: np.ndarray = np.zeros(self.window_chunk_cnt, dtype=np.float64)
+        self._chunk_sq_sum: np.ndarray = np.zeros(self.window_chunk_cnt, dtype=np.float64)
+        self._chunk_idx: int = 0  # 已经处理的块数量
+
+        self.latest_corr: float = 0  # 当前窗口与模板的最大相关性
+
+    def set_template(self, template: np.ndarray) -> None:
+        """
+        设置模板 使用与音频流相同的滤波
+        :param template: 未滤波的模板音频
+        :return:
+        """
+        template, _ = sosfilt(self._sos, np.asarray(template, dtype=np.float64),
+                              zi=np.zeros((self._sos.shape[0], 2), dtype=np.float64))
+        with self._lock:
+            self._template_len = len(template)
+            std = float(np.std(template))
+            self._template_std = std if std > 0 else 1
+            self._fft_size = fft.next_fast_len(self._template_len + self.chunk_size - 1, real=True)
+            self._template_spectrum = fft.rfft(template, self._fft_size)
+
+            contrib_len = self._template_len + self.chunk_size - 1
+            self._acc = np.zeros(self._template_len + self.window_size + 2 * self.chunk_size, dtype=np.float64)
+            self._contrib_ring = np.zeros((self.window_chunk_cnt, contrib_len), dtype=np.float64)
+            self._reset()
+
+    @property
+    def has_template(self) -> bool:
+        return self._template_spectrum is not None
+
+    def feed(self, data: np.ndarray) -> None:
+        """
+        输入新的音频数据 每凑满一个块就更新一次相关性
+        :param data: 单声道音频
+        :return:
+        """
+        with self._lock:
+            filtered, self._zi = sosfilt(self._sos, np.asarray(data, dtype=np.float64), zi=self._zi)
+            if len(self._pending) > 0:
+                filtered = np.concatenate((self._pending, filtered))
+
+            start = 0
+            while start + self.chunk_size <= len(filtered):
+                self._on_chunk(filtered[start:start + self.chunk_size])
+                start += self.chunk_size
+            self._pending = filtered[start:]
+
+    def _on_chunk(self, chunk: np.ndarray) -> None:
+        """
+        处理一个滤波后的音频块
+        对齐位置 A 表示模板第0个采样对应音频流的第A个采样 块的开始位置为a时
+        块对 A 的贡献为 sum_k chunk[k] * template[a + k - A] 即 偏移 o = a - A 的互相关 o 的范围是 [-(chunk-1), template-1]
+        :param chunk: 音频块
+        :return:
+        """
+        ring_slot = self._chunk_idx % self.window_chunk_cnt
+        self._chunk_sum[ring_slot] = chunk.sum()
+        self._chunk_sq_sum[ring_slot] = np.dot(chunk, chunk)
+
+        if self._template_spectrum is None:
+            self._chunk_idx += 1
+            return
+
+        m = self._template_len
+        c = self.chunk_size
+        r = fft.irfft(self._template_spectrum * np.conj(fft.rfft(chunk, self._fft_size)), self._fft_size)
+        # 按对齐位置从小到大排列 即偏移从 m-1 到 -(c-1)
+        contrib = np.concatenate((r[m - 1::-1], r[self._fft_size - 1:self._fft_size - c:-1]))
+
+        chunk_start = self._chunk_idx * c
+        acc_len = len(self._acc)
+        # 新出现的对齐位置 之前保存的是很久以前的值 先清空
+        self._acc_slice_op(chunk_start, c, None)
+        # 移出窗口的块 减去它的贡献
+        self._acc_slice_op(chunk_start - self.window_size - m + 1, len(contrib), -self._contrib_ring[ring_slot])
+        self._acc_slice_op(chunk_start - m + 1, len(contrib), contrib)
+        self._contrib_ring[ring_slot] = contrib
+        self._chunk_idx += 1
+
+        # 与 correlate(mode='same') 一致 取全部对齐位置中间的部分
+        window_start = chunk_start + c - self.window_size
+        n = self.window_size
+        out_len = max(m, n)
+        query_start = window_start - m + 1 + (min(m, n) - 1) // 2
+        start = query_start % acc_len
+        if start + out_len <= acc_len:
+            max_acc = self._acc[start:start + out_len].max()
+        else:
+            max_acc = max(self._acc[start:].max(), self._acc[:start + out_len - acc_len].max())
+
+        total = self._chunk_sum.sum()
+        sq_total = self._chunk_sq_sum.sum()
+        var = sq_total / n - (total / n) ** 2
+        std = float(np.sqrt(var)) if var > 0 else 1
+        self.latest_corr = float(max_acc / (std * self._template_std * out_len))
+
+    def _acc_slice_op(self, pos: int, length: int, value: Optional[np.ndarray]) -> None:
+        """
+        对环形数组中 对齐位置 [pos, pos+length) 的部分 累加value value为None时清零
+        :param pos: 开始的对齐位置
+        :param length: 长度
+        :param value: 累加的值
+        :return:
+        """
+        acc_len = len(self._acc)
+        start = pos % acc_len
+        first_len = min(length, acc_len - start)
+        if value is None:
+            self._acc[start:start + first_len] = 0
+            self._acc[:length - first_len] = 0
+        else:
+            self._acc[start:start + first_len] += value[:first_len]
+            self._acc[:length - first_len] += value[first_len:]
+
+    def clear(self) -> None:
+        """
+        清空当前窗口 与原来把录音清零一致
+        :return:
+        """
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self._zi[:] = 0
+        self._pending = np.empty(0, dtype=np.float64)
+        self._chunk_sum[:] = 0
+        self._chunk_sq_sum[:] = 0
+        self._chunk_idx = 0
+        if self._acc is not None:
+            self._acc[:] = 0
+            self._contrib_ring[:] = 0
+        self.latest_corr = 0
+
+
+def _get_max_corr_by_full_window(template: np.ndarray, audio: np.ndarray, filter_degree: int = 4,
+                                cut_off: int = 1000, sample_rate: int = 32000) -> float:
+    """
+    原来的计算方式 对整段音频滤波 标准化后计算互相关 用于对比
+    :param template: 已经滤波的模板
+    :param audio: 未滤波的音频
+    :param filter_degree: 高通滤波的阶数
+    :param cut_off: 高通滤波的截止频率
+    :param sample_rate: 采样率
+    :return:
+    """
+    from scipy.signal import correlate, filtfilt
+    from sklearn.preprocessing import scale
+    b, a = butter(filter_degree, cut_off, btype='highpass', output='ba', fs=sample_rate)
+    y = filtfilt(b, a, audio)
+    wx = scale(template, with_mean=False)
+    wy = scale(y, with_mean=False)
+    if wx.shape[0] > wy.shape[0]:
+        correlation = correlate(wx, wy, mode='same', method='fft') / wx.shape[0]
+    else:
+        correlation = correlate(wy, wx, mode='same', method='fft') / wy.shape[0]
+    return float(np.max(correlation))
+
+
+def __debug():
+    """
+    模拟音频流 在噪音中间插入模板 对比原来每次识别整段计算 和流式计算的相关性与耗时
+    录音每次 0.01s 识别间隔 0.02s 流式计算的耗时包括两次录音的处理
+    每次识别都对比两种计算的相关性 输出最大差值 以及按触发阈值判断结果不一致的次数
+    """
+    import librosa
+    import os
+    from scipy.signal import filtfilt
+    from one_dragon.utils import os_utils
+    sample_rate = 32000
+    record_size = 320
+    window_size = sample_rate // 2
+    trigger_threshold = 0.1  # 与 AudioRecorder.trigger_threshold 一致
+
+    raw_template, _ = librosa.load(os.path.join(
+        os_utils.get_path_under_work_dir('assets', 'template', 'dodge_audio'),
+        'template_1.wav'
+    ), sr=sample_rate)
+    b, a = butter(4, 1000, btype='highpass', output='ba', fs=sample_rate)
+    filtered_template = filtfilt(b, a, raw_template)
+
+    for noise_std in [0.02, 0.1, 0.3]:
+        correlator = StreamingAudioCorrelator(sample_rate, record_size * 2, window_size)
+        correlator.set_template(raw_template)
+
+        rng = np.random.default_rng(0)
+        stream = rng.normal(0, noise_std, size=sample_rate * 4)
+        insert_pos = sample_rate * 2
+        stream[insert_pos:insert_pos + len(raw_template)] += raw_template
+
+        window = np.zeros(window_size)
+        old_cost = 0
+        new_cost = 0
+        old_max = 0
+        new_max = 0
+        max_diff = 0
+        max_diff_time = 0
+        trigger_diff_cnt = 0
+        check_cnt = 0
+        for start in range(0, len(stream), record_size):
+            chunk = stream[start:start + record_size]
+            window[:-len(chunk)] = window[len(chunk):]
+            window[-len(chunk):] = chunk
+
+            t = time.perf_counter()
+            correlator.feed(chunk)
+            new_cost += time.perf_counter() - t
+
+            if (start // record_size) % 2 == 1:
+                t = time.perf_counter()
+                old_corr = _get_max_corr_by_full_window(filtered_template, window)
+                old_cost += time.perf_counter() - t
+
+                t = time.perf_counter()
+                new_corr = correlator.latest_corr
+                new_cost += time.perf_counter() - t
+
+                old_max = max(old_max, old_corr)
+                new_max = max(new_max, new_corr)
+                if abs(old_corr - new_corr) > max_diff:
+                    max_diff = abs(old_corr - new_corr)
+                    max_diff_time = (start + record_size) / sample_rate
+                if (old_corr > trigger_threshold) != (new_corr > trigger_threshold):
+                    trigger_diff_cnt += 1
+                check_cnt += 1
+
+        print('噪音标准差 %.2f 识别次数 %d' % (noise_std, check_cnt))
+        print('原来 最大相关性 %.3f 每次识别 %.3fms' % (old_max, old_cost / check_cnt * 1000))
+        print('流式 最大相关性 %.3f 每次识别(含两次录音的处理) %.3fms' % (new_max, new_cost / check_cnt * 1000))
+        print('相关性最大差值 %.4f (%.2fs) 触发结果不一致 %d 次' % (max_diff, max_diff_time, trigger_diff_cnt))
+
+
+if __name__ == '__main__':
+    __debug()
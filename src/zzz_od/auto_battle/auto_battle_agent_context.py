@@ -2,29 +2,20 @@ from concurrent.futures import ThreadPoolExecutor, Future
 
 import threading
 from cv2.typing import MatLike
-from typing import Optional, List, Union, Tuple, Callable
+from typing import Optional, List, Union, Tuple
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord, StateRecorder
 from one_dragon.base.screen.screen_area import ScreenArea
-from one_dragon.utils import cv2_utils, cal_utils
+from one_dragon.base.screen.screen_frame import ScreenFrame
+from one_dragon.utils import cal_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.agent_state import agent_state_checker
 from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
 from zzz_od.context.zzz_context import ZContext
-from zzz_od.game_data.agent import Agent, AgentEnum, AgentStateCheckWay, CommonAgentStateEnum, AgentStateDef
+from zzz_od.game_data.agent import Agent, AgentEnum, CommonAgentStateEnum, AgentStateDef
 
 _battle_agent_context_executor = ThreadPoolExecutor(thread_name_prefix='od_battle_agent_context', max_workers=16)
-_agent_state_check_method: dict[AgentStateCheckWay, Callable] = {
-    AgentStateCheckWay.COLOR_RANGE_CONNECT: agent_state_checker.check_cnt_by_color_range,
-    AgentStateCheckWay.COLOR_RANGE_EXIST: agent_state_checker.check_exist_by_color_range,
-    AgentStateCheckWay.BACKGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_background_gray,
-    AgentStateCheckWay.FOREGROUND_GRAY_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_gray,
-    AgentStateCheckWay.FOREGROUND_COLOR_RANGE_LENGTH: agent_state_checker.check_length_by_foreground_color,
-    AgentStateCheckWay.TEMPLATE_NOT_FOUND: agent_state_checker.check_template_not_found,
-    AgentStateCheckWay.TEMPLATE_FOUND: agent_state_checker.check_template_found,
-    AgentStateCheckWay.COLOR_CHANNEL_MAX_RANGE_EXIST: agent_state_checker.check_exist_by_color_channel_max_range,
-}
 
 
 class AgentInfo:
@@ -339,9 +330,11 @@ class AutoBattleAgentContext:
         else:
             return [i.agent for i in self.team_info.agent_list if i.agent is not None]
 
-    def check_agent_related(self, screen: MatLike, screenshot_time: float) -> None:
+    def check_agent_related(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float) -> None:
         """
         判断角色相关内容 并发送事件
+        :param screen: 游戏画面 传入 ScreenFrame 时复用同一帧的预处理结果
+        :param screenshot_time: 截图时间
         :return:
         """
         if not self._check_agent_lock.acquire(blocking=False):
@@ -353,8 +346,9 @@ class AutoBattleAgentContext:
                 return
             self._last_check_agent_time = screenshot_time
 
-            screen_agent_list = self._check_agent_in_parallel(screen)
-            energy_state_list, special_state_list, ultimate_state_list, other_state_list = self._check_all_agent_state(screen, screenshot_time, screen_agent_list)
+            frame = ScreenFrame.of(screen, screenshot_time)
+            screen_agent_list = self._check_agent_in_parallel(frame)
+            energy_state_list, special_state_list, ultimate_state_list, other_state_list = self._check_all_agent_state(frame, screenshot_time, screen_agent_list)
 
             update_state_record_list = []
             # 尝试更新代理人列表 成功的话 更新状态记录
@@ -378,16 +372,17 @@ class AutoBattleAgentContext:
         finally:
             self._check_agent_lock.release()
 
-    def _check_agent_in_parallel(self, screen: MatLike) -> List[Agent]:
+    def _check_agent_in_parallel(self, screen: Union[MatLike, ScreenFrame]) -> List[Agent]:
         """
         并发识别角色
         :return:
         """
+        frame = ScreenFrame.of(screen)
         area_img = [
-            cv2_utils.crop_image_only(screen, self.area_agent_3_1.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_3_2.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_3_3.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_2_2.rect)
+            frame.crop_area(self.area_agent_3_1),
+            frame.crop_area(self.area_agent_3_2),
+            frame.crop_area(self.area_agent_3_3),
+            frame.crop_area(self.area_agent_2_2),
         ]
 
         possible_agents = self.get_possible_agent_list()
@@ -439,55 +434,38 @@ class AutoBattleAgentContext:
         :return:
         """
         prefix = 'avatar_1_' if is_front else 'avatar_2_'
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', prefix + agent.template_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {prefix + agent.template_id: agent for agent in possible_agents}
+        mr = self.ctx.tm.match_best_template(img, 'battle', list(agent_map.keys()), threshold=0.8)
+        if mr is not None:
+            return agent_map[mr.data]
 
         return None
 
-    def _check_agent_state_in_parallel(self, screen: MatLike, screenshot_time: float, agent_state_list: List[CheckAgentState]) -> List[StateRecord]:
+    def _check_agent_state_in_batch(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float, agent_state_list: List[CheckAgentState]) -> List[StateRecord]:
         """
-        并行识别多个角色状态
+        批量识别多个角色状态 在当前线程内一次完成
         :param screen: 游戏画面
         :param screenshot_time: 截图时间
         :param agent_state_list: 需要识别的状态列表
         :return:
         """
-        future_list: List[Future] = []
-        for state in agent_state_list:
-            if not state.state.should_check_in_battle:
-                continue
-            future_list.append(_battle_agent_context_executor.submit(self._check_agent_state, screen, screenshot_time, state))
+        to_check_list = [i for i in agent_state_list if i.state.should_check_in_battle]
+        try:
+            value_list = agent_state_checker.check_agent_state_in_batch(
+                self.ctx, screen, [(i.state, i.total, i.pos) for i in to_check_list])
+        except Exception:
+            log.error('识别角色状态失败', exc_info=True)
+            return []
 
-        result_list: List[Optional[StateRecord]] = []
-        for future in future_list:
-            try:
-                record = future.result()
-                if record is not None:
-                    result_list.append(record)
-            except Exception:
-                log.error('识别角色状态失败', exc_info=True)
+        result_list: List[StateRecord] = []
+        for to_check, value in zip(to_check_list, value_list):
+            state = to_check.state
+            if value > -1 and value >= state.min_value_trigger_state:
+                result_list.append(StateRecord(state.state_name, screenshot_time, value))
 
         return result_list
 
-    def _check_agent_state(self, screen: MatLike, screenshot_time: float, to_check: CheckAgentState) -> Optional[StateRecord]:
-        """
-        识别一个角色状态
-        :param screen:
-        :param screenshot_time:
-        :param to_check: 需要识别的状态
-        :return:
-        """
-        value: int = -1
-        state = to_check.state
-        check_method = _agent_state_check_method[state.check_way]
-        value = check_method(ctx=self.ctx, screen=screen, state_def=state, total=to_check.total, pos=to_check.pos)
-
-        if value > -1 and value >= state.min_value_trigger_state:
-            return StateRecord(state.state_name, screenshot_time, value)
-
-    def _check_all_agent_state(self, screen: MatLike, screenshot_time: float,
+    def _check_all_agent_state(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float,
                                screen_agent_list: List[Agent]
                                ) -> Tuple[List[StateRecord], List[StateRecord], List[StateRecord], List[StateRecord]]:
         """
@@ -567,7 +545,7 @@ class AutoBattleAgentContext:
             state = CommonAgentStateEnum.LIFE_DEDUCTION_21.value
         to_check_list.append(CheckAgentState(state))
 
-        all_state_result_list = self._check_agent_state_in_parallel(screen, screenshot_time, to_check_list)
+        all_state_result_list = self._check_agent_state_in_batch(screen, screenshot_time, to_check_list)
         energy_len = len(energy_state_list)
         special_len = len(special_state_list)
         ultimate_len = len(ultimate_state_list)
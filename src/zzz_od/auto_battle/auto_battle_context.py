@@ -7,11 +7,15 @@ from typing import Optional, List, Union
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
+from one_dragon.base.controller.screenshot_buffer import ScreenshotLease
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.base.screen import screen_utils
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_frame import ScreenFrame
 from one_dragon.base.screen.screen_utils import FindAreaResultEnum
-from one_dragon.utils import cv2_utils, thread_utils, cal_utils, str_utils
+from one_dragon.thread.frame_check_scheduler import FrameCheckPool, FrameCheckScheduler, FrameCheck
+from one_dragon.utils import thread_utils, cal_utils, str_utils
+from one_dragon.utils.latency_histogram import LatencyHistogram
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.auto_battle_agent_context import AutoBattleAgentContext
 from zzz_od.auto_battle.auto_battle_custom_context import AutoBattleCustomContext
@@ -21,6 +25,16 @@ from zzz_od.context.zzz_context import ZContext
 from zzz_od.game_data.agent import Agent
 
 _battle_state_check_executor = ThreadPoolExecutor(thread_name_prefix='od_battle_state_check', max_workers=16)
+_battle_state_check_pool = FrameCheckPool(thread_name_prefix='od_battle_frame_check')
+
+# 每帧识别的名称
+_CHECK_DODGE_AUDIO = '闪避-声音'
+_CHECK_DODGE_FLASH = '闪避-闪光'
+_CHECK_AGENT = '角色状态'
+_CHECK_QUICK_ASSIST = '快速支援'
+_CHECK_CHAIN = '连携技'
+_CHECK_DISTANCE = '距离'
+_CHECK_END = '战斗结束'
 
 
 class AutoBattleContext:
@@ -53,6 +67,23 @@ class AutoBattleContext:
         self._last_check_end_time: float = 0
         self._last_check_distance_time: float = 0
 
+        # 每帧识别的调度 闪避优先 距离和战斗结束在负载过高时可以放弃 各识别的耗时统计可用于调整识别间隔
+        self.check_scheduler: FrameCheckScheduler = FrameCheckScheduler(_battle_state_check_pool)
+        self.check_scheduler.register(FrameCheck(_CHECK_DODGE_AUDIO, self.dodge_context.check_dodge_audio, priority=3))
+        self.check_scheduler.register(FrameCheck(_CHECK_DODGE_FLASH, self.dodge_context.check_dodge_flash, priority=3))
+        self.check_scheduler.register(FrameCheck(_CHECK_AGENT, self.agent_context.check_agent_related, priority=2))
+        self.check_scheduler.register(FrameCheck(_CHECK_QUICK_ASSIST, self._check_quick_assist, priority=1,
+                                                  interval_getter=lambda: self._check_quick_interval))
+        self.check_scheduler.register(FrameCheck(_CHECK_CHAIN, self._check_chain_attack_in_parallel, priority=1,
+                                                  interval_getter=lambda: self._check_chain_interval))
+        self.check_scheduler.register(FrameCheck(_CHECK_DISTANCE, self.check_battle_distance, priority=0,
+                                                  interval_getter=lambda: self._check_distance_interval,
+                                                  sheddable=True))
+        self.check_scheduler.register(FrameCheck(_CHECK_END, self._check_battle_end_result, priority=0,
+                                                  interval_getter=lambda: self._check_end_interval,
+                                                  sheddable=True))
+        self.preprocess_histogram: LatencyHistogram = LatencyHistogram()  # 每帧生成裁剪、灰度图等派生图片的总耗时
+
         # 识别结果
         self.last_check_in_battle: bool = False  # 是否在战斗画面
         self.last_check_end_result: Optional[str] = None
@@ -367,6 +398,9 @@ class AutoBattleContext:
         self._last_check_quick_time: float = 0
         self._last_check_end_time: float = 0
         self._last_check_distance_time: float = 0
+        self.check_scheduler.reset()
+        self.check_scheduler.clear_stats()
+        self.preprocess_histogram.clear()
 
         # 识别结果
         self.last_check_end_result: Optional[str] = None  # 识别战斗结束的结果
@@ -380,37 +414,41 @@ class AutoBattleContext:
             check_battle_end_hollow_result: bool = False,
             check_battle_end_defense_result: bool = False,
             check_distance: bool = False,
-            sync: bool = False
+            sync: bool = False,
+            lease: Optional[ScreenshotLease] = None
     ) -> bool:
         """
         识别战斗状态的总入口
+        :param lease: 截图在截图缓冲区中的占用 这一帧的识别全部完成前会一直占用 调用方仍需归还自己的占用
         :return: 当前是否在战斗画面
         """
-        in_battle = self.is_normal_attack_btn_available(screen)
+        # 同一帧的各个识别共用裁剪、灰度图等派生图片
+        frame = ScreenFrame(screen, screenshot_time)
+        in_battle = self.is_normal_attack_btn_available(frame)
         self.last_check_in_battle = in_battle
 
-        future_list: List[Future] = []
-
+        # 闪避最先提交 同优先级按提交顺序执行 声音识别会在画面识别前开始
+        future_list: List[Optional[Future]] = []
         if in_battle:
-            audio_future = _battle_state_check_executor.submit(self.dodge_context.check_dodge_audio, screenshot_time)
+            audio_future = self.check_scheduler.submit(_CHECK_DODGE_AUDIO, screenshot_time, screenshot_time)
             future_list.append(audio_future)
-            future_list.append(_battle_state_check_executor.submit(self.dodge_context.check_dodge_flash, screen, screenshot_time, audio_future))
-
-            agent_future = _battle_state_check_executor.submit(self.agent_context.check_agent_related, screen, screenshot_time)
-            future_list.append(agent_future)
-            future_list.append(_battle_state_check_executor.submit(self.check_quick_assist, screen, screenshot_time))
+            future_list.append(self.check_scheduler.submit(_CHECK_DODGE_FLASH, screenshot_time,
+                                                            screen, screenshot_time, audio_future))
+            future_list.append(self.check_scheduler.submit(_CHECK_AGENT, screenshot_time, frame, screenshot_time))
+            future_list.append(self.check_scheduler.submit(_CHECK_QUICK_ASSIST, screenshot_time, frame, screenshot_time))
             if check_distance:
-                future_list.append(_battle_state_check_executor.submit(self._check_distance_with_lock, screen, screenshot_time))
+                future_list.append(self.check_scheduler.submit(_CHECK_DISTANCE, screenshot_time, frame))
         else:
-            future_list.append(_battle_state_check_executor.submit(self.check_chain_attack, screen, screenshot_time))
+            future_list.append(self.check_scheduler.submit(_CHECK_CHAIN, screenshot_time, frame, screenshot_time))
             check_battle_end = check_battle_end_normal_result or check_battle_end_hollow_result or check_battle_end_defense_result
             if check_battle_end:
-                future_list.append(_battle_state_check_executor.submit(
-                    self._check_battle_end, screen, screenshot_time,
+                future_list.append(self.check_scheduler.submit(
+                    _CHECK_END, screenshot_time, screen,
                     check_battle_end_normal_result, check_battle_end_hollow_result, check_battle_end_defense_result
                 ))
-        for future in future_list:
-            future.add_done_callback(thread_utils.handle_future_result)
+
+        future_list = [future for future in future_list if future is not None]
+        self._record_frame_preprocess(frame, future_list, lease)
 
         if sync:
             for future in future_list:
@@ -418,7 +456,38 @@ class AutoBattleContext:
 
         return in_battle
 
-    def check_chain_attack(self, screen: MatLike, screenshot_time: float) -> None:
+    def _record_frame_preprocess(self, frame: ScreenFrame, future_list: List[Future],
+                                 lease: Optional[ScreenshotLease] = None) -> None:
+        """
+        这一帧的识别全部完成后 记录生成派生图片的耗时 并归还截图的占用
+        :param frame: 画面
+        :param future_list: 这一帧提交的识别
+        :param lease: 截图在截图缓冲区中的占用
+        :return:
+        """
+        if len(future_list) == 0:
+            self.preprocess_histogram.record(frame.preprocess_seconds)
+            return
+
+        if lease is not None:
+            lease.retain()
+
+        remain_lock = threading.Lock()
+        remain_cnt = [len(future_list)]
+
+        def on_done(_: Future) -> None:
+            with remain_lock:
+                remain_cnt[0] -= 1
+                all_done = remain_cnt[0] == 0
+            if all_done:
+                self.preprocess_histogram.record(frame.preprocess_seconds)
+                if lease is not None:
+                    lease.release()
+
+        for future in future_list:
+            future.add_done_callback(on_done)
+
+    def check_chain_attack(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float) -> None:
         """
         识别连携技
         """
@@ -437,12 +506,13 @@ class AutoBattleContext:
         finally:
             self._check_chain_lock.release()
 
-    def _check_chain_attack_in_parallel(self, screen: MatLike, screenshot_time: float):
+    def _check_chain_attack_in_parallel(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float):
         """
         并行识别连携技角色
         """
-        c1 = cv2_utils.crop_image_only(screen, self.area_chain_1.rect)
-        c2 = cv2_utils.crop_image_only(screen, self.area_chain_2.rect)
+        frame = ScreenFrame.of(screen)
+        c1 = frame.crop_area(self.area_chain_1)
+        c2 = frame.crop_area(self.area_chain_2)
 
         possible_agents = self.agent_context.get_possible_agent_list()
 
@@ -482,10 +552,10 @@ class AutoBattleContext:
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_chain_' + agent.template_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {'avatar_chain_' + agent.template_id: agent for agent in possible_agents}
+        mr = self.ctx.tm.match_best_template(img, 'battle', list(agent_map.keys()), threshold=0.8)
+        if mr is not None:
+            return agent_map[mr.data]
 
         return None
 
@@ -502,33 +572,39 @@ class AutoBattleContext:
                 return
             self._last_check_quick_time = screenshot_time
 
-            part = cv2_utils.crop_image_only(screen, self.area_btn_switch.rect)
-
-            possible_agents = self.agent_context.get_possible_agent_list()
-
-            agent = self._match_quick_assist_agent_in(part, possible_agents)
-
-            if agent is not None:
-                state_records: List[StateRecord] = [
-                    StateRecord(f'快速支援-{agent.agent_name}', screenshot_time),
-                    StateRecord(f'快速支援-{agent.agent_type.value}', screenshot_time),
-                    StateRecord(BattleStateEnum.STATUS_QUICK_ASSIST_READY.value, screenshot_time),
-                ]
-                self.auto_op.batch_update_states(state_records)
+            self._check_quick_assist(screen, screenshot_time)
         except Exception:
             log.error('识别快速支援失败', exc_info=True)
         finally:
             self._check_quick_lock.release()
 
+    def _check_quick_assist(self, screen: Union[MatLike, ScreenFrame], screenshot_time: float) -> None:
+        """
+        识别快速支援 不判断识别间隔
+        """
+        part = ScreenFrame.of(screen).crop_area(self.area_btn_switch)
+
+        possible_agents = self.agent_context.get_possible_agent_list()
+
+        agent = self._match_quick_assist_agent_in(part, possible_agents)
+
+        if agent is not None:
+            state_records: List[StateRecord] = [
+                StateRecord(f'快速支援-{agent.agent_name}', screenshot_time),
+                StateRecord(f'快速支援-{agent.agent_type.value}', screenshot_time),
+                StateRecord(BattleStateEnum.STATUS_QUICK_ASSIST_READY.value, screenshot_time),
+            ]
+            self.auto_op.batch_update_states(state_records)
+
     def _match_quick_assist_agent_in(self, img: MatLike, possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
         """
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_quick_' + agent.template_id, threshold=0.9)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {'avatar_quick_' + agent.template_id: agent for agent in possible_agents}
+        mr = self.ctx.tm.match_best_template(img, 'battle', list(agent_map.keys()), threshold=0.9)
+        if mr is not None:
+            return agent_map[mr.data]
 
         return None
 
@@ -545,62 +621,72 @@ class AutoBattleContext:
                 return
             self._last_check_end_time = screenshot_time
 
-            if check_battle_end_hollow_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='挑战结果')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-挑战结果'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-事件', area_name='背包')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-背包'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='鸣徽-确定')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '鸣徽-确定'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='结算周期上限-确认')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-结算周期上限'
-                    return
-
-            if check_battle_end_defense_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-退出')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-退出'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-撤退')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-撤退'
-                    return
-
-            if check_battle_end_normal_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-完成')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-完成'
-                    return
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-撤退')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-撤退'
-                    return
-
-            self.last_check_end_result = None
+            self._check_battle_end_result(screen, check_battle_end_normal_result,
+                                          check_battle_end_hollow_result, check_battle_end_defense_result)
         except Exception:
             log.error('识别战斗结束失败', exc_info=True)
         finally:
             self._check_end_lock.release()
 
+    def _check_battle_end_result(self, screen: MatLike,
+                                 check_battle_end_normal_result: bool,
+                                 check_battle_end_hollow_result: bool,
+                                 check_battle_end_defense_result: bool = False) -> None:
+        """
+        识别战斗结束 不判断识别间隔
+        """
+        if check_battle_end_hollow_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='挑战结果')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-挑战结果'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-事件', area_name='背包')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-背包'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='鸣徽-确定')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '鸣徽-确定'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='零号空洞-战斗', area_name='结算周期上限-确认')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '零号空洞-结算周期上限'
+                return
+
+        if check_battle_end_defense_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='式舆防卫战', area_name='战斗结束-退出')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '战斗结束-退出'
+                return
+
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='式舆防卫战', area_name='战斗结束-撤退')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '战斗结束-撤退'
+                return
+
+        if check_battle_end_normal_result:
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='战斗画面', area_name='战斗结果-完成')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '普通战斗-完成'
+                return
+            result = screen_utils.find_area(ctx=self.ctx, screen=screen,
+                                            screen_name='战斗画面', area_name='战斗结果-撤退')
+            if result == FindAreaResultEnum.TRUE:
+                self.last_check_end_result = '普通战斗-撤退'
+                return
+
+        self.last_check_end_result = None
+
     def _check_distance_with_lock(self, screen: MatLike, screenshot_time: float) -> None:
         if not self._check_distance_lock.acquire(blocking=False):
             return
@@ -618,7 +704,7 @@ class AutoBattleContext:
         finally:
             self._check_distance_lock.release()
 
-    def check_battle_distance(self, screen: MatLike, last_distance: Optional[float] = None) -> MatchResult:
+    def check_battle_distance(self, screen: Union[MatLike, ScreenFrame], last_distance: Optional[float] = None) -> MatchResult:
         """
         识别画面上显示的距离
         :param screen:
@@ -626,7 +712,7 @@ class AutoBattleContext:
         :return:
         """
         area = self._check_distance_area
-        part = cv2_utils.crop_image_only(screen, area.rect)
+        part = ScreenFrame.of(screen).crop_area(area)
         ocr_result_map = self.ctx.ocr.run_ocr(part)
 
         distance: Optional[float] = None
@@ -668,13 +754,13 @@ class AutoBattleContext:
 
         return mr
 
-    def is_normal_attack_btn_available(self, screen: MatLike) -> bool:
+    def is_normal_attack_btn_available(self, screen: Union[MatLike, ScreenFrame]) -> bool:
         """
         识别普通攻击按钮是否存在 用了粗略判断是否在战斗画面 2~3ms
         :param screen:
         :return:
         """
-        part = cv2_utils.crop_image_only(screen, self.area_btn_normal.rect)
+        part = ScreenFrame.of(screen).crop_area(self.area_btn_normal)
         mrl = self.ctx.tm.match_template(part, 'battle', 'btn_normal_attack',
                                          threshold=0.9)
         return mrl.max is not None
@@ -692,6 +778,8 @@ class AutoBattleContext:
         :return:
         """
         self.dodge_context.stop_context()
+        self.check_scheduler.log_stats()
+        log.info('派生图片耗时 [%s]', self.preprocess_histogram)
 
         log.info('松开所有按键')
         self.dodge(release=True)
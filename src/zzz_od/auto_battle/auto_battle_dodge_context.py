@@ -4,17 +4,17 @@ import librosa
 import numpy as np
 import os
 import threading
+import time
 from cv2.typing import MatLike
 from enum import Enum
-from scipy.signal import correlate, butter, filtfilt
-from sklearn.preprocessing import scale
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Tuple
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
 from one_dragon.utils import cal_utils, yolo_config_utils
 from one_dragon.utils import thread_utils, os_utils
 from one_dragon.utils.log_utils import log
+from zzz_od.auto_battle.audio_correlator import StreamingAudioCorrelator
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.yolo.flash_classifier import FlashClassifier
 
@@ -41,12 +41,20 @@ class AudioRecorder:
         self._filter_degree = 4  # 四阶bathworth多项式, 越大阻带区域滤波程度越大
         self._cut_off = 1000  # Hz,截止频率,对该频率一下的声音进行滤波,若需要识别人声可适当降低
 
-        self.filter_b, self.filter_a = butter(self._filter_degree, self._cut_off, btype='highpass', output='ba',
-                                              fs=self._sample_rate)  # Butterworth高通滤波
-
-        self.latest_audio = np.empty(shape=(0,), dtype=np.float64)  # 存储最新的音频数据
+        self._window_size = int(self._sample_rate // 2)  # 保留最近0.5秒的音频
+        self._audio_ring = np.zeros(self._window_size, dtype=np.float64)  # 最新音频的环形缓冲区
+        self._write_idx: int = 0  # 下一次写入的位置 也是最旧数据的位置
         self._update_audio_lock = threading.Lock()
 
+        self._capture_list: Optional[List[np.ndarray]] = None  # 录制回放时 保存完整的录音
+        self._capture_start_time: float = 0  # 录制回放时 第一段录音的开始时间
+
+        # 每0.02秒(与识别间隔一致)更新一次与模板的相关性 识别时直接读取结果
+        self.correlator: StreamingAudioCorrelator = StreamingAudioCorrelator(
+            self._sample_rate, self._chunk_size * 2, self._window_size,
+            filter_degree=self._filter_degree, cut_off=self._cut_off
+        )
+
     def start_running_async(self) -> None:
         """
         异步启动音频录制。
@@ -57,7 +65,7 @@ class AudioRecorder:
 
             self.running = True
 
-        self.latest_audio = np.zeros(int(self._sample_rate // 2))  # 初始化音频数据缓冲区，长度为0.5秒
+        self.clear_audio()
         future = _dodge_check_executor.submit(self._record_loop)
         future.add_done_callback(thread_utils.handle_future_result)
 
@@ -82,10 +90,61 @@ class AudioRecorder:
                 else:
                     stream_data = stream_data.T
 
-                with self._update_audio_lock:
-                    # 更新 latest_audio
-                    self.latest_audio[:-len(stream_data)] = self.latest_audio[len(stream_data):]
-                    self.latest_audio[-len(stream_data):] = stream_data
+                self.feed_audio(stream_data)
+
+    def feed_audio(self, data: np.ndarray) -> None:
+        """
+        写入新的录音 并更新与模板的相关性
+        回放时也使用这个方法输入录好的音频
+        :param data: 单声道音频
+        :return:
+        """
+        self._append_audio(data)
+        self.correlator.feed(data)
+
+        capture_list = self._capture_list
+        if capture_list is not None:
+            if len(capture_list) == 0:
+                self._capture_start_time = time.time() - len(data) / self._sample_rate
+            capture_list.append(np.array(data, dtype=np.float32))
+
+    def start_capture(self) -> None:
+        """
+        开始保存完整的录音 用于录制回放
+        """
+        self._capture_list = []
+
+    def stop_capture(self) -> Tuple[Optional[np.ndarray], float]:
+        """
+        停止保存录音
+        :return: 录制期间的完整录音 没有录音时为None, 录音开始的时间
+        """
+        capture_list = self._capture_list
+        self._capture_list = None
+        if capture_list is None or len(capture_list) == 0:
+            return None, 0
+        return np.concatenate(capture_list), self._capture_start_time
+
+    def _append_audio(self, data: np.ndarray) -> None:
+        """
+        写入环形缓冲区 只覆盖最旧的部分 不移动已有的数据
+        :param data: 单声道音频
+        :return:
+        """
+        data = data[-self._window_size:]
+        with self._update_audio_lock:
+            first_len = min(len(data), self._window_size - self._write_idx)
+            self._audio_ring[self._write_idx:self._write_idx + first_len] = data[:first_len]
+            self._audio_ring[:len(data) - first_len] = data[first_len:]
+            self._write_idx = (self._write_idx + len(data)) % self._window_size
+
+    @property
+    def latest_audio(self) -> np.ndarray:
+        """
+        按时间顺序排列的最新音频
+        """
+        with self._update_audio_lock:
+            return np.concatenate((self._audio_ring[self._write_idx:], self._audio_ring[:self._write_idx]))
 
     def stop_running(self) -> None:
         """
@@ -98,7 +157,9 @@ class AudioRecorder:
         清楚当前录音
         """
         with self._update_audio_lock:
-            self.latest_audio = np.zeros(int(self._sample_rate // 2))
+            self._audio_ring[:] = 0
+            self._write_idx = 0
+        self.correlator.clear()
 
 
 class YoloStateEventEnum(Enum):
@@ -121,7 +182,8 @@ class AutoBattleDodgeContext:
 
         self._flash_model: Optional[FlashClassifier] = None  # 闪避分类器
         self._audio_recorder: AudioRecorder = AudioRecorder()  # 音频录制器
-        self._audio_template: Optional[np.ndarray] = None  # 音频模板
+        self._audio_template: Optional[np.ndarray] = None  # 音频模板 设置到相关器之后才赋值
+        self._init_audio_template_lock = threading.Lock()
 
         # 识别锁，保证每种类型只有一个实例在进行识别
         self._check_dodge_flash_lock = threading.Lock()
@@ -179,18 +241,21 @@ class AutoBattleDodgeContext:
     def init_audio_template(self) -> None:
         """
         加载音频模板。
+        可以重复调用 正在被其他线程加载时会等待加载完成 返回时模板已经设置到相关器中
         """
-        if self._audio_template is not None:
-            return
-        log.info('加载声音模板中')
-        self._audio_template, _ = librosa.load(os.path.join(
-            os_utils.get_path_under_work_dir('assets', 'template', 'dodge_audio'),
-            'template_1.wav'
-        ), sr=32000)
+        with self._init_audio_template_lock:
+            if self._audio_template is not None:
+                return
+            log.info('加载声音模板中')
+            audio_template, _ = librosa.load(os.path.join(
+                os_utils.get_path_under_work_dir('assets', 'template', 'dodge_audio'),
+                'template_1.wav'
+            ), sr=32000)
 
-        self._audio_template = self._get_filter_wave(self._audio_template)  # 滤波
+            self._audio_recorder.correlator.set_template(audio_template)  # 使用与录音相同的滤波
+            self._audio_template = audio_template
 
-        log.info('加载声音模板完成')
+            log.info('加载声音模板完成')
 
     def check_dodge_flash(self, screen: MatLike, screenshot_time: float, audio_future: Optional[Future[bool]] = None) -> bool:
         """
@@ -244,14 +309,12 @@ class AutoBattleDodgeContext:
             if screenshot_time - self._last_check_audio_time < cal_utils.random_in_range(self._check_audio_interval):
                 # 还没有达到识别间隔
                 return False
-            if self._audio_template is None:
+            if not self._audio_recorder.correlator.has_template:
                 return False
             self._last_check_audio_time = screenshot_time
 
-            if self._audio_recorder.latest_audio.size == 0:
-                return False
-
-            corr = self.get_max_corr(self._audio_template, self._audio_recorder.latest_audio)
+            # 相关性在录音线程中随每块音频更新
+            corr = self._audio_recorder.correlator.latest_corr
             # log.debug('声音相似度 %.2f' % corr)
 
             # 事件去重逻辑
@@ -266,39 +329,26 @@ class AutoBattleDodgeContext:
         finally:
             self._check_audio_lock.release()
 
-    def get_max_corr(self, x: np.ndarray, y: np.ndarray):
+    def feed_audio(self, data: np.ndarray) -> None:
         """
-        计算两个音频信号的最大相关性。
-        :param x: 音频信号x
-        :param y: 音频信号y
-        :return: 最大相关性系数
+        不使用声卡录音时 直接输入音频 用于回放
+        :param data: 单声道音频 采样率32000
+        :return:
         """
-        y = self._get_filter_wave(y)  # 滤波
-
-        # 标准化
-        wx = scale(x, with_mean=False)
-        wy = scale(y, with_mean=False)
-
-        # 计算NCC
-        if wx.shape[0] > wy.shape[0]:
-            correlation = correlate(wx, wy, mode='same', method='fft') / wx.shape[0]
-        else:
-            correlation = correlate(wy, wx, mode='same', method='fft') / wy.shape[0]
+        self._audio_recorder.feed_audio(data)
 
-        max_corr = np.max(correlation)
-
-        return max_corr
+    def start_audio_capture(self) -> None:
+        """
+        开始保存完整的录音 用于录制回放
+        """
+        self._audio_recorder.start_capture()
 
-    def _get_filter_wave(self, x: np.ndarray):
+    def stop_audio_capture(self) -> Tuple[Optional[np.ndarray], float]:
         """
-        音频滤波。
-        :param x: 音频信号x
-        :return: 滤波后波形
+        停止保存录音
+        :return: 录制期间的完整录音 没有录音时为None, 录音开始的时间
         """
-        wx = filtfilt(self._audio_recorder.filter_b,
-                      self._audio_recorder.filter_a,
-                      x)
-        return wx
+        return self._audio_recorder.stop_capture()
 
     def start_context(self) -> None:
         """
@@ -366,6 +366,7 @@ class AutoBattleOperator(ConditionalOperator):
         """
         ConditionalOperator.stop_running(self)
         self.auto_battle_context.stop_context()
+        self.op_runner.log_stats()
 
     def start_running_async(self) -> bool:
         success = ConditionalOperator.start_running_async(self)
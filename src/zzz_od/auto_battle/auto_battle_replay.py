@@ -0,0 +1,380 @@
+import os
+import threading
+import time
+
+import numpy as np
+from cv2.typing import MatLike
+from typing import Optional, List
+
+from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
+from one_dragon.base.conditional_operation.state_recorder import StateRecord
+from one_dragon.base.controller.controller_base import ControllerBase
+from one_dragon.utils import cv2_utils
+from one_dragon.utils.latency_histogram import LatencyHistogram
+from one_dragon.utils.log_utils import log
+from zzz_od.auto_battle.auto_battle_operator import AutoBattleOperator
+from zzz_od.context.zzz_context import ZContext
+
+_AUDIO_SAMPLE_RATE = 32000
+_AUDIO_FILE_PREFIX = 'audio_'
+
+
+class ReplayAction:
+
+    def __init__(self, btn_name: str, action_time: float,
+                 press: bool = False, press_time: Optional[float] = None, release: bool = False):
+        """
+        回放时发出的一次按键
+        :param btn_name: 按键名称 与控制器的方法名一致
+        :param action_time: 发出的时间
+        :param press: 是否按下
+        :param press_time: 按下的时长
+        :param release: 是否松开
+        """
+        self.btn_name: str = btn_name
+        self.action_time: float = action_time
+        self.press: bool = press
+        self.press_time: Optional[float] = press_time
+        self.release: bool = release
+
+
+class ReplayController(ControllerBase):
+
+    def __init__(self):
+        """
+        回放使用的控制器 截图返回当前回放的画面 按键只记录不执行
+        同时统计 状态更新到下一次按键 的耗时
+        """
+        ControllerBase.__init__(self)
+        self.current_screen: Optional[MatLike] = None
+        self.action_list: List[ReplayAction] = []
+        self.action_latency_histogram: LatencyHistogram = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._pending_state_update_time: Optional[float] = None  # 还没有按键响应的第一次状态更新时间
+
+    def init_before_context_run(self) -> bool:
+        return True
+
+    @property
+    def is_game_window_ready(self) -> bool:
+        return True
+
+    def get_screenshot(self, independent: bool = False) -> MatLike:
+        return self.current_screen
+
+    def on_state_update(self) -> None:
+        """
+        状态更新时调用
+        :return:
+        """
+        with self._lock:
+            if self._pending_state_update_time is None:
+                self._pending_state_update_time = time.time()
+
+    def _record_action(self, btn_name: str, press: bool = False, press_time: Optional[float] = None,
+                       release: bool = False) -> None:
+        """
+        记录一次按键 是状态更新后的第一次按键时 记录耗时
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            self.action_list.append(ReplayAction(btn_name, now, press=press, press_time=press_time, release=release))
+            update_time = self._pending_state_update_time
+            self._pending_state_update_time = None
+        if update_time is not None and not release:
+            self.action_latency_histogram.record(now - update_time)
+
+    def dodge(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('dodge', press, press_time, release)
+
+    def switch_next(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('switch_next', press, press_time, release)
+
+    def switch_prev(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('switch_prev', press, press_time, release)
+
+    def normal_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('normal_attack', press, press_time, release)
+
+    def special_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('special_attack', press, press_time, release)
+
+    def ultimate(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('ultimate', press, press_time, release)
+
+    def chain_left(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('chain_left', press, press_time, release)
+
+    def chain_right(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('chain_right', press, press_time, release)
+
+    def move_w(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('move_w', press, press_time, release)
+
+    def move_s(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('move_s', press, press_time, release)
+
+    def move_a(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('move_a', press, press_time, release)
+
+    def move_d(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('move_d', press, press_time, release)
+
+    def interact(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('interact', press, press_time, release)
+
+    def lock(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('lock', press, press_time, release)
+
+    def chain_cancel(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        self._record_action('chain_cancel', press, press_time, release)
+
+    def turn_by_distance(self, d: float) -> None:
+        self._record_action('turn_by_distance')
+
+
+class ReplayAutoBattleOperator(AutoBattleOperator):
+
+    def __init__(self, ctx: ZContext, sub_dir: str, template_name: str, controller: ReplayController):
+        """
+        回放使用的自动战斗指令
+        - 状态更新时通知控制器 用于统计状态更新到按键的耗时
+        - 不使用声卡录音 音频由回放输入
+        - 不运行定时的锁定和转向 它们与画面无关 会干扰按键耗时的统计
+        """
+        AutoBattleOperator.__init__(self, ctx, sub_dir, template_name)
+        self.replay_controller: ReplayController = controller
+
+    def update_state(self, state_record: StateRecord) -> None:
+        self.replay_controller.on_state_update()
+        AutoBattleOperator.update_state(self, state_record)
+
+    def batch_update_states(self, state_records: List[StateRecord]) -> None:
+        if len(state_records) > 0:
+            self.replay_controller.on_state_update()
+        AutoBattleOperator.batch_update_states(self, state_records)
+
+    def start_running_async(self) -> bool:
+        return ConditionalOperator.start_running_async(self)
+
+
+class BattleReplayFrame:
+
+    def __init__(self, screenshot_time: float, image_path: str):
+        """
+        录制的一帧画面
+        :param screenshot_time: 原始的截图时间
+        :param image_path: 图片路径
+        """
+        self.screenshot_time: float = screenshot_time
+        self.image_path: str = image_path
+        self.image: Optional[MatLike] = None
+
+    def load(self) -> MatLike:
+        if self.image is None:
+            self.image = cv2_utils.read_image(self.image_path)
+        return self.image
+
+
+class BattleReplay:
+
+    def __init__(self, replay_dir: str):
+        """
+        一段录制好的战斗 文件夹内的文件
+        - {毫秒时间戳}.png 每一帧画面 文件名为截图时间
+        - audio_{毫秒时间戳}.npy 可选 单声道32000采样率的音频 文件名为音频开始的时间
+        :param replay_dir: 文件夹
+        """
+        self.replay_dir: str = replay_dir
+        self.frame_list: List[BattleReplayFrame] = []
+        self.audio: Optional[np.ndarray] = None
+        self.audio_start_time: float = 0
+
+        for file_name in os.listdir(replay_dir):
+            name, ext = os.path.splitext(file_name)
+            if ext == '.png' and name.isdigit():
+                self.frame_list.append(BattleReplayFrame(int(name) / 1000.0, os.path.join(replay_dir, file_name)))
+            elif ext == '.npy' and name.startswith(_AUDIO_FILE_PREFIX) and name[len(_AUDIO_FILE_PREFIX):].isdigit():
+                self.audio = np.load(os.path.join(replay_dir, file_name)).astype(np.float32)
+                self.audio_start_time = int(name[len(_AUDIO_FILE_PREFIX):]) / 1000.0
+        self.frame_list.sort(key=lambda i: i.screenshot_time)
+
+    def preload(self) -> None:
+        """
+        预先读取所有画面 避免读取图片的耗时算进识别里
+        :return:
+        """
+        for frame in self.frame_list:
+            frame.load()
+
+    @property
+    def duration(self) -> float:
+        if len(self.frame_list) < 2:
+            return 0
+        return self.frame_list[-1].screenshot_time - self.frame_list[0].screenshot_time
+
+
+def save_replay_frame(replay_dir: str, screen: MatLike, screenshot_time: float) -> None:
+    """
+    保存一帧画面 用于之后回放
+    :param replay_dir: 文件夹
+    :param screen: 画面
+    :param screenshot_time: 截图时间
+    :return:
+    """
+    os.makedirs(replay_dir, exist_ok=True)
+    cv2_utils.save_image(screen, os.path.join(replay_dir, '%d.png' % int(screenshot_time * 1000)))
+
+
+def save_replay_audio(replay_dir: str, audio: np.ndarray, start_time: float) -> None:
+    """
+    保存一段音频 用于之后回放
+    :param replay_dir: 文件夹
+    :param audio: 单声道32000采样率的音频
+    :param start_time: 音频开始的时间
+    :return:
+    """
+    os.makedirs(replay_dir, exist_ok=True)
+    np.save(os.path.join(replay_dir, '%s%d.npy' % (_AUDIO_FILE_PREFIX, int(start_time * 1000))),
+            audio.astype(np.float32))
+
+
+class BattleReplayReport:
+
+    def __init__(self, frame_cnt: int, replay_seconds: float,
+                 frame_histogram: LatencyHistogram,
+                 check_stats: List[str],
+                 preprocess_histogram: LatencyHistogram,
+                 action_latency_histogram: LatencyHistogram,
+                 action_list: List[ReplayAction]):
+        """
+        回放的结果
+        :param frame_cnt: 画面数量
+        :param replay_seconds: 回放耗时
+        :param frame_histogram: 每帧 check_battle_state 的耗时
+        :param check_stats: 各识别的耗时统计
+        :param preprocess_histogram: 每帧生成派生图片的耗时
+        :param action_latency_histogram: 状态更新到按键的耗时
+        :param action_list: 发出的按键
+        """
+        self.frame_cnt: int = frame_cnt
+        self.replay_seconds: float = replay_seconds
+        self.frame_histogram: LatencyHistogram = frame_histogram
+        self.check_stats: List[str] = check_stats
+        self.preprocess_histogram: LatencyHistogram = preprocess_histogram
+        self.action_latency_histogram: LatencyHistogram = action_latency_histogram
+        self.action_list: List[ReplayAction] = action_list
+
+    @property
+    def fps(self) -> float:
+        return 0 if self.replay_seconds <= 0 else self.frame_cnt / self.replay_seconds
+
+    def get_text_list(self) -> List[str]:
+        result = [
+            '画面 %d 耗时 %.2fs 每秒 %.1f帧' % (self.frame_cnt, self.replay_seconds, self.fps),
+            '每帧识别 [%s]' % self.frame_histogram,
+            '派生图片 [%s]' % self.preprocess_histogram,
+        ]
+        result.extend(self.check_stats)
+        result.append('按键 %d 状态更新到按键 [%s]' % (len(self.action_list), self.action_latency_histogram))
+        return result
+
+    def log(self) -> None:
+        for line in self.get_text_list():
+            log.info(line)
+
+
+def run_battle_replay(ctx: ZContext, replay: BattleReplay, auto_battle_config: str,
+                      speed: float = 1, wait_after_seconds: float = 1) -> Optional[BattleReplayReport]:
+    """
+    回放一段录制好的战斗 不需要游戏
+    画面按原始的时间间隔输入 check_battle_state 截图时间映射到当前时间 使指令的时间判断与实际运行一致
+    :param ctx: 上下文 控制器会临时替换为回放使用的控制器
+    :param replay: 录制好的战斗
+    :param auto_battle_config: 自动战斗配置名称
+    :param speed: 回放速度 1为原速 0为不等待 尽快识别每一帧 用于测试吞吐量
+    :param wait_after_seconds: 最后一帧之后 等待指令执行完的时间
+    :return: 初始化失败时返回None
+    """
+    if len(replay.frame_list) == 0:
+        log.error('回放没有画面 %s', replay.replay_dir)
+        return None
+    replay.preload()
+
+    origin_controller = ctx.controller
+    controller = ReplayController()
+    ctx.controller = controller
+    auto_op = ReplayAutoBattleOperator(ctx, 'auto_battle', auto_battle_config, controller)
+    try:
+        success, msg = auto_op.init_before_running()
+        if not success:
+            log.error('回放初始化失败 %s', msg)
+            return None
+        if replay.audio is not None:
+            # 初始化时是异步加载声音模板 回放需要从第一帧开始识别 这里会等待加载完成
+            auto_op.auto_battle_context.dodge_context.init_audio_template()
+
+        auto_op.start_running_async()
+        frame_histogram = LatencyHistogram()
+        first_time = replay.frame_list[0].screenshot_time
+        audio_idx = 0
+        start_time = time.time()
+        for frame in replay.frame_list:
+            if speed > 0:
+                wait_seconds = start_time + (frame.screenshot_time - first_time) / speed - time.time()
+                if wait_seconds > 0:
+                    time.sleep(wait_seconds)
+
+            if replay.audio is not None:
+                # 输入截图之前录到的音频
+                audio_end = int((frame.screenshot_time - replay.audio_start_time) * _AUDIO_SAMPLE_RATE)
+                audio_end = min(max(audio_end, 0), len(replay.audio))
+                if audio_end > audio_idx:
+                    auto_op.auto_battle_context.dodge_context.feed_audio(replay.audio[audio_idx:audio_end])
+                    audio_idx = audio_end
+
+            screen = frame.load()
+            controller.current_screen = screen
+            now = time.time()
+            auto_op.auto_battle_context.check_battle_state(screen, now, check_battle_end_normal_result=True,
+                                                           sync=speed <= 0)
+            frame_histogram.record(time.time() - now)
+        replay_seconds = time.time() - start_time
+
+        time.sleep(wait_after_seconds)
+        auto_op.stop_running()
+
+        auto_battle_context = auto_op.auto_battle_context
+        return BattleReplayReport(
+            frame_cnt=len(replay.frame_list),
+            replay_seconds=replay_seconds,
+            frame_histogram=frame_histogram,
+            check_stats=auto_battle_context.check_scheduler.get_stats_text(),
+            preprocess_histogram=auto_battle_context.preprocess_histogram,
+            action_latency_histogram=controller.action_latency_histogram,
+            action_list=list(controller.action_list),
+        )
+    finally:
+        auto_op.dispose()
+        ctx.controller = origin_controller
+
+
+def __debug():
+    """
+    python auto_battle_replay.py 录制文件夹 [自动战斗配置] [回放速度]
+    """
+    import sys
+    ctx = ZContext()
+    ctx.init_by_config()
+    replay = BattleReplay(sys.argv[1])
+    config_name = sys.argv[2] if len(sys.argv) > 2 else '全配对通用'
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+    report = run_battle_replay(ctx, replay, config_name, speed=speed)
+    if report is not None:
+        for line in report.get_text_list():
+            print(line)
+
+
+if __name__ == '__main__':
+    __debug()
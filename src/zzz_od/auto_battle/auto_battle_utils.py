@@ -2,6 +2,7 @@ import time
 from concurrent.futures import Future
 from typing import Tuple, Union
 
+from one_dragon.base.controller.screenshot_buffer import get_ring_size
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
 from zzz_od.application.zzz_application import ZApplication
 from zzz_od.auto_battle.auto_battle_operator import AutoBattleOperator
@@ -33,6 +34,27 @@ def load_auto_op_async(op: Union[ZOperation, ZApplication], auto_config_sub_dir:
     return op.auto_op.init_before_running_async()
 
 
+def enable_screenshot_buffer(op: Union[ZOperation, ZApplication], auto_op: AutoBattleOperator,
+                             screenshot_interval: float) -> None:
+    """
+    启用截图缓冲区 只在按固定间隔截图识别的战斗流程中使用
+    数量按截图间隔和识别的有效时间计算 截图需要通过 screenshot_leased 获取
+    :param op: 当前指令
+    :param auto_op: 自动战斗指令
+    :param screenshot_interval: 截图间隔
+    """
+    frame_budget = auto_op.auto_battle_context.check_scheduler.frame_budget
+    op.ctx.controller.set_screenshot_buffer_size(get_ring_size(screenshot_interval, frame_budget))
+
+
+def disable_screenshot_buffer(op: Union[ZOperation, ZApplication]) -> None:
+    """
+    停用截图缓冲区 仍在使用中的截图不受影响
+    :param op: 当前指令
+    """
+    op.ctx.controller.set_screenshot_buffer_size(0)
+
+
 def stop_running(auto_op: AutoBattleOperator) -> None:
     """
     停止自动战斗
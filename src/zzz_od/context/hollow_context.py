@@ -47,12 +47,10 @@ class HollowContext:
         prefix = 'avatar_'
         if possible_agents is None:
             possible_agents = [agent_enum.value for agent_enum in AgentEnum]
-        for agent in possible_agents:
-            if agent is None:
-                continue
-            mrl = self.ctx.tm.match_template(img, 'hollow', prefix + agent.template_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent_map: dict[str, Agent] = {prefix + agent.template_id: agent for agent in possible_agents if agent is not None}
+        mr = self.ctx.tm.match_best_template(img, 'hollow', list(agent_map.keys()), threshold=0.8)
+        if mr is not None:
+            return agent_map[mr.data]
 
         return None
 
@@ -45,11 +45,12 @@ class ZPcController(PcControllerBase):
         """
         rect = ScreenNormalWorldEnum.UID.value.rect
 
+        # get_screenshot 返回的截图都是新分配或缓冲区中的数组 可以直接修改 不需要再复制一份
         return cv2_utils.mark_area_as_color(
             screen,
             pos=[rect.x1, rect.y1, rect.width, rect.height],
             color=game_const.YOLO_DEFAULT_COLOR,
-            new_image=True
+            new_image=False
         )
 
     def enable_keyboard(self):
@@ -211,6 +211,7 @@ if __name__ == "__main__":
 
     # 异步加载OCR
     _ctx.async_init_ocr()
+    _ctx.async_init_template_cache()
 
     # 异步更新免费代理
     _ctx.async_update_gh_proxy()
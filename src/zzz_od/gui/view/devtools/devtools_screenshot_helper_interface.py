@@ -47,6 +47,11 @@ class DevtoolsScreenshotHelperInterface(AppRunInterface):
         self.dodge_detect_opt.value_changed.connect(self._on_dodge_detect_changed)
         top_widget.add_widget(self.dodge_detect_opt)
 
+        self.record_replay_opt = SwitchSettingCard(icon=FluentIcon.GAME, title='录制回放',
+                                                   content='按截图间隔保存每一帧画面和录音，用于离线回放自动战斗')
+        self.record_replay_opt.value_changed.connect(self._on_record_replay_changed)
+        top_widget.add_widget(self.record_replay_opt)
+
         return top_widget
 
     def on_interface_shown(self) -> None:
@@ -59,6 +64,7 @@ class DevtoolsScreenshotHelperInterface(AppRunInterface):
         self.length_opt.setValue(str(self.ctx.screenshot_helper_config.length_second))
         self.key_save_opt.setValue(str(self.ctx.screenshot_helper_config.key_save))
         self.dodge_detect_opt.setValue(self.ctx.screenshot_helper_config.dodge_detect)
+        self.record_replay_opt.setValue(self.ctx.screenshot_helper_config.record_replay)
 
     def get_app(self) -> ZApplication:
         return ScreenshotHelperApp(self.ctx)
@@ -74,3 +80,6 @@ class DevtoolsScreenshotHelperInterface(AppRunInterface):
 
     def _on_dodge_detect_changed(self, value: bool) -> None:
         self.ctx.screenshot_helper_config.dodge_detect = value
+
+    def _on_record_replay_changed(self, value: bool) -> None:
+        self.ctx.screenshot_helper_config.record_replay = value